@@ -1,27 +1,35 @@
 #main Flask app for Web app
-from flask import Flask, redirect, render_template, url_for, request, jsonify
+from flask import Flask, redirect, render_template, url_for, request, jsonify, Response, stream_with_context
 from flask_login import UserMixin, LoginManager, login_user, login_required, logout_user, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField
 from wtforms.validators import InputRequired, Length, ValidationError
-from . import analytics
 from flask_bcrypt import Bcrypt
+import hashlib
 import os
-import pandas as pd
 import re
 from io import StringIO
 from .models import db, Position, UploadedFile
+from . import snapshot as recommendation_snapshot
+from . import jobs
+from . import holdings
+from . import run_history
+from .progress import event_stream
 import time
 from datetime import datetime
-from catboost import CatBoostClassifier
-import numpy as np
 
 app = Flask(__name__)
 # Store the app startup time to invalidate old sessions
 APP_START_TIME = time.time()
 
-# Track if stock data regeneration is currently running
-REGENERATION_IN_PROGRESS = False
+# Feature store produced by stock_data_generator and read by the recommendation routes
+FEATURE_STORE_PATH = os.path.join(os.path.dirname(__file__), 'feature_store')
+
+# Shared by every progress stream of this process (one registry poller)
+regeneration_events_source = jobs.RegistryEventSource(app)
+
+# Comma-separated usernames allowed on the /api/admin endpoints
+ADMIN_USERS = {name.strip() for name in os.getenv('ADMIN_USERS', '').split(',') if name.strip()}
 
 # Database configuration
 # For production (Render), use PostgreSQL via environment variables
@@ -179,6 +187,8 @@ def extract_date_from_csv(content):
 
 def process_csv_and_save_to_db(file_content, user_id, filename):
     """Process CSV file and save to database, associated with the given user"""
+    import pandas as pd
+
     try:
         # Extract date from first line
         date_str = extract_date_from_csv(file_content)
@@ -257,6 +267,9 @@ def profile():
         # Fetch user's 5 most recently uploaded files
         uploaded_files = UploadedFile.query.filter_by(user_id=current_user.id).order_by(UploadedFile.upload_date.desc()).limit(5).all()
 
+        # plotly is heavy; only load it for the page that draws graphs
+        from . import analytics
+
         graph_html = analytics.create_animated_timeline_graph(current_user.id)
         holdings_graph_html = analytics.create_holdings_by_type_graph(current_user.id)
         return render_template('profile.html', graph_html=graph_html, holdings_graph_html=holdings_graph_html, files=uploaded_files)
@@ -283,188 +296,190 @@ def profile():
 def portfolio():
     return render_template('portfolio.html')
 
+def _owned_tickers():
+    return holdings.owned_tickers(current_user.id) if current_user.is_authenticated else set()
+
+def _recommendations_etag(snapshot, owned):
+    """Snapshot version, plus the user's holdings when they change what the page shows"""
+    if not owned:
+        return snapshot['version']
+    digest = hashlib.sha256(','.join(sorted(owned)).encode()).hexdigest()[:8]
+    return f"{snapshot['version']}-{digest}"
+
+@app.errorhandler(recommendation_snapshot.ModelNotReady)
+def _model_not_ready(e=None):
+    """
+    No model for the current feature data: queue a 'train' job for the worker
+    (unless one is already queued or running) rather than training in this
+    process, and ask the client to retry
+    """
+    jobs.enqueue('train', requested_by=current_user.id if current_user.is_authenticated else None)
+    message = 'The recommendation model is being trained. Please try again in a few minutes.'
+    if request.path.startswith('/api/'):
+        response = jsonify({'success': False, 'error': message})
+    else:
+        response = app.response_class(message, mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = '60'
+    return response
+
 @app.route('/recommendations')
 @login_required
 def optimize():
-    # Load and prepare data
-    csv_path = os.path.join(os.path.dirname(__file__), 'stock_features.csv')
-    df = pd.read_csv(csv_path)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.replace([np.inf, -np.inf], np.nan)
-    df = df.dropna()
-    
-    feature_cols = [
-        'momentum', 'volatility', 'avg_correlation', 'max_correlation',
-        'min_correlation', 'market_correlation', 'sharpe', 'momentum_accel',
-        'dividend_yield'
-    ]
-    
-    # Train model
-    model = CatBoostClassifier(
-        iterations=200,
-        depth=4,
-        learning_rate=0.05,
-        random_state=42,
-        verbose=False
-    )
-    model.fit(df[feature_cols], df['beat_market'])
-    
-    # Get latest data
-    latest_date = df['date'].max()
-    latest = df[df['date'] == latest_date].copy()
-    latest['prob_beat_market'] = model.predict_proba(latest[feature_cols])[:, 1]
-    
-    # Get top recommendations
-    top_picks = latest[latest['prob_beat_market'] >= 0.5].sort_values(
-        'prob_beat_market', ascending=False
-    ).head(20)
-
-    # Convert to list of dicts for template
-    recommendations = top_picks[[
-        'ticker', 'prob_beat_market', 'sharpe', 'momentum', 'momentum_accel', 'volatility', 'dividend_yield', 'avg_correlation', 'market_correlation'
-    ]].to_dict('records')
-
-    # === CURATED PICKS ===
-    # Filter to stocks with >50% probability as baseline
-    candidates = latest[latest['prob_beat_market'] >= 0.5].copy()
-
-    # Best Overall: High probability + positive Sharpe ratio (risk-adjusted returns)
-    best_overall = candidates[candidates['sharpe'] > 0].sort_values(
-        'prob_beat_market', ascending=False
-    ).head(5)[['ticker', 'prob_beat_market', 'sharpe', 'volatility', 'dividend_yield']].to_dict('records')
-
-    # Income Focused: Best dividend yields (>1%) with decent probability
-    income_focused = candidates[candidates['dividend_yield'] >= 0.01].sort_values(
-        ['dividend_yield', 'prob_beat_market'], ascending=[False, False]
-    ).head(5)[['ticker', 'prob_beat_market', 'sharpe', 'volatility', 'dividend_yield']].to_dict('records')
-
-    # Low Risk: Lower volatility (<50%) with good probability
-    low_risk = candidates[candidates['volatility'] < 0.5].sort_values(
-        ['volatility', 'prob_beat_market'], ascending=[True, False]
-    ).head(5)[['ticker', 'prob_beat_market', 'sharpe', 'volatility', 'dividend_yield']].to_dict('records')
-
-    curated_picks = {
-        'best_overall': best_overall,
-        'income_focused': income_focused,
-        'low_risk': low_risk
-    }
-
-    # Summary stats
-    stats = {
-        'total_analyzed': len(latest),
-        'above_50': len(latest[latest['prob_beat_market'] > 0.5]),
-        'above_55': len(latest[latest['prob_beat_market'] > 0.55]),
-        'above_60': len(latest[latest['prob_beat_market'] > 0.6]),
-        'avg_prob': latest['prob_beat_market'].mean() * 100,
-        'max_prob': latest['prob_beat_market'].max() * 100,
-        'last_updated': latest_date.strftime('%Y-%m-%d')
-    }
-
-    return render_template('recommend.html', recommendations=recommendations, stats=stats, curated_picks=curated_picks)
-
-def get_recommendations_from_csv(csv_path=None):
-    """Helper function to load CSV and generate recommendations."""
-    if csv_path is None:
-        csv_path = os.path.join(os.path.dirname(__file__), 'stock_features.csv')
-    df = pd.read_csv(csv_path)
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.replace([np.inf, -np.inf], np.nan)
-    df = df.dropna()
-
-    feature_cols = [
-        'momentum', 'volatility', 'avg_correlation', 'max_correlation',
-        'min_correlation', 'market_correlation', 'sharpe', 'momentum_accel',
-        'dividend_yield'
-    ]
-
-    # Train model
-    model = CatBoostClassifier(
-        iterations=200,
-        depth=4,
-        learning_rate=0.05,
-        random_state=42,
-        verbose=False
+    # Everything on this page is precomputed when the stock data is regenerated;
+    # only stocks the user already owns are filtered out per request
+    snapshot = recommendation_snapshot.get_snapshot(FEATURE_STORE_PATH)
+    owned = _owned_tickers()
+    recommendations, curated_picks = recommendation_snapshot.select(snapshot, exclude=owned)
+    return render_template(
+        'recommend.html',
+        recommendations=recommendations,
+        stats=snapshot['stats'],
+        curated_picks=curated_picks,
+        version=_recommendations_etag(snapshot, owned)
     )
-    model.fit(df[feature_cols], df['beat_market'])
-
-    # Get latest data
-    latest_date = df['date'].max()
-    latest = df[df['date'] == latest_date].copy()
-    latest['prob_beat_market'] = model.predict_proba(latest[feature_cols])[:, 1]
-
-    # Get top recommendations
-    top_picks = latest[latest['prob_beat_market'] >= 0.5].sort_values(
-        'prob_beat_market', ascending=False
-    ).head(20)
-
-    # Convert to list of dicts for JSON response
-    recommendations = top_picks[[
-        'ticker', 'prob_beat_market', 'sharpe', 'momentum', 'momentum_accel', 'volatility', 'dividend_yield', 'avg_correlation', 'market_correlation'
-    ]].to_dict('records')
-
-    # Summary stats
-    stats = {
-        'total_analyzed': len(latest),
-        'above_50': len(latest[latest['prob_beat_market'] > 0.5]),
-        'above_55': len(latest[latest['prob_beat_market'] > 0.55]),
-        'above_60': len(latest[latest['prob_beat_market'] > 0.6]),
-        'avg_prob': latest['prob_beat_market'].mean() * 100,
-        'max_prob': latest['prob_beat_market'].max() * 100,
-        'last_updated': latest_date.strftime('%Y-%m-%d')
-    }
-
-    return recommendations, stats
-
-@app.route('/api/refresh-recommendations', methods=['POST'])
+
+@app.route('/api/refresh-recommendations', methods=['GET'])
 @login_required
 def refresh_recommendations():
-    """API endpoint to refresh recommendations with existing data"""
+    """
+    API endpoint to fetch the latest recommendations. The ETag is the snapshot
+    version (plus the user's holdings), so polling clients sending
+    If-None-Match get a bodyless 304 until a regeneration publishes new data.
+    """
+    try:
+        snapshot = recommendation_snapshot.get_snapshot(FEATURE_STORE_PATH)
+        owned = _owned_tickers()
+        etag = _recommendations_etag(snapshot, owned)
+
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            recommendations, _ = recommendation_snapshot.select(snapshot, exclude=owned)
+            response = jsonify({
+                'success': True,
+                'version': etag,
+                'recommendations': recommendations,
+                'stats': snapshot['stats']
+            })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except recommendation_snapshot.ModelNotReady:
+        return _model_not_ready()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/holdings')
+@login_required
+def my_holdings():
+    """The user's latest holdings scored by the recommendation model"""
     try:
-        recommendations, stats = get_recommendations_from_csv()
+        result = holdings.score_holdings(current_user.id, FEATURE_STORE_PATH)
+        error = None
+    except FileNotFoundError as e:
+        result, error = None, str(e)
+    return render_template('holdings.html', result=result, error=error, flag_below=holdings.FLAG_BELOW)
 
+@app.route('/api/holdings', methods=['GET'])
+@login_required
+def holdings_scores():
+    """API endpoint with model probabilities for each holding in the user's latest statement"""
+    try:
+        return jsonify({'success': True, **holdings.score_holdings(current_user.id, FEATURE_STORE_PATH)})
+    except recommendation_snapshot.ModelNotReady:
+        return _model_not_ready()
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'recommendations': recommendations,
-            'stats': stats
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/score', methods=['POST'])
+@login_required
+def score_tickers():
+    """
+    API endpoint to score a list of tickers.
+
+    Body: {"tickers": ["AAPL", ...], "as_of": "2024-05" (optional, default latest month)}
+    Returns prob_beat_market and the feature vector per ticker, plus the tickers
+    with no (complete) feature row for that month.
+    """
+    from . import scoring
+
+    data = request.get_json(silent=True) or {}
+    tickers = data.get('tickers')
+    if not isinstance(tickers, list) or not tickers:
+        return jsonify({'success': False, 'error': 'tickers must be a non-empty list'}), 400
+    if len(tickers) > scoring.MAX_TICKERS:
+        return jsonify({'success': False, 'error': f'At most {scoring.MAX_TICKERS} tickers per request'}), 400
+    if not all(isinstance(ticker, str) for ticker in tickers):
+        return jsonify({'success': False, 'error': 'tickers must be strings'}), 400
+    as_of = data.get('as_of')
+    if as_of is not None and not isinstance(as_of, str):
+        return jsonify({'success': False, 'error': 'as_of must be a date string'}), 400
+
+    try:
+        result = scoring.score(tickers, FEATURE_STORE_PATH, month=as_of)
+    except KeyError:
+        return jsonify({'success': False, 'error': f'No feature data for {as_of}'}), 404
+    except ValueError:
+        # pd.Timestamp couldn't parse as_of
+        return jsonify({'success': False, 'error': f'Invalid as_of date: {as_of}'}), 400
+    except recommendation_snapshot.ModelNotReady:
+        return _model_not_ready()
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    return jsonify({'success': True, **result})
 
 @app.route('/api/regenerate-stock-data', methods=['POST'])
 @login_required
 def regenerate_stock_data():
-    """API endpoint to regenerate stock_features.csv from yfinance data"""
-    global REGENERATION_IN_PROGRESS
+    """API endpoint to queue a feature store regeneration for the background worker"""
+    try:
+        # The worker (python -m backend.worker) runs the job outside the web processes
+        job_id = jobs.enqueue('regenerate', requested_by=current_user.id)
+        if job_id is None:
+            return jsonify({
+                'success': False,
+                'error': 'A stock data regeneration is already queued or running.',
+                'status': jobs.status()
+            }), 409
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': 'Stock data regeneration queued. This may take 10-20 minutes. The recommendations page will update automatically when complete.'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
+@app.route('/api/score-now', methods=['POST'])
+@login_required
+def score_now():
+    """API endpoint to queue a scoring-only refresh: today's features from recent prices, no regeneration"""
     try:
-        from .stock_data_generator import generate_stock_features
-        import threading
-
-        # Run the data generation in a separate thread to avoid blocking
-        def generate_and_return():
-            global REGENERATION_IN_PROGRESS
-            try:
-                REGENERATION_IN_PROGRESS = True
-                # Generate new stock features
-                csv_path = os.path.join(os.path.dirname(__file__), 'stock_features.csv')
-                generate_stock_features(csv_path)
-                print("Stock data regeneration complete!")
-            except Exception as e:
-                print(f"Error in regeneration thread: {e}")
-            finally:
-                REGENERATION_IN_PROGRESS = False
-
-        # Start in background thread
-        thread = threading.Thread(target=generate_and_return)
-        thread.daemon = True
-        thread.start()
+        job_id = jobs.enqueue('score', requested_by=current_user.id)
+        if job_id is None:
+            return jsonify({
+                'success': False,
+                'error': 'A scoring refresh is already queued or running.',
+                'status': jobs.status()
+            }), 409
 
         return jsonify({
             'success': True,
-            'message': 'Stock data regeneration started. This may take 1020 minutes. The recommendations page will update automatically when complete.'
+            'job_id': job_id,
+            'message': 'Scoring refresh queued. The recommendations page will update in a few seconds.'
         })
     except Exception as e:
         return jsonify({
@@ -472,12 +487,58 @@ def regenerate_stock_data():
             'error': str(e)
         }), 500
 
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    """API endpoint to cancel a queued or running background job (admins, or the user who queued it)"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if current_user.username not in ADMIN_USERS and job.requested_by != current_user.id:
+        return jsonify({'success': False, 'error': 'Only the user who queued this job or an admin can cancel it'}), 403
+    job = jobs.cancel_job(job_id)
+    return jsonify({'success': True, 'job': jobs.serialize(job)})
+
+@app.route('/api/regeneration-events', methods=['GET'])
+@login_required
+def regeneration_events():
+    """
+    Server-sent events stream of regeneration progress (stage, message, percent, ETA),
+    of the job given by ?job_id= or else of the most recently updated job
+    """
+    job_id = request.args.get('job_id')
+    if not regeneration_events_source.subscribe(job_id):
+        # Every stream slot is taken: the client polls /api/regeneration-status instead
+        response = jsonify({'success': False, 'error': 'Too many progress streams open'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    response = Response(
+        stream_with_context(event_stream(regeneration_events_source, last_event_id, job_id=job_id)),
+        mimetype='text/event-stream'
+    )
+    # The server closes the response when the stream ends or the client goes away
+    response.call_on_close(lambda: regeneration_events_source.unsubscribe(job_id))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/regeneration-status', methods=['GET'])
 def regeneration_status():
-    """API endpoint to check if stock data regeneration is running"""
-    return jsonify({
-        'is_running': REGENERATION_IN_PROGRESS
-    })
+    """API endpoint to check if stock data regeneration is running, with progress and ETA (of the job given by ?job_id=)"""
+    return jsonify(jobs.status(request.args.get('job_id')))
+
+@app.route('/api/admin/pipeline-runs', methods=['GET'])
+@login_required
+def pipeline_runs():
+    """Admin API endpoint: recent regeneration runs with per-stage timing, memory and throughput"""
+    if current_user.username not in ADMIN_USERS:
+        return jsonify({'success': False, 'error': 'Admin access required'}), 403
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({'success': True, 'runs': run_history.recent_runs(limit)})
 
 @app.route('/delete-file/<int:file_id>', methods=['DELETE'])
 @login_required
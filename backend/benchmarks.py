@@ -0,0 +1,1029 @@
+"""
+Benchmarks for the recommendation pipeline.
+
+Run from the repository root, e.g.:
+    python -m backend.benchmarks recommendations
+
+Every benchmark works on synthetic data in a temporary directory, so it can
+be run on a machine without network access or generated stock data.
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import peak_rss_mb, proc_status_mb, reset_peak_rss
+
+
+def make_synthetic_features(path, n_tickers=1500, n_months=48, seed=42):
+    """Write a stock_features.csv-shaped file with random (but plausible) values."""
+    from .model_store import FEATURE_COLS
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2021-01-31', periods=n_months, freq='ME')
+    tickers = [f'T{i:04d}' for i in range(n_tickers)]
+    n_rows = n_tickers * n_months
+
+    df = pd.DataFrame({
+        'ticker': np.tile(tickers, n_months),
+        'date': np.repeat(dates, n_tickers),
+    })
+    for col in FEATURE_COLS:
+        df[col] = rng.normal(0, 0.3, n_rows)
+    df['volatility'] = np.abs(df['volatility'])
+    df['dividend_yield'] = np.abs(rng.normal(0, 0.02, n_rows))
+    df['future_return'] = 0.3 * df['momentum'] + rng.normal(0, 0.3, n_rows)
+    df['beat_market'] = (df['future_return'] > df.groupby('date')['future_return'].transform('mean')).astype(int)
+    df.to_csv(path, index=False)
+    return df
+
+
+def make_synthetic_store(root, n_tickers=1500, n_months=48, seed=42):
+    """Synthetic features published to a feature store at `root`."""
+    from . import feature_store
+
+    csv_path = os.path.join(root, 'stock_features.csv')
+    os.makedirs(root, exist_ok=True)
+    make_synthetic_features(csv_path, n_tickers, n_months, seed)
+    version = feature_store.import_csv(csv_path, root)
+    return csv_path, version
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the pipeline's progress prints while a case runs."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _measure(fn, *args):
+    """
+    Runs in a fresh process: seconds taken, peak RSS growth while fn ran and
+    rows returned. Where the peak watermark can't be reset, the growth is
+    measured against the process-lifetime peak and may read low.
+    """
+    from . import feature_store  # noqa: F401 - same imports for every case
+    if reset_peak_rss():
+        before = proc_status_mb('VmRSS')
+    else:
+        before = peak_rss_mb()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    return elapsed, peak_rss_mb() - before, len(result)
+
+
+def _in_subprocess(fn, *args):
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(1) as pool:
+        return pool.apply(_measure, (fn, *args))
+
+
+def _time_request(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"{url} returned {response.status_code}")
+    return elapsed
+
+
+@contextlib.contextmanager
+def _synthetic_app(n_tickers, n_months):
+    """
+    The Flask app (logins disabled) serving a synthetic feature store in a
+    temp directory, with its model trained as a regeneration would leave it.
+    """
+    from . import app as app_module
+    from . import model_store, scoring, snapshot
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_app_')
+    originals = (app_module.FEATURE_STORE_PATH, model_store.ARTIFACT_DIR, snapshot.SNAPSHOT_DIR)
+    try:
+        store_path = os.path.join(tmp_dir, 'feature_store')
+        make_synthetic_store(store_path, n_tickers, n_months)
+        app_module.FEATURE_STORE_PATH = store_path
+        model_store.ARTIFACT_DIR = os.path.join(tmp_dir, 'model_artifacts')
+        snapshot.SNAPSHOT_DIR = os.path.join(tmp_dir, 'snapshots')
+        model_store.clear_cache()
+        snapshot.clear_cache()
+        scoring.clear_cache()
+        with _quiet():
+            model_store.get_model(store_path)
+
+        app_module.app.config['LOGIN_DISABLED'] = True
+        yield app_module.app
+    finally:
+        app_module.FEATURE_STORE_PATH, model_store.ARTIFACT_DIR, snapshot.SNAPSHOT_DIR = originals
+        model_store.clear_cache()
+        snapshot.clear_cache()
+        scoring.clear_cache()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_recommendations(n_tickers=1500, n_months=48, repeats=5):
+    """
+    Cold/warm latency of GET /recommendations.
+
+    cold:        model artifact but no snapshot on disk (first request after
+                 a 'train' job)
+    warm (disk): snapshot on disk, not yet loaded by this worker
+    warm (mem):  snapshot already loaded by this worker
+    """
+    from . import snapshot
+
+    with _synthetic_app(n_tickers, n_months) as app:
+        client = app.test_client()
+        cold = _time_request(client, '/recommendations')
+
+        warm_disk = []
+        for _ in range(repeats):
+            snapshot.clear_cache()
+            warm_disk.append(_time_request(client, '/recommendations'))
+
+        warm_mem = [_time_request(client, '/recommendations') for _ in range(repeats)]
+
+        print(f"GET /recommendations ({n_tickers} tickers x {n_months} months)")
+        print(f"  cold (build snapshot):   {cold * 1000:8.1f} ms")
+        print(f"  warm (read from disk):   {np.median(warm_disk) * 1000:8.1f} ms (median of {repeats})")
+        print(f"  warm (in memory):        {np.median(warm_mem) * 1000:8.1f} ms (median of {repeats})")
+        return {'cold': cold, 'warm_disk': warm_disk, 'warm_mem': warm_mem}
+
+
+def bench_scoring(n_tickers=1500, n_months=48, repeats=5):
+    """Latency of POST /api/score for growing ticker lists (parity is in tests/test_scoring.py)."""
+    with _synthetic_app(n_tickers, n_months) as app:
+        client = app.test_client()
+        _time_request(client, '/recommendations')  # writes the snapshot
+
+        tickers = [f'T{i:04d}' for i in range(n_tickers)]
+        print(f"POST /api/score ({n_tickers} tickers in the latest month)")
+        results = {}
+        for count in (10, 100, n_tickers):
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                response = client.post('/api/score', json={'tickers': tickers[:count]})
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/api/score returned {response.status_code}")
+            results[count] = timings
+            print(f"  {count:>5} tickers: {np.median(timings) * 1000:8.1f} ms (median of {repeats})")
+        return results
+
+
+def bench_inference(n_tickers=1500, n_months=48, repeats=20):
+    """NumPy tree evaluator vs CatBoost latency on the latest month (parity is in tests/test_inference.py)."""
+    from . import feature_store, model_store
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_inference_')
+    original_dir = model_store.ARTIFACT_DIR
+    try:
+        root = os.path.join(tmp_dir, 'feature_store')
+        make_synthetic_store(root, n_tickers, n_months)
+        model_store.ARTIFACT_DIR = os.path.join(tmp_dir, 'model_artifacts')
+        model_store.clear_cache()
+
+        ensemble = model_store.get_model(root)
+        key = model_store.artifact_key(model_store.data_version(root))
+        catboost_model = model_store.load_catboost_model(key)
+        X = model_store.clean_features(feature_store.read_latest(root))[model_store.FEATURE_COLS].to_numpy()
+
+        timings = {}
+        for label, model in (('catboost', catboost_model), ('numpy', ensemble)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                model.predict_proba(X)
+            timings[label] = (time.perf_counter() - start) / repeats
+
+        print(f"Inference on {len(X)} rows ({ensemble.tree_count_} trees)")
+        for label, elapsed in timings.items():
+            print(f"  {label:<9} {elapsed * 1000:8.2f} ms (mean of {repeats})")
+        return timings
+    finally:
+        model_store.ARTIFACT_DIR = original_dir
+        model_store.clear_cache()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _smaps_rollup_mb():
+    """Unique (private) and proportional set size of this process (Linux only)."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']
+
+
+def _serve_and_measure(root, tickers, barrier, results):
+    """Forked 'web worker': score every ticker, then report memory while all workers are alive."""
+    from . import scoring
+    scoring.score(tickers, root)
+    barrier.wait()
+    results.put(_smaps_rollup_mb())
+    barrier.wait()
+
+
+def _fork_workers(root, tickers, n_workers):
+    ctx = multiprocessing.get_context('fork')
+    barrier, results = ctx.Barrier(n_workers), ctx.Queue()
+    workers = [ctx.Process(target=_serve_and_measure, args=(root, tickers, barrier, results))
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    measured = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return np.mean([uss for uss, _ in measured]), np.mean([pss for _, pss in measured])
+
+
+@contextlib.contextmanager
+def _offline_pipeline(tmp_dir):
+    """
+    Model artifacts and snapshots redirected into `tmp_dir` for the block;
+    yields generate_stock_features() keyword arguments that put the feature
+    store and every cache there too.
+    """
+    from . import model_store, scoring, snapshot
+
+    originals = (model_store.ARTIFACT_DIR, snapshot.SNAPSHOT_DIR)
+    try:
+        model_store.ARTIFACT_DIR = os.path.join(tmp_dir, 'model_artifacts')
+        snapshot.SNAPSHOT_DIR = os.path.join(tmp_dir, 'snapshots')
+        yield {
+            'output_path': os.path.join(tmp_dir, 'feature_store'),
+            'price_cache_path': os.path.join(tmp_dir, 'price_cache'),
+            'metadata_path': os.path.join(tmp_dir, 'ticker_metadata', 'metadata.parquet'),
+            'checkpoint_path': os.path.join(tmp_dir, 'checkpoints'),
+        }
+    finally:
+        model_store.ARTIFACT_DIR, snapshot.SNAPSHOT_DIR = originals
+        model_store.clear_cache()
+        snapshot.clear_cache()
+        scoring.clear_cache()
+
+
+def bench_pipeline(n_tickers=1500, n_years=5, latency=0.0):
+    """
+    The whole regeneration (universe, prices, features, dividends, store,
+    model and snapshot) on an OfflineProvider, with every cache and artifact
+    in a temporary directory: a full run, then an incremental one. Reports
+    the time spent in each progress stage.
+    """
+    from . import providers
+    from .stock_data_generator import generate_stock_features
+
+    provider = providers.OfflineProvider(n_tickers=n_tickers, n_years=n_years, latency=latency)
+    tmp_dir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        with _offline_pipeline(tmp_dir) as paths:
+            print(f"Regeneration pipeline (offline provider: {n_tickers} tickers x {n_years} years, "
+                  f"{latency} s per call)")
+            results = {}
+            for mode in ('full', 'incremental'):
+                events = []
+                start = time.perf_counter()
+                with _quiet():
+                    summary = generate_stock_features(
+                        mode=mode, provider=provider,
+                        progress=lambda stage, message, **data: events.append((stage, time.perf_counter())),
+                        **paths)
+                total = time.perf_counter() - start
+
+                stages, previous = {}, start
+                for stage, at in events:
+                    stages[stage] = stages.get(stage, 0.0) + at - previous
+                    previous = at
+                results[mode] = {'total': total, 'rows': summary['rows'], **stages}
+                print(f"  {mode:11s} {total:6.1f} s, {summary['rows']} rows: "
+                      + ', '.join(f"{stage} {seconds:.1f} s" for stage, seconds in stages.items()))
+            return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def bench_resume(n_tickers=1500, n_years=5, interrupt_after=30):
+    """
+    A regeneration that dies `interrupt_after` months into the feature stage,
+    rerun, vs an uninterrupted run: time and feature months computed (that
+    both publish the same store is checked in tests/test_resume.py).
+    """
+    from . import providers
+    from .stock_data_generator import generate_stock_features
+
+    def interrupt(stage, message, done=None, **data):
+        if stage == 'features' and done == interrupt_after:
+            raise _Interrupted(message)
+
+    provider = providers.OfflineProvider(n_tickers=n_tickers, n_years=n_years)
+    tmp_dir = tempfile.mkdtemp(prefix='bench_resume_')
+    try:
+        with _offline_pipeline(tmp_dir) as paths:
+            timings, computed = {}, {}
+            with _quiet():
+                try:
+                    generate_stock_features(provider=provider, progress=interrupt, **paths)
+                    raise AssertionError("The run wasn't interrupted")
+                except _Interrupted:
+                    pass
+
+                # Rerun with the interrupted run's checkpoints, then from
+                # scratch (the price cache is warm for both)
+                runs = {'resumed': paths, 'uninterrupted': {
+                    **paths, 'output_path': os.path.join(tmp_dir, 'reference_store'),
+                    'checkpoint_path': os.path.join(tmp_dir, 'reference_checkpoints')}}
+                for name, run_paths in runs.items():
+                    stages = []
+                    start = time.perf_counter()
+                    generate_stock_features(provider=provider, progress=lambda stage, *_, **__: stages.append(stage),
+                                            **run_paths)
+                    timings[name] = time.perf_counter() - start
+                    computed[name] = stages.count('features')
+
+        print(f"Resumed regeneration (offline provider: {n_tickers} tickers x {n_years} years, "
+              f"interrupted {interrupt_after} months into the features)")
+        for name, seconds in timings.items():
+            print(f"  {name:13s} {seconds:6.1f} s, {computed[name]} feature months computed")
+        return timings
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_score_now(n_tickers=1500, n_years=5):
+    """
+    'score' mode vs a full regeneration on an OfflineProvider: time to a
+    fresh recommendation snapshot (parity is in tests/test_score_mode.py).
+    """
+    from . import providers, snapshot
+    from .stock_data_generator import generate_stock_features
+
+    provider = providers.OfflineProvider(n_tickers=n_tickers, n_years=n_years)
+    print(f"Score now (offline provider: {n_tickers} tickers x {n_years} years)")
+    tmp_dir = tempfile.mkdtemp(prefix='bench_score_now_')
+    try:
+        with _offline_pipeline(tmp_dir) as paths:
+            timings = {}
+            # The full run leaves the price cache and model that 'score' reuses
+            for mode in ('full', 'score'):
+                start = time.perf_counter()
+                with _quiet():
+                    generate_stock_features(mode=mode, provider=provider, **paths)
+                timings[mode] = time.perf_counter() - start
+                stats = snapshot.load_snapshot()['stats']
+                print(f"  {mode:6s} {timings[mode]:6.1f} s, snapshot as of {stats['last_updated']} "
+                      f"({stats['total_analyzed']} tickers scored)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return timings
+
+
+def bench_preload(n_tickers=1500, n_months=48, n_workers=4):
+    """
+    Per-worker memory of forked workers that score the latest month, with and
+    without scoring.preload() in the parent, and the switch to a newly
+    published version after preloading (Linux only).
+    """
+    import gc
+
+    from . import model_store, scoring
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_preload_')
+    original_dir = model_store.ARTIFACT_DIR
+    try:
+        root = os.path.join(tmp_dir, 'feature_store')
+        make_synthetic_store(root, n_tickers, n_months)
+        model_store.ARTIFACT_DIR = os.path.join(tmp_dir, 'model_artifacts')
+        tickers = [f'T{i:04d}' for i in range(n_tickers)]
+        # Train the model and write the feature cache, then forget them
+        model_store.get_model(root)
+        scoring.score(tickers, root)
+        model_store.clear_cache()
+        scoring.clear_cache()
+
+        print(f"{n_workers} forked workers scoring {n_tickers} tickers")
+        uss, pss = _fork_workers(root, tickers, n_workers)
+        print(f"  without preload: {uss:7.1f} MB private, {pss:7.1f} MB proportional per worker")
+        scoring.preload(root)
+        preload_uss, preload_pss = _fork_workers(root, tickers, n_workers)
+        gc.unfreeze()
+        print(f"  with preload:    {preload_uss:7.1f} MB private, {preload_pss:7.1f} MB proportional per worker")
+
+        # A regeneration publishes a new version; the preloaded process must follow it
+        before = scoring.score(tickers[:1], root)['version']
+        make_synthetic_store(root, n_tickers, n_months, seed=7)
+        model_store.get_model(root)
+        after = scoring.score(tickers[:1], root)['version']
+        if after == before or after != model_store.artifact_key(model_store.data_version(root)):
+            raise AssertionError("Preloaded scoring did not switch to the newly published version")
+        print(f"  version switch after publish: {before} -> {after}")
+        return {'without': (uss, pss), 'with': (preload_uss, preload_pss)}
+    finally:
+        model_store.ARTIFACT_DIR = original_dir
+        model_store.clear_cache()
+        scoring.clear_cache()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _load_csv(path):
+    df = pd.read_csv(path)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def _load_csv_latest(path):
+    df = _load_csv(path)
+    return df[df['date'] == df['date'].max()]
+
+
+def _load_store(root):
+    from . import feature_store
+    return feature_store.read_features(root=root)
+
+
+def _load_store_latest(root):
+    from . import feature_store
+    return feature_store.read_latest(root=root)
+
+
+def bench_metadata(n_tickers=300, scale=0.05):
+    """
+    Dividend metadata for the feature set against a StubServer for `info`
+    (0.5 s a call, 5 calls/s before throttling): the original one-at-a-time
+    loop vs ticker_metadata with an empty cache, then with a warm one.
+    Durations are multiplied by `scale` and reported scaled back up.
+    """
+    from . import downloader, ticker_metadata
+
+    tickers = [f'T{i:04d}' for i in range(n_tickers)]
+    rng = np.random.default_rng(0)
+    infos = {ticker: {'name': f'{ticker} Corp', 'sector': 'Industrials', 'dividend_yield': float(y),
+                      'dividend_rate': float(y) * 50, 'payout_ratio': 0.4}
+             for ticker, y in zip(tickers, rng.uniform(0, 0.05, n_tickers))}
+
+    def server():
+        return StubServer(infos.get, latency=0.5 * scale, limit=round(5 / scale))
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_metadata_')
+    try:
+        path = os.path.join(tmp_dir, 'metadata.parquet')
+        sequential = server()
+        start = time.perf_counter()
+        yields = {ticker: sequential.fetch(ticker)['dividend_yield'] for ticker in tickers}
+        timings = {'one at a time': (time.perf_counter() - start, sequential)}
+
+        for name in ('cold cache', 'warm cache'):
+            stub = server()
+            start = time.perf_counter()
+            with _quiet():
+                metadata = ticker_metadata.get_metadata(tickers, path=path, fetch=stub.fetch,
+                                                        limiter=_scaled_limiter(scale),
+                                                        retry_base=downloader.RETRY_DELAY * scale)
+            timings[name] = (time.perf_counter() - start, stub)
+            if not metadata['dividend_yield'].to_dict() == yields:
+                raise AssertionError(f"{name}: dividend yields differ from the server's")
+
+        print(f"Dividend metadata ({n_tickers} tickers, stub server: 0.5 s/call, throttles above 5 calls/s)")
+        for name, (seconds, stub) in timings.items():
+            print(f"  {name:13s} {seconds / scale:6.1f} s, {stub.calls} calls, {stub.throttled} throttled")
+        print("  yields match")
+        return {name: seconds / scale for name, (seconds, _) in timings.items()}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _make_holdings_page(n_symbols=1500, seed=0):
+    """A Zacks ETF holdings page: the holdings as a JS array whose second
+    column is the symbol button HTML (or, for some rows, the bare symbol)."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    rows = []
+    for i in range(n_symbols):
+        symbol = ''.join(rng.choice(letters, rng.integers(1, 5)))
+        if i % 50 == 0:
+            symbol += '.B'
+        cell = (f'<button class="appear-on-focus hoverquote-container-od" rel="{symbol}" aria-label="{symbol}">'
+                f'<span class="hoverquote-symbol">{symbol}<span class="sr-only"></span></span></button>'
+                if i % 100 else f' {symbol} ')
+        rows.append([f'{symbol} Holdings Inc', cell, f'{rng.uniform(0, 3):.2f}', f'{rng.integers(1e3, 1e7):,}'])
+    return (f'<html><script>var x = 1;\netf_holdings.formatted_data = {json.dumps(rows)};\n'
+            f'</script><body>{"<div>filler</div>" * 2000}</body></html>')
+
+
+def _parse_etf_holdings_reference(html_content):
+    """The original parser: a BeautifulSoup parse of every row's symbol HTML."""
+    from bs4 import BeautifulSoup
+
+    match = re.search(r'etf_holdings\.formatted_data\s*=\s*(\[.*?\]);', html_content, re.DOTALL)
+    symbol_list = []
+    for row in json.loads(match.group(1)):
+        symbol_span = BeautifulSoup(row[1], 'html.parser').find('span', class_='hoverquote-symbol')
+        symbol_list.append(symbol_span.get_text(strip=True) if symbol_span else row[1].strip())
+    return symbol_list
+
+
+def bench_universe(n_symbols=1500, latency=0.3):
+    """
+    ETF-holdings universe: parsing a page with the compiled regex vs the
+    original per-row BeautifulSoup, then get_all_tickers() against a local
+    HTTP server (`latency` s a page, ETag support) with an empty cache,
+    within the cache TTL, and after it (conditional requests).
+    """
+    import http.server
+    from unittest import mock
+
+    from . import stock_data_generator
+
+    page = _make_holdings_page(n_symbols)
+    start = time.perf_counter()
+    expected = _parse_etf_holdings_reference(page)
+    soup_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    symbols = stock_data_generator.parse_etf_holdings(page)
+    regex_seconds = time.perf_counter() - start
+    if symbols != expected:
+        raise AssertionError("Regex parse differs from BeautifulSoup")
+
+    etag = '"holdings-v1"'
+    requests_seen = collections.Counter()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            if self.headers.get('If-None-Match') == etag:
+                requests_seen['304'] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            requests_seen['200'] += 1
+            body = page.encode()
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    tmp_dir = tempfile.mkdtemp(prefix='bench_universe_')
+    try:
+        cache_path = os.path.join(tmp_dir, 'etf_holdings_cache.json')
+        urls = {cap: f'{base}/{cap}' for cap in stock_data_generator.ETF_HOLDINGS_URLS}
+        timings = {}
+        with mock.patch.dict(stock_data_generator.ETF_HOLDINGS_URLS, urls):
+            for name, ttl in (('empty cache', stock_data_generator.ETF_CACHE_TTL),
+                              ('within TTL', stock_data_generator.ETF_CACHE_TTL),
+                              ('revalidated', timedelta(0))):
+                requests_seen.clear()
+                start = time.perf_counter()
+                with mock.patch.object(stock_data_generator, 'ETF_CACHE_TTL', ttl), \
+                        _quiet():
+                    lists = stock_data_generator.get_all_tickers(cache_path)
+                timings[name] = (time.perf_counter() - start, dict(requests_seen))
+                if any(symbol_list != expected for symbol_list in lists):
+                    raise AssertionError(f"{name}: holdings differ from the page")
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"ETF holdings universe (3 pages x {n_symbols} rows, {latency} s per page)")
+    print(f"  parse: BeautifulSoup per row {soup_seconds * 1000:7.1f} ms, regex {regex_seconds * 1000:6.1f} ms "
+          f"(same symbols)")
+    for name, (seconds, seen) in timings.items():
+        print(f"  {name:12s} {seconds:5.2f} s, responses: {seen or 'none'}")
+    return {'soup': soup_seconds, 'regex': regex_seconds, **{name: t for name, (t, _) in timings.items()}}
+
+
+def bench_feature_store(n_tickers=1500, n_months=60):
+    """Load time and peak RSS growth: stock_features.csv vs the Parquet feature store."""
+    tmp_dir = tempfile.mkdtemp(prefix='bench_store_')
+    try:
+        root = os.path.join(tmp_dir, 'feature_store')
+        csv_path, _ = make_synthetic_store(root, n_tickers, n_months)
+
+        cases = [
+            ('csv, all months', _load_csv, csv_path),
+            ('store, all months', _load_store, root),
+            ('csv, latest month', _load_csv_latest, csv_path),
+            ('store, latest month', _load_store_latest, root),
+        ]
+        print(f"Feature load ({n_tickers} tickers x {n_months} months)")
+        results = {}
+        for label, fn, path in cases:
+            elapsed, rss_mb, rows = _in_subprocess(fn, path)
+            results[label] = (elapsed, rss_mb)
+            print(f"  {label:<20} {elapsed * 1000:8.1f} ms  {rss_mb:7.1f} MB peak RSS  ({rows} rows)")
+        return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def make_synthetic_prices(n_tickers=1500, n_years=5, seed=42):
+    """Daily closes shaped like download_prices() output (see providers.synthetic_prices)."""
+    from .providers import synthetic_prices
+
+    return synthetic_prices(n_tickers, n_years, seed)
+
+
+def _month_windows(returns, lookback_months=6, forward_months=3):
+    from .stock_data_generator import _month_bounds
+
+    monthly_dates = returns.index.to_series().resample('ME').last().index
+    return _month_bounds(returns.index, monthly_dates[lookback_months:-forward_months],
+                         lookback_months, forward_months)[:, :2]
+
+
+def bench_correlation(n_tickers=1500, n_years=5):
+    """
+    Monthly avg/max/min correlations: RollingCorrelation vs DataFrame.corr()
+    (parity is in tests/test_correlation.py).
+    """
+    from .correlation import RollingCorrelation
+
+    returns = make_synthetic_prices(n_tickers, n_years).ffill().pct_change(fill_method=None)
+    windows = _month_windows(returns)
+    start = time.perf_counter()
+    for lo, hi in windows:
+        corr = returns.iloc[lo:hi].corr().to_numpy()
+        np.fill_diagonal(corr, np.nan)
+        np.nanmean(corr, axis=0), np.nanmax(corr, axis=0), np.nanmin(corr, axis=0)
+    pandas_seconds = (time.perf_counter() - start) / len(windows)
+
+    start = time.perf_counter()
+    engine = RollingCorrelation(returns.to_numpy())
+    for lo, hi in windows:
+        engine.summary(lo, hi)
+    engine_seconds = (time.perf_counter() - start) / len(windows)
+
+    print(f"Monthly correlation features ({n_tickers} tickers, {len(windows)} months)")
+    print(f"  DataFrame.corr():   {pandas_seconds * 1000:8.1f} ms per month")
+    print(f"  RollingCorrelation: {engine_seconds * 1000:8.1f} ms per month "
+          f"({pandas_seconds / engine_seconds:.0f}x)")
+    return {'pandas': pandas_seconds, 'engine': engine_seconds}
+
+
+class StubServer:
+    """
+    Local stand-in for a Yahoo endpoint: each call takes about `latency`
+    seconds and answers `respond(ticker)`, and calls beyond `limit` in any
+    second are refused with downloader.RateLimited, like Yahoo's throttling.
+    """
+
+    def __init__(self, respond, latency=0.3, limit=5, seed=0):
+        self.respond = respond
+        self.latency = latency
+        self.limit = limit
+        self.calls = 0
+        self.throttled = 0
+        self._recent = collections.deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fetch(self, ticker):
+        from .downloader import RateLimited
+
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.limit:
+                self.throttled += 1
+                raise RateLimited(f"Too many requests ({ticker})")
+            self._recent.append(now)
+            latency = self.latency * self._random.uniform(0.5, 1.5)
+        time.sleep(latency)
+        return self.respond(ticker)
+
+
+def _scaled_limiter(scale):
+    """A RateLimiter with the downloader's settings, for durations multiplied by `scale`."""
+    from . import downloader
+
+    return downloader.RateLimiter(rate=downloader.INITIAL_RATE / scale, min_rate=downloader.MIN_RATE / scale,
+                                  max_rate=downloader.MAX_RATE / scale, increase=downloader.RATE_INCREASE / scale)
+
+
+def _download_fixed_sleeps(tickers, fetch, batch_size=30, delay=2.0, retry_pause=10.0):
+    """The original schedule: batches one after another (a call per ticker)
+    with a fixed sleep after each, then one retry pass after a pause."""
+    closes, failed = {}, []
+    for attempt_tickers, pause in ((tickers, 0.0), (None, retry_pause)):
+        if attempt_tickers is None:
+            attempt_tickers, failed = failed, []
+            if not attempt_tickers:
+                break
+        time.sleep(pause)
+        for i in range(0, len(attempt_tickers), batch_size):
+            for ticker in attempt_tickers[i:i + batch_size]:
+                try:
+                    close = fetch(ticker)
+                except Exception:
+                    close = None
+                if close is None:
+                    failed.append(ticker)
+                else:
+                    closes[ticker] = close
+            time.sleep(delay)
+    return closes, failed
+
+
+def bench_downloader(n_tickers=300, scale=0.05):
+    """
+    Price download against a StubServer (0.3 s a call, 5 calls/s before
+    throttling): the original batches with fixed sleeps vs the concurrent
+    downloader with adaptive rate limiting. Every duration (latencies,
+    sleeps, rates) is multiplied by `scale` to keep the run short; the times
+    reported are scaled back up.
+    """
+    from . import downloader
+
+    prices = make_synthetic_prices(n_tickers, n_years=1)
+    tickers = list(prices.columns)
+    expected = {ticker for ticker in tickers if prices[ticker].notna().any()}
+
+    def respond(ticker):
+        close = prices[ticker].dropna()
+        return close if len(close) else None
+
+    def server():
+        return StubServer(respond, latency=0.3 * scale, limit=round(5 / scale))
+
+    results = {}
+    fixed = server()
+    start = time.perf_counter()
+    closes, _ = _download_fixed_sleeps(tickers, fixed.fetch, delay=2.0 * scale, retry_pause=10.0 * scale)
+    results['fixed sleeps'] = (time.perf_counter() - start, closes, fixed)
+
+    adaptive = server()
+    limiter = _scaled_limiter(scale)
+    start = time.perf_counter()
+    with _quiet():
+        closes, _ = downloader.download(tickers, adaptive.fetch, limiter=limiter,
+                                        retry_base=downloader.RETRY_DELAY * scale)
+    results['adaptive'] = (time.perf_counter() - start, closes, adaptive)
+
+    print(f"Price download ({n_tickers} tickers, stub server: 0.3 s/call, throttles above 5 calls/s)")
+    for name, (seconds, closes, stub) in results.items():
+        if set(closes) != expected:
+            raise AssertionError(f"{name}: missing {sorted(expected - set(closes))[:5]}...")
+        if not all(closes[ticker].equals(prices[ticker].dropna()) for ticker in closes):
+            raise AssertionError(f"{name}: downloaded closes differ from the server's")
+        print(f"  {name:13s} {seconds / scale:6.1f} s, {stub.calls} calls, {stub.throttled} throttled")
+    print(f"  adaptive rate settled at {limiter.rate * scale:.1f} calls/s; both downloads complete")
+    return {name: seconds / scale for name, (seconds, _, _) in results.items()}
+
+
+def bench_features(n_tickers=1500, n_years=5):
+    """create_feature_dataset() vs the original per-ticker loop: time (parity is in tests/test_features.py)."""
+    import warnings
+    # The loop is kept with the tests (run from the repository root)
+    from tests.parity import create_feature_dataset_reference
+    from .stock_data_generator import create_feature_dataset
+
+    prices = make_synthetic_prices(n_tickers, n_years)
+    with warnings.catch_warnings():
+        # The reference loop uses pct_change()'s deprecated implicit forward fill,
+        # and np.corrcoef warns on flat return series
+        warnings.simplefilter('ignore', FutureWarning)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        start = time.perf_counter()
+        expected = create_feature_dataset_reference(prices)
+        loop_seconds = time.perf_counter() - start
+
+    with _quiet():
+        start = time.perf_counter()
+        actual = create_feature_dataset(prices)
+        vectorized_seconds = time.perf_counter() - start
+
+    print(f"create_feature_dataset ({n_tickers} tickers x {n_years} years, {len(actual)} rows)")
+    print(f"  per-ticker loop: {loop_seconds:8.2f} s")
+    print(f"  vectorized:      {vectorized_seconds:8.2f} s ({loop_seconds / vectorized_seconds:.0f}x)")
+    return {'loop': loop_seconds, 'vectorized': vectorized_seconds}
+
+
+def bench_feature_workers(n_tickers=1500, n_years=5, worker_counts=(1, 2, 4, 8)):
+    """
+    create_feature_dataset() with the months spread over 1, 2, 4 and 8
+    processes: wall time, speedup and whether every run matches the
+    single-process output exactly.
+    """
+    from .stock_data_generator import create_feature_dataset
+
+    prices = make_synthetic_prices(n_tickers, n_years)
+    results, baseline = {}, None
+    print(f"create_feature_dataset workers ({n_tickers} tickers x {n_years} years, {os.cpu_count()} CPUs)")
+    for workers in worker_counts:
+        with _quiet():
+            start = time.perf_counter()
+            df = create_feature_dataset(prices, workers=workers)
+            elapsed = time.perf_counter() - start
+        baseline = df if baseline is None else baseline
+        if not df.equals(baseline):
+            raise AssertionError(f"Output with {workers} workers differs from {worker_counts[0]} worker(s)")
+        results[workers] = elapsed
+        print(f"  {workers} worker(s): {elapsed:7.2f} s ({results[worker_counts[0]] / elapsed:.2f}x)")
+    return results
+
+
+def _traced_peak(fn, *args):
+    """Peak bytes allocated by Python and numpy while fn ran (tracemalloc)."""
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _write_collected(prices, root):
+    from . import feature_store
+    from .stock_data_generator import create_feature_dataset
+
+    feature_store.write_features(create_feature_dataset(prices), root)
+
+
+def _write_streamed(prices, root):
+    from . import feature_store
+    from .stock_data_generator import iter_feature_batches
+
+    feature_store.write_batches(iter_feature_batches(prices), root)
+
+
+def bench_feature_memory(n_tickers=1500, years=(2, 5, 10)):
+    """
+    Peak traced memory of generating and writing the feature store: the
+    whole dataset built and then written vs months streamed into the store,
+    over growing histories (the ceiling is in tests/test_feature_memory.py).
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='bench_feature_memory_')
+    try:
+        print(f"Feature generation peak memory ({n_tickers} tickers, tracemalloc)")
+        results = {}
+        for n_years in years:
+            prices = make_synthetic_prices(n_tickers, n_years)
+            with _quiet():
+                collected = _traced_peak(_write_collected, prices, os.path.join(tmp_dir, f'collected_{n_years}'))
+                streamed = _traced_peak(_write_streamed, prices, os.path.join(tmp_dir, f'streamed_{n_years}'))
+            results[n_years] = {'collected': collected, 'streamed': streamed}
+            print(f"  {n_years:2d} years: collected {collected / 2 ** 20:6.1f} MB, "
+                  f"streamed {streamed / 2 ** 20:6.1f} MB")
+        return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_incremental(n_tickers=1500, n_years=5):
+    """
+    Monthly refresh: incremental generation (new and trailing months upserted
+    into the store) vs a full rebuild (parity is in tests/test_incremental.py).
+    """
+    from . import feature_store
+    from .stock_data_generator import INCREMENTAL_HISTORY_MONTHS, _incremental_start, create_feature_dataset
+
+    prices = make_synthetic_prices(n_tickers, n_years)
+    # The universe is the ETFs' current holdings, so nothing in it stopped
+    # trading years ago. (A full rebuild would carry such a ticker's last
+    # price forward into the market average; an incremental run never sees it.)
+    prices = prices.loc[:, prices.iloc[-300:].notna().any()]
+    last_month = prices.index[-1] - pd.DateOffset(months=1)
+    tmp_dir = tempfile.mkdtemp(prefix='bench_incremental_')
+    try:
+        incremental_root = os.path.join(tmp_dir, 'incremental')
+        full_root = os.path.join(tmp_dir, 'full')
+        with _quiet():
+            # The store as last month's run left it
+            feature_store.write_features(create_feature_dataset(prices.loc[:last_month]), incremental_root)
+            before = feature_store.load_manifest(incremental_root)['partitions']
+
+            start = time.perf_counter()
+            first_month = _incremental_start(incremental_root, forward_months=3)
+            history = prices.loc[first_month - pd.DateOffset(months=INCREMENTAL_HISTORY_MONTHS):]
+            new_rows = create_feature_dataset(history, start=first_month)
+            feature_store.upsert_features(new_rows, incremental_root)
+            incremental_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            feature_store.write_features(create_feature_dataset(prices), full_root)
+            full_seconds = time.perf_counter() - start
+
+        after = feature_store.load_manifest(incremental_root)['partitions']
+        rewritten = sorted(month for month in after if before.get(month) != after[month])
+        full_rows = sum(entry['rows'] for entry in feature_store.load_manifest(full_root)['partitions'].values())
+
+        print(f"Monthly refresh ({n_tickers} tickers x {n_years} years, {len(after)} months)")
+        print(f"  incremental: {incremental_seconds:7.2f} s ({len(new_rows)} rows, months {', '.join(rewritten)})")
+        print(f"  full:        {full_seconds:7.2f} s ({full_rows} rows)")
+        return {'incremental': incremental_seconds, 'full': full_seconds}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_price_cache(n_tickers=1500, n_years=5, n_changed=20):
+    """
+    Daily price refresh through the price cache: a cold run (everything
+    downloaded) vs the next day's run, where the universe also gained and
+    lost tickers and a few tickers split (their history re-adjusted). Closes
+    "downloaded" come from a stub standing in for yfinance, which counts them.
+    """
+    from . import price_cache
+
+    remote = make_synthetic_prices(n_tickers + n_changed, n_years)
+    tickers = list(remote.columns)
+    day_one, day_two = remote.index[-2] + pd.Timedelta(hours=18), remote.index[-1] + pd.Timedelta(hours=18)
+    split = tickers[:n_changed // 4]
+    remote_day_two = remote.copy()
+    remote_day_two.loc[remote.index[:-1], split] /= 2
+    transferred = {'closes': 0, 'requests': 0}
+
+    def stub_download(history, now):
+        def download(batch, start):
+            first = pd.Timestamp(start) if start is not None else now - price_cache.HISTORY
+            frame = history.loc[(history.index >= first) & (history.index <= now), batch].dropna(axis=1, how='all')
+            transferred['closes'] += int(frame.notna().to_numpy().sum())
+            transferred['requests'] += len(batch)
+            return frame
+        return download
+
+    def expected(history, now, universe):
+        frame = history.loc[(history.index >= now - price_cache.HISTORY) & (history.index <= now), universe]
+        return frame.dropna(axis=1, how='all')
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_price_cache_')
+    try:
+        results = {}
+        runs = (
+            ('cold', remote, day_one, tickers[:n_tickers]),
+            ('next day', remote_day_two, day_two, tickers[n_changed:]),
+        )
+        print(f"Price refresh ({n_tickers} tickers x {n_years} years; next day: {n_changed} tickers added, "
+              f"{n_changed} dropped, {len(split)} split)")
+        for name, history, now, universe in runs:
+            transferred.update(closes=0, requests=0)
+            start = time.perf_counter()
+            with _quiet():
+                prices = price_cache.update_prices(universe, stub_download(history, now), root=tmp_dir, now=now)
+            seconds = time.perf_counter() - start
+            pd.testing.assert_frame_equal(prices, expected(history, now, universe), check_names=False)
+            results[name] = {'seconds': seconds, **transferred}
+            print(f"  {name:9s} {seconds:6.2f} s, {transferred['closes']:9,d} closes downloaded "
+                  f"({transferred['requests']} ticker requests)")
+        print("  cached closes match a full download")
+        return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+BENCHMARKS = {
+    'correlation': bench_correlation,
+    'downloader': bench_downloader,
+    'feature_memory': bench_feature_memory,
+    'feature_store': bench_feature_store,
+    'feature_workers': bench_feature_workers,
+    'features': bench_features,
+    'incremental': bench_incremental,
+    'inference': bench_inference,
+    'metadata': bench_metadata,
+    'pipeline': bench_pipeline,
+    'preload': bench_preload,
+    'price_cache': bench_price_cache,
+    'recommendations': bench_recommendations,
+    'resume': bench_resume,
+    'score_now': bench_score_now,
+    'scoring': bench_scoring,
+    'universe': bench_universe,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS) + ['all'])
+    args = parser.parse_args()
+
+    names = sorted(BENCHMARKS) if args.benchmark == 'all' else [args.benchmark]
+    for name in names:
+        BENCHMARKS[name]()
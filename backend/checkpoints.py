@@ -0,0 +1,122 @@
+"""
+Regeneration checkpoints - what each stage of a regeneration produced, kept
+on disk until the run finishes so a run that dies part way can be resumed.
+
+Each checkpoint is keyed by a hash of the stage's inputs (input_key), so a
+rerun picks up a stage's result only when it would compute the same thing:
+a new day, a different universe or different prices mean new keys and the
+stage runs again. Saving a stage's checkpoint removes that stage's
+checkpoints under other keys, and a finished run clears them all.
+
+Layout:
+    checkpoints/
+        universe-<key>.json              JSON-serializable results
+        prices-<key>.parquet             DataFrame results
+        features-<key>/2024-05.parquet   one file per completed month
+        features-<key>.json              written once every month is done
+
+Files are written to a temporary name and renamed into place, so a
+checkpoint that exists is complete.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), 'checkpoints')
+
+
+def input_key(*inputs):
+    """
+    Short hash of a stage's inputs: JSON-serializable values, and pandas
+    objects by their contents (index and column labels included).
+    """
+    digest = hashlib.sha256()
+    for value in inputs:
+        if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+            digest.update(pd.util.hash_pandas_object(value).to_numpy().tobytes())
+            if isinstance(value, pd.DataFrame):
+                digest.update(json.dumps([str(column) for column in value.columns]).encode())
+        else:
+            digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def _path(root, stage, key, extension=''):
+    return os.path.join(root or DEFAULT_ROOT, f'{stage}-{key}{extension}')
+
+
+def _replace(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+
+
+def _remove_others(root, stage, key):
+    """Drop `stage`'s checkpoints under keys other than `key`."""
+    for path in glob.glob(os.path.join(root or DEFAULT_ROOT, f'{stage}-*')):
+        if os.path.basename(path).split('.')[0] != f'{stage}-{key}':
+            _remove(path)
+
+
+def load(stage, key, root=None):
+    """The saved result of `stage` under `key`, or None if there is none."""
+    frame_path = _path(root, stage, key, '.parquet')
+    if os.path.exists(frame_path):
+        return pd.read_parquet(frame_path)
+    json_path = _path(root, stage, key, '.json')
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            return json.load(f)
+    return None
+
+
+def save(stage, key, value, root=None):
+    """Save `value` (a DataFrame, or anything JSON-serializable) as `stage`'s result; returns it."""
+    _remove_others(root, stage, key)
+    if isinstance(value, pd.DataFrame):
+        _replace(_path(root, stage, key, '.parquet'), value.to_parquet)
+    else:
+        def write_json(path):
+            with open(path, 'w') as f:
+                json.dump(value, f, indent=2, sort_keys=True, default=str)
+        _replace(_path(root, stage, key, '.json'), write_json)
+    return value
+
+
+def saved_months(stage, key, root=None):
+    """Sorted 'YYYY-MM' keys of the months saved for `stage` under `key`."""
+    paths = glob.glob(os.path.join(_path(root, stage, key), '*.parquet'))
+    return sorted(os.path.basename(path)[:-len('.parquet')] for path in paths)
+
+
+def save_month(stage, key, month, df, root=None):
+    """Save one month ('YYYY-MM') of a stage that produces its result a month at a time."""
+    month_dir = _path(root, stage, key)
+    if not os.path.isdir(month_dir):
+        _remove_others(root, stage, key)
+    _replace(os.path.join(month_dir, f'{month}.parquet'), df.to_parquet)
+
+
+def load_month(stage, key, month, root=None):
+    return pd.read_parquet(os.path.join(_path(root, stage, key), f'{month}.parquet'))
+
+
+def clear(root=None):
+    """Remove every checkpoint in `root` (the run they belonged to has finished)."""
+    # Stage names have no '-', so other directories (another provider's scope) stay
+    for path in glob.glob(os.path.join(root or DEFAULT_ROOT, '*-*')):
+        _remove(path)
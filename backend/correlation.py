@@ -0,0 +1,174 @@
+"""
+Correlation engine for the avg/max/min correlation features.
+
+Each month needs, for every ticker, the mean, max and min of its pairwise
+correlations with every other ticker over the lookback window, with each
+pair using only the days both have returns (like DataFrame.corr()).
+
+Pairwise-complete correlations come from five moment matrices over the
+window's rows, each a matrix multiply of the scaled returns X (stored as
+float32) and their validity mask M (stored as bool):
+
+    N = M'M     days both tickers have returns
+    Z = (X≠0)'M days ticker i's return is nonzero on those days
+    S = X'M     sum of ticker i's returns on those days
+    Q = X²'M    sum of ticker i's squared returns on those days
+    P = X'X     sum of the products
+
+Consecutive monthly windows share most of their rows, so the moments are
+updated by adding the rows entering the window and subtracting the rows
+leaving it instead of being recomputed. The multiplies accumulate in
+float64: a product of two float32 values is exact there, so removing a row
+takes back what adding it put in. Correlations are then derived a
+block of rows at a time and reduced to mean/max/min without keeping the
+full matrix.
+"""
+
+import numpy as np
+
+# Rows of the correlation matrix derived (and reduced) at a time
+BLOCK_SIZE = 64
+# Updates after which the moments are recomputed from scratch, so rounding
+# in the running sums can't build up
+REFRESH_EVERY = 12
+# A pair whose variance over its common days is below this share of its sum
+# of squares is flat there (only rounding is left), and has no correlation
+# (DataFrame.corr() gives NaN). All-zero runs are caught exactly by Z.
+FLAT_TOLERANCE = 1e-12
+
+
+class RollingCorrelation:
+    """
+    Pairwise-complete Pearson correlations between the columns of `returns`
+    over a window of rows that moves forward through the matrix.
+
+    `dtype` is the type the scaled returns are stored in; the moments are
+    always accumulated in float64.
+
+    Usage:
+        engine = RollingCorrelation(returns)
+        for lo, hi in windows:
+            avg, max_, min_ = engine.summary(lo, hi)
+    """
+
+    def __init__(self, returns, dtype=np.float32, block_size=BLOCK_SIZE, refresh_every=REFRESH_EVERY):
+        # Kept in the type it comes in: no float64 copy of a float32 matrix
+        returns = np.asarray(returns)
+        if not np.issubdtype(returns.dtype, np.floating):
+            returns = returns.astype(float)
+        valid = np.isfinite(returns)
+        values = np.where(valid, returns, 0)
+        # Correlation doesn't change when a column is scaled, so every column
+        # is stored at unit RMS and the moments are of the same size for all
+        # tickers. Returns aren't centered: a run of zero returns (a delisted
+        # ticker carried forward) stays exactly zero, and so exactly flat.
+        sum_sq = np.einsum('ij,ij->j', values, values, dtype=float)
+        rms = np.sqrt(sum_sq / np.maximum(valid.sum(axis=0), 1))
+        scale = np.divide(1.0, rms, out=np.ones_like(rms), where=rms > 0)
+
+        self.dtype = dtype
+        self.block_size = block_size
+        self.refresh_every = refresh_every
+        # Scaled in float64 and rounded once into `dtype`, without a float64 copy
+        self._x = np.multiply(values, scale, out=np.empty(values.shape, dtype), casting='same_kind')
+        # The masks are converted a window at a time, in _row_parts
+        self._m = valid
+        self._nonzero = values != 0
+        self._lo = self._hi = 0
+        self._updates = 0
+        n = returns.shape[1]
+        self._moments = np.zeros((5, n, n))  # N, Z, S, Q, P
+
+    def _row_parts(self, lo, hi, sign=1.0):
+        """Factors of the moments of rows lo:hi (sign -1: rows leaving the window)."""
+        x = self._x[lo:hi].astype(float)
+        m = self._m[lo:hi].astype(float)
+        # N, Z, S and Q all pair a column with the mask
+        left = np.hstack([m, self._nonzero[lo:hi].astype(float), x, x * x])
+        return left, sign * m, x, sign * x
+
+    def _accumulate(self, parts, reset=False):
+        left, m, x_left, x_right = (np.vstack(arrays) for arrays in zip(*parts))
+        n = m.shape[1]
+        # One moment at a time, so no more than one n x n temporary is alive
+        pairs = [(left[:, k * n:(k + 1) * n], m) for k in range(4)] + [(x_left, x_right)]
+        for moment, (a, b) in zip(self._moments, pairs):
+            if reset:
+                np.matmul(a.T, b, out=moment)
+            else:
+                moment += a.T @ b
+
+    def move_to(self, lo, hi, recompute=False):
+        """
+        Make rows lo:hi the current window. With `recompute`, the moments are
+        computed from the window's rows rather than updated, so the results
+        from here on don't depend on the windows visited before.
+        """
+        if (lo, hi) == (self._lo, self._hi) and not recompute:
+            return
+        changed = abs(lo - self._lo) + abs(hi - self._hi)
+        if (recompute or lo < self._lo or hi < self._hi or changed >= hi - lo
+                or self._updates >= self.refresh_every):
+            self._accumulate([self._row_parts(lo, hi)], reset=True)
+            self._updates = 0
+        else:
+            # Rows entering and rows leaving (negated) in one multiply
+            self._accumulate([self._row_parts(self._hi, hi), self._row_parts(self._lo, lo, sign=-1.0)])
+            self._updates += 1
+        self._lo, self._hi = lo, hi
+
+    def _blocks(self):
+        """(row slice, correlation block with NaN for undefined pairs and the diagonal)"""
+        count, nonzero, sums, sum_sq, products = self._moments
+        n = count.shape[0]
+        for start in range(0, n, self.block_size):
+            rows = slice(start, min(start + self.block_size, n))
+            # Pair (i, j) of the block: i's sums are row i of S and Q, j's are row j
+            s_i, q_i = sums[rows], sum_sq[rows]
+            s_j, q_j = np.ascontiguousarray(sums[:, rows].T), np.ascontiguousarray(sum_sq[:, rows].T)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inv_n = 1.0 / count[rows]
+                mean_j = s_j * inv_n
+                var_i = q_i - s_i * s_i * inv_n
+                var_j = q_j - s_j * mean_j
+                corr = products[rows].copy()
+                corr -= s_i * mean_j
+                corr /= np.sqrt(var_i * var_j)
+            undefined = (count[rows] < 2) | (nonzero[rows] == 0)
+            undefined |= np.ascontiguousarray(nonzero[:, rows].T) == 0
+            undefined |= var_i <= FLAT_TOLERANCE * q_i
+            undefined |= var_j <= FLAT_TOLERANCE * q_j
+            corr[undefined] = np.nan
+            np.clip(corr, -1, 1, out=corr)
+            block_rows = np.arange(rows.stop - rows.start)
+            corr[block_rows, block_rows + start] = np.nan
+            yield rows, corr
+
+    def matrix(self, lo, hi):
+        """The full correlation matrix of rows lo:hi (diagonal NaN)."""
+        self.move_to(lo, hi)
+        n = self._moments.shape[1]
+        result = np.empty((n, n))
+        for rows, corr in self._blocks():
+            result[rows] = corr
+        return result
+
+    def summary(self, lo, hi):
+        """
+        Mean, max and min of each column's correlations with the other
+        columns over rows lo:hi, skipping pairs without one (NaN if none).
+
+        Returns:
+            (avg, max, min) float arrays, one value per column
+        """
+        self.move_to(lo, hi)
+        n = self._moments.shape[1]
+        avg, max_, min_ = np.empty(n), np.empty(n), np.empty(n)
+        for rows, corr in self._blocks():
+            pairs = n - np.isnan(corr).sum(axis=1)
+            with np.errstate(invalid='ignore'):
+                avg[rows] = np.nansum(corr, axis=1) / pairs
+            # fmax/fmin skip NaN (and give NaN when a row has no pairs)
+            max_[rows] = np.fmax.reduce(corr, axis=1)
+            min_[rows] = np.fmin.reduce(corr, axis=1)
+        return avg, max_, min_
@@ -0,0 +1,187 @@
+"""
+Concurrent downloader - fetches one ticker per call on a few worker threads,
+paced by an adaptive rate limiter instead of fixed sleeps.
+
+The limiter is a token bucket whose rate rises a little after every
+successful call and is cut when a call fails, sharply when the server says
+it is throttling. Failed tickers are retried after a jittered exponential
+delay; a retry whose delay has passed is taken before fresh work, so retries
+run interleaved with the rest of the download rather than in a pass at the
+end.
+
+The fetch function is pluggable: `fetch(ticker)` returns the ticker's data,
+None when the server has none, or raises RateLimited when throttled (any
+other exception counts as an error). benchmarks.py drives the downloader
+with a local stub that simulates latency and rate limiting.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Calls in flight at once
+WORKERS = 4
+# Calls per second: at the start, and the bounds the limiter adapts within
+INITIAL_RATE = 2.0
+MIN_RATE = 0.2
+MAX_RATE = 10.0
+# Calls that may go out back to back once the bucket has filled
+BURST = 4
+# Added to the rate after each successful call
+RATE_INCREASE = 0.1
+# The rate is multiplied by these after an error and after a throttled call
+ERROR_BACKOFF = 0.75
+THROTTLE_BACKOFF = 0.5
+# Tries per ticker, and the delay before the first retry (doubled each retry)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 2.0
+
+
+class RateLimited(Exception):
+    """Raised by a fetch function when the server is throttling requests."""
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the worker threads. acquire() blocks until a
+    call may go out; succeeded()/failed() adapt the rate (additive increase,
+    multiplicative decrease).
+    """
+
+    def __init__(self, rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, burst=BURST,
+                 increase=RATE_INCREASE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+    def succeeded(self):
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failed(self, throttled=False):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * (THROTTLE_BACKOFF if throttled else ERROR_BACKOFF))
+            if throttled:
+                # Don't spend a saved-up burst on a server that is pushing back
+                self._tokens = min(self._tokens, 0.0)
+
+
+class Unlimited:
+    """Stands in for a RateLimiter where nothing needs pacing (offline data)."""
+
+    def acquire(self):
+        pass
+
+    def succeeded(self):
+        pass
+
+    def failed(self, throttled=False):
+        pass
+
+
+def retry_delay(attempt, base=RETRY_DELAY):
+    """Seconds before retry number `attempt` (1 = first retry), jittered ±50%."""
+    return base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def download(tickers, fetch, workers=WORKERS, limiter=None, max_attempts=MAX_ATTEMPTS,
+             retry_base=RETRY_DELAY, on_progress=None):
+    """
+    Fetch every ticker, retrying failures.
+
+    Args:
+        tickers: Tickers to fetch
+        fetch: `fetch(ticker)` -> data, None if there is none, RateLimited if throttled
+        workers: Calls in flight at once
+        limiter: RateLimiter (default: a new one with the module's settings)
+        max_attempts: Tries per ticker before it is given up on
+        retry_base: Delay before a ticker's first retry
+        on_progress: Optional `on_progress(done, total)` after each ticker finishes
+
+    Returns:
+        ({ticker: data}, [tickers that failed every attempt])
+    """
+    limiter = limiter or RateLimiter()
+    fresh = deque(dict.fromkeys(tickers))
+    total = len(fresh)
+    retries = []  # heap of (ready at, sequence, ticker)
+    sequence = itertools.count()
+    attempts = dict.fromkeys(fresh, 0)
+    results, failed = {}, []
+
+    def call(ticker):
+        limiter.acquire()
+        return fetch(ticker)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while fresh or retries or running:
+            now = time.monotonic()
+            while len(running) < workers:
+                if retries and retries[0][0] <= now:
+                    ticker = heapq.heappop(retries)[2]
+                elif fresh:
+                    ticker = fresh.popleft()
+                else:
+                    break
+                attempts[ticker] += 1
+                running[pool.submit(call, ticker)] = ticker
+
+            timeout = max(0.0, retries[0][0] - now) if retries else None
+            if not running:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                ticker = running.pop(future)
+                try:
+                    data = future.result()
+                except RateLimited:
+                    limiter.failed(throttled=True)
+                    data = None
+                except Exception as e:
+                    print(f"  {ticker} failed: {e}")
+                    limiter.failed()
+                    data = None
+                else:
+                    limiter.succeeded()
+
+                if data is not None:
+                    results[ticker] = data
+                elif attempts[ticker] < max_attempts:
+                    ready_at = time.monotonic() + retry_delay(attempts[ticker], retry_base)
+                    heapq.heappush(retries, (ready_at, next(sequence), ticker))
+                    continue
+                else:
+                    failed.append(ticker)
+                if on_progress is not None:
+                    on_progress(len(results) + len(failed), total)
+
+    return results, failed
@@ -0,0 +1,338 @@
+"""
+Feature store - the (ticker, month) feature dataset stored as Parquet files
+partitioned by month, replacing the single stock_features.csv.
+
+Layout:
+    feature_store/
+        CURRENT                     name of the published version directory
+        v-<version>/
+            _manifest.json          months, row counts and per-file hashes
+            month=2024-01/part-0.parquet
+            month=2024-02/part-0.parquet
+            ...
+
+Each write goes to a new version directory and is published by atomically
+rewriting CURRENT, so readers never see a half-written dataset and the
+version string doubles as a cheap content hash for caches and models.
+upsert_features() publishes a version with only some months rewritten and
+links the other partitions from the current version. write_batches() takes
+the rows as a stream of batches (the generator yields a month at a time).
+Months whose target (the forward return) isn't complete yet are marked with
+"target_complete": false in the manifest; see incomplete_months(). An
+upserted version's manifest lists the versions it descends from (see
+ancestors()), so a model trained on an older version can tell whether the
+current data continues it.
+
+CLI usage (convert an existing CSV):
+    python -m backend.feature_store import backend/stock_features.csv
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), 'feature_store')
+CURRENT_NAME = 'CURRENT'
+MANIFEST_NAME = '_manifest.json'
+PART_NAME = 'part-0.parquet'
+KEEP_VERSIONS = 2
+# Ancestor versions an upserted manifest keeps (about two years of monthly runs)
+MAX_ANCESTORS = 24
+
+FLOAT_COLS = [
+    'momentum', 'volatility', 'avg_correlation', 'max_correlation',
+    'min_correlation', 'market_correlation', 'sharpe', 'momentum_accel',
+    'future_return', 'dividend_yield'
+]
+
+SCHEMA = pa.schema(
+    [('ticker', pa.string()), ('date', pa.timestamp('ns'))]
+    + [(col, pa.float32()) for col in FLOAT_COLS]
+    + [('beat_market', pa.int8())]
+)
+
+
+def _month_key(date):
+    return pd.Timestamp(date).strftime('%Y-%m')
+
+
+def _partition_path(version_dir, month):
+    return os.path.join(version_dir, f'month={month}', PART_NAME)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_table(df):
+    """Cast a feature frame to the store schema (float32 features, int8 target)."""
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    for col in FLOAT_COLS:
+        if col not in df.columns:
+            df[col] = np.nan
+        df[col] = df[col].astype(np.float32)
+    df['beat_market'] = df['beat_market'].astype(np.int8)
+    return pa.Table.from_pandas(df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+
+
+def current_version(root=None):
+    """Version string of the published dataset, or None if nothing is published."""
+    try:
+        with open(os.path.join(root or DEFAULT_ROOT, CURRENT_NAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _version_dir(root=None, version=None):
+    root = root or DEFAULT_ROOT
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"No feature data has been published in {root}")
+    return os.path.join(root, f'v-{version}')
+
+
+def load_manifest(root=None, version=None):
+    with open(os.path.join(_version_dir(root, version), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def list_months(root=None):
+    """Sorted 'YYYY-MM' keys of all partitions in the published dataset."""
+    return sorted(load_manifest(root)['partitions'])
+
+
+def ancestors(root=None, version=None):
+    """
+    Versions the published (or given) version was upserted from, newest
+    first. A full write starts a new lineage and has none.
+    """
+    return load_manifest(root, version).get('ancestors', [])
+
+
+def incomplete_months(root=None):
+    """Sorted 'YYYY-MM' keys of the published months whose targets aren't complete yet."""
+    partitions = load_manifest(root)['partitions']
+    return sorted(month for month, entry in partitions.items() if not entry.get('target_complete', True))
+
+
+def _publish(root, staging_dir, partitions, ancestors=()):
+    """Hash the staged partitions, move them into place and point CURRENT at them."""
+    digest = hashlib.sha256()
+    for month in sorted(partitions):
+        digest.update(f"{month}:{partitions[month]['sha256']}".encode())
+        if not partitions[month].get('target_complete', True):
+            digest.update(b':incomplete')
+    version = digest.hexdigest()[:16]
+
+    manifest = {'version': version, 'partitions': partitions, 'ancestors': list(ancestors)}
+    with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    version_dir = os.path.join(root, f'v-{version}')
+    if os.path.exists(version_dir):
+        # Identical content was already published
+        shutil.rmtree(staging_dir)
+    else:
+        os.replace(staging_dir, version_dir)
+
+    current_path = os.path.join(root, CURRENT_NAME)
+    tmp_path = f'{current_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, current_path)
+
+    _prune(root, keep=version)
+    return version
+
+
+def _prune(root, keep):
+    """Remove all but the newest KEEP_VERSIONS version directories."""
+    versions = sorted(
+        (entry for entry in os.scandir(root) if entry.is_dir() and entry.name.startswith('v-')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    older = [entry for entry in versions if entry.name != f'v-{keep}']
+    for entry in older[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _write_partitions(df, staging_dir):
+    """Write one Parquet file per month of `df` into `staging_dir`; returns their manifest entries."""
+    table = _to_table(df)
+    months = pd.to_datetime(df['date']).dt.strftime('%Y-%m').to_numpy()
+
+    partitions = {}
+    for month in np.unique(months):
+        path = _partition_path(staging_dir, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table.filter(pa.array(months == month)), path)
+        partitions[month] = {'rows': int((months == month).sum()), 'sha256': _sha256(path)}
+    return partitions
+
+
+def _staging_dir(root):
+    os.makedirs(root, exist_ok=True)
+    staging_dir = os.path.join(root, f'.staging-{os.getpid()}')
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return staging_dir
+
+
+def write_batches(batches, root=None, upsert=False, incomplete=()):
+    """
+    Publish a dataset written one batch of rows at a time, so it never has
+    to be held in memory as a whole. Each batch goes straight to its
+    months' Parquet files; a month's rows must all come in one batch.
+
+    Args:
+        batches: Iterable of feature frames (like write_features' `df`)
+        root: Store directory (defaults to backend/feature_store)
+        upsert: Keep the current dataset's other months (see upsert_features)
+            instead of replacing the whole dataset
+        incomplete: 'YYYY-MM' keys of the written months whose targets
+            aren't complete yet (see incomplete_months)
+
+    Returns:
+        The new version string
+    """
+    root = root or DEFAULT_ROOT
+    staging_dir = _staging_dir(root)
+    partitions = {}
+    for df in batches:
+        written = _write_partitions(df, staging_dir)
+        if repeated := sorted(written.keys() & partitions.keys()):
+            raise ValueError(f"Month {repeated[0]} came in more than one batch")
+        partitions.update(written)
+    for month in incomplete:
+        if month in partitions:
+            partitions[month]['target_complete'] = False
+
+    lineage = []
+    if upsert and current_version(root) is not None:
+        version_dir = _version_dir(root)
+        with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        existing = manifest['partitions']
+        lineage = ([manifest['version']] + manifest.get('ancestors', []))[:MAX_ANCESTORS]
+        for month, entry in existing.items():
+            if month in partitions:
+                continue
+            path = _partition_path(staging_dir, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(_partition_path(version_dir, month), path)
+            except OSError:
+                shutil.copy2(_partition_path(version_dir, month), path)
+            partitions[month] = entry
+    return _publish(root, staging_dir, partitions, lineage)
+
+
+def write_features(df, root=None, incomplete=()):
+    """
+    Replace the published dataset with `df`, one Parquet file per month.
+
+    Args:
+        df: Feature frame as produced by create_feature_dataset + dividends
+        root: Store directory (defaults to backend/feature_store)
+        incomplete: Months whose targets aren't complete yet (see write_batches)
+
+    Returns:
+        The new version string
+    """
+    return write_batches([df], root, incomplete=incomplete)
+
+
+def upsert_features(df, root=None, incomplete=()):
+    """
+    Publish the current dataset with the months in `df` added or replaced.
+    Every other month's partition is carried over unchanged (hard-linked
+    where the filesystem allows), so only the new months are written.
+
+    Returns:
+        The new version string
+    """
+    return write_batches([df], root, upsert=True, incomplete=incomplete)
+
+
+def _read_months(months, version_dir, columns=None):
+    tables = [
+        pq.read_table(_partition_path(version_dir, month), columns=columns, memory_map=True)
+        for month in months
+    ]
+    if not tables:
+        return _empty_frame(columns)
+    return pa.concat_tables(tables).to_pandas()
+
+
+def _empty_frame(columns=None):
+    return SCHEMA.empty_table().select(columns or SCHEMA.names).to_pandas()
+
+
+def _resolve(root=None, version=None):
+    """Pin the current version once so a concurrent publish can't mix versions."""
+    version_dir = _version_dir(root, version)
+    with open(os.path.join(version_dir, MANIFEST_NAME)) as f:
+        months = sorted(json.load(f)['partitions'])
+    return version_dir, months
+
+
+def read_features(start=None, end=None, root=None, columns=None):
+    """
+    Read the months between `start` and `end` (inclusive, any date-like or
+    'YYYY-MM'); both default to the full range.
+    """
+    version_dir, months = _resolve(root)
+    if start is not None:
+        months = [m for m in months if m >= _month_key(start)]
+    if end is not None:
+        months = [m for m in months if m <= _month_key(end)]
+    return _read_months(months, version_dir, columns)
+
+
+def read_latest(root=None, columns=None):
+    """Read only the most recent month's partition."""
+    version_dir, months = _resolve(root)
+    return _read_months(months[-1:], version_dir, columns)
+
+
+def read_month(month, root=None, columns=None, version=None):
+    """Read a single month ('YYYY-MM' or any date in that month), of `version` if given."""
+    version_dir, months = _resolve(root, version)
+    month = _month_key(month)
+    return _read_months([month] if month in months else [], version_dir, columns)
+
+
+def derived_path(name, root=None, version=None):
+    """
+    Path for a file computed from a published version (e.g. a cached matrix).
+    It lives in the version directory, so it is removed along with it.
+    """
+    return os.path.join(_version_dir(root, version), name)
+
+
+def import_csv(csv_path, root=None):
+    """Convert a legacy stock_features.csv into the store."""
+    df = pd.read_csv(csv_path)
+    return write_features(df, root)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'import':
+        root = sys.argv[3] if len(sys.argv) > 3 else None
+        print(f"Published feature store version {import_csv(sys.argv[2], root)}")
+    else:
+        print("Usage: python -m backend.feature_store import <stock_features.csv> [store_dir]")
+        sys.exit(1)
@@ -0,0 +1,107 @@
+"""
+Holdings scoring - the logged-in user's positions from their latest uploaded
+statement, scored by the recommendation model.
+
+The user's positions are read with two queries (their statement dates, then
+every position on the latest one) and joined to the feature data through the
+scoring module's in-memory ticker index, so the cost doesn't grow with one
+query per symbol.
+"""
+
+from datetime import datetime
+
+from .models import db, Position
+
+# Holdings the model gives less than this chance of beating the market are flagged
+FLAG_BELOW = 0.5
+
+# Statement rows that aren't securities
+NON_SECURITY_SYMBOLS = ('Account Total', 'Cash & Cash Investments')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%m/%d/%Y')
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_symbol(symbol):
+    """Brokerage symbol -> feature store ticker (e.g. 'BRK/B' -> 'BRK.B')."""
+    return symbol.strip().upper().replace('/', '.')
+
+
+def latest_positions(user_id):
+    """
+    Positions from the user's most recent statement.
+
+    Returns:
+        (statement date string or None, list of Position)
+    """
+    dates = [row.Date for row in db.session.query(Position.Date).filter(
+        Position.user_id == user_id,
+        Position.Date.isnot(None)
+    ).distinct()]
+    dated = [(parsed, date) for date in dates if (parsed := _parse_date(date)) is not None]
+    if not dated:
+        return None, []
+    latest_date = max(dated)[1]
+
+    positions = Position.query.filter(
+        Position.user_id == user_id,
+        Position.Date == latest_date,
+        Position.Symbol.isnot(None),
+        Position.Symbol.notin_(NON_SECURITY_SYMBOLS)
+    ).all()
+    return latest_date, positions
+
+
+def owned_tickers(user_id):
+    """Tickers in the user's latest statement."""
+    _, positions = latest_positions(user_id)
+    return {normalize_symbol(position.Symbol) for position in positions}
+
+
+def score_holdings(user_id, root=None):
+    """
+    Score every holding in the user's latest statement.
+
+    Returns:
+        dict with the statement date, the month scored, per-holding results
+        (sorted by probability, lowest first, with a `flagged` marker) and the
+        holdings the model has no features for
+    """
+    statement_date, positions = latest_positions(user_id)
+    by_ticker = {normalize_symbol(position.Symbol): position for position in positions}
+    if not by_ticker:
+        return {'statement_date': statement_date, 'as_of': None, 'version': None,
+                'holdings': [], 'unscored': []}
+
+    from . import scoring
+
+    scored = scoring.score(list(by_ticker), root)
+    holdings = []
+    for result in scored['results']:
+        position = by_ticker[result['ticker']]
+        holdings.append({
+            **result,
+            'description': position.Description,
+            'quantity': position.Qty_Quantity,
+            'market_value': position.Mkt_Val,
+            'security_type': position.Security_Type,
+            'flagged': result['prob_beat_market'] < FLAG_BELOW,
+        })
+    holdings.sort(key=lambda holding: holding['prob_beat_market'])
+
+    unscored = [
+        {'ticker': ticker, 'description': by_ticker[ticker].Description,
+         'security_type': by_ticker[ticker].Security_Type}
+        for ticker in scored['missing']
+    ]
+    return {
+        'statement_date': statement_date,
+        'as_of': scored['as_of'],
+        'version': scored['version'],
+        'holdings': holdings,
+        'unscored': unscored,
+    }
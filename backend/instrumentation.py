@@ -0,0 +1,145 @@
+"""
+Pipeline instrumentation - wall time, CPU time, peak memory and throughput
+of each stage of a regeneration and of each download batch inside one.
+
+generate_stock_features() measures its stages into a RunMetrics; the worker
+saves the record of every run (finished or failed) to the run history
+(see run_history), where regressions show up as a stage that got slower
+or bigger than in earlier runs.
+
+Peak RSS is the kernel's high-water mark, reset at the start of each span
+on Linux so every stage gets its own peak. Elsewhere it can't be reset and
+each span reports the process peak so far. CPU time includes the feature
+worker processes once they have exited.
+"""
+
+import contextlib
+import os
+import resource
+import sys
+import time
+from datetime import datetime
+
+
+def proc_status_mb(field):
+    """A memory field of /proc/self/status (e.g. 'VmRSS') in MB."""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS watermark (Linux only); False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak RSS of this process since the last reset_peak_rss() (or since it started)."""
+    if os.path.exists('/proc/self/status'):
+        return proc_status_mb('VmHWM')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def cpu_seconds():
+    """CPU time of this process and its finished children."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class RunMetrics:
+    """
+    Measurements of one regeneration run.
+
+    Usage:
+        metrics = RunMetrics()
+        with metrics.stage('features') as counts:
+            ...
+            counts['rows'] = len(rows)
+        metrics.record()  # JSON-serializable summary
+    """
+
+    def __init__(self):
+        self.started_at = datetime.utcnow()
+        # What the run was, e.g. {'mode': 'full', 'provider': 'yahoo'}
+        self.info = {}
+        self.stages = []
+        self.batches = []
+        self._start_wall = time.perf_counter()
+        self._start_cpu = cpu_seconds()
+        self._peak = 0.0
+        self._open = []  # peaks seen so far by the spans in progress, outermost first
+
+    def _watermark(self):
+        """Fold the current peak into every open span before the watermark is reset."""
+        peak = peak_rss_mb()
+        self._open = [max(seen, peak) for seen in self._open]
+        self._peak = max(self._peak, peak)
+        return peak
+
+    @contextlib.contextmanager
+    def _span(self, entries, name, counts):
+        self._watermark()
+        reset_peak_rss()
+        self._open.append(0.0)
+        counts = dict(counts)
+        start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+        try:
+            yield counts
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = cpu_seconds() - start_cpu
+            self._watermark()
+            peak = self._open.pop()
+            if self._open:
+                self._open[-1] = max(self._open[-1], peak)
+            entry = {'name': name, 'wall_seconds': round(wall, 3), 'cpu_seconds': round(cpu, 3),
+                     'peak_rss_mb': round(peak, 1), **counts}
+            for unit in ('rows', 'tickers'):
+                if counts.get(unit) is not None and wall > 0:
+                    entry[f'{unit}_per_second'] = round(counts[unit] / wall, 1)
+            entries.append(entry)
+
+    def stage(self, name, **counts):
+        """
+        Context manager measuring one stage. Yields a dict of counts ('rows',
+        'tickers', ...) the block can fill in; rows and tickers are also
+        reported per second.
+        """
+        return self._span(self.stages, name, counts)
+
+    def batch(self, stage, **counts):
+        """Like stage(), for one download batch inside `stage`."""
+        return self._span(self.batches, stage, counts)
+
+    def record(self):
+        """The run so far: totals, then one entry per stage and per batch."""
+        self._watermark()
+        return {
+            **self.info,
+            'started_at': self.started_at.isoformat(),
+            'wall_seconds': round(time.perf_counter() - self._start_wall, 3),
+            'cpu_seconds': round(cpu_seconds() - self._start_cpu, 3),
+            'peak_rss_mb': round(self._peak, 1),
+            'stages': list(self.stages),
+            'batches': list(self.batches),
+        }
+
+    def report(self):
+        """Lines summarizing each stage, for the console."""
+        lines = []
+        for entry in self.stages:
+            rate = ''.join(f", {entry[key]:,.0f} {key.split('_')[0]}/s"
+                           for key in ('rows_per_second', 'tickers_per_second') if key in entry)
+            resumed = ' (from checkpoint)' if entry.get('resumed') else ''
+            lines.append(f"  {entry['name']:10s} {entry['wall_seconds']:8.1f} s wall, "
+                         f"{entry['cpu_seconds']:8.1f} s CPU, {entry['peak_rss_mb']:7.0f} MB peak{rate}{resumed}")
+        return lines
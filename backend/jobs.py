@@ -0,0 +1,509 @@
+"""
+Job registry and queue - regeneration and training jobs kept in the
+database, so every gunicorn worker reports the same status. Web workers only
+enqueue jobs and read them; backend/worker.py claims and runs them, one at a
+time across all worker processes.
+
+All functions need a Flask app context.
+
+Configuration (environment variables):
+    MAX_EVENT_STREAMS  progress streams a web process keeps open at once;
+                       further clients poll /api/regeneration-status (default 4)
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, inspect, literal, text
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, JobEventSequence, RegenerationJob
+from .progress import STAGES, stage_percent
+
+JOB_KINDS = ('regenerate', 'score', 'train')
+COMPLETE_MESSAGES = {
+    'regenerate': 'Stock data regeneration complete',
+    'score': 'Scores refreshed from recent prices',
+    'train': 'Model training complete',
+}
+ACTIVE_STATES = ('queued', 'running')
+
+# A running job whose worker hasn't checked in for this long is assumed dead
+STALE_AFTER = timedelta(minutes=15)
+# Number of past successful runs used for the ETA
+ETA_HISTORY = 5
+# Minimum seconds between progress writes within the same stage
+WRITE_INTERVAL = 0.5
+# Below gunicorn's 8 threads per worker, so streams can't take every thread
+MAX_EVENT_STREAMS = int(os.getenv('MAX_EVENT_STREAMS', '4'))
+
+_table_ready = False
+
+
+def _add_missing_columns(table):
+    """
+    Bring a table created by an earlier release up to date with its model:
+    ALTER TABLE ADD COLUMN for each missing column (with its scalar default
+    for existing rows) and a unique index for unique ones. Rows are kept.
+    """
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    dialect = db.engine.dialect
+    with db.engine.begin() as connection:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}'
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg, column.type).compile(
+                    dialect=dialect, compile_kwargs={'literal_binds': True})
+                ddl += f' DEFAULT {default}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+            connection.execute(text(ddl))
+            if column.unique:
+                connection.execute(text(f'CREATE UNIQUE INDEX uq_{table.name}_{column.name} '
+                                        f'ON {table.name} ({column.name})'))
+
+
+def _ensure_table():
+    global _table_ready
+    if not _table_ready:
+        if inspect(db.engine).has_table(RegenerationJob.__tablename__):
+            _add_missing_columns(RegenerationJob.__table__)
+        RegenerationJob.__table__.create(db.engine, checkfirst=True)
+        JobEventSequence.__table__.create(db.engine, checkfirst=True)
+        if db.session.get(JobEventSequence, 1) is None:
+            # Start above the ids of jobs recorded before the sequence existed
+            last = db.session.query(func.max(RegenerationJob.event_id)).scalar() or 0
+            db.session.add(JobEventSequence(id=1, value=last))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another process created it first
+                db.session.rollback()
+        _table_ready = True
+
+
+def _next_event_id():
+    """
+    The next SSE event id. The counter row is updated in the caller's
+    transaction, so a concurrent writer waits for it to commit: ids are
+    unique and increase in commit order across processes.
+    """
+    return db.session.execute(
+        JobEventSequence.__table__.update()
+        .where(JobEventSequence.id == 1)
+        .values(value=JobEventSequence.value + 1)
+        .returning(JobEventSequence.value)
+    ).scalar_one()
+
+
+def _timings(job):
+    return json.loads(job.stage_timings) if job.stage_timings else {}
+
+
+def _close_stage(job, now):
+    """Add the time spent in the job's current stage to its stage timings."""
+    if job.stage and job.stage_started_at:
+        timings = _timings(job)
+        timings[job.stage] = timings.get(job.stage, 0) + (now - job.stage_started_at).total_seconds()
+        job.stage_timings = json.dumps(timings)
+
+
+def expire_stale_jobs():
+    """Fail running jobs whose worker stopped checking in (e.g. it was killed)."""
+    _ensure_table()
+    cutoff = datetime.utcnow() - STALE_AFTER
+    stale = RegenerationJob.query.filter(
+        RegenerationJob.active_slot.isnot(None),
+        RegenerationJob.updated_at < cutoff,
+        db.or_(RegenerationJob.heartbeat_at.is_(None), RegenerationJob.heartbeat_at < cutoff)
+    ).all()
+    for job in stale:
+        finish_job(job.id, error='No progress reported - the worker process stopped')
+    return len(stale)
+
+
+def enqueue(kind='regenerate', params=None, requested_by=None):
+    """
+    Queue a job for the background worker.
+
+    Args:
+        kind: One of JOB_KINDS
+        params: JSON-serializable keyword arguments for the job
+        requested_by: Id of the user queueing it (may cancel it)
+
+    Returns:
+        The job id, or None if a job of this kind is already queued or running
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    expire_stale_jobs()
+    if RegenerationJob.query.filter_by(kind=kind, state='running').first() is not None:
+        return None
+
+    now = datetime.utcnow()
+    job = RegenerationJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params=json.dumps(params or {}),
+        state='queued',
+        stage='queued',
+        message='Waiting for a background worker',
+        percent=0,
+        rows_produced=0,
+        event_id=_next_event_id(),
+        started_at=now,
+        stage_started_at=now,
+        updated_at=now,
+        queued_kind=kind,
+        requested_by=requested_by
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return job.id
+
+
+def claim_next_job(worker_pid):
+    """
+    Move the oldest queued job to running for this worker.
+
+    Returns:
+        The claimed job, or None if the queue is empty or a job is already running
+    """
+    expire_stale_jobs()
+    job = RegenerationJob.query.filter_by(state='queued').order_by(RegenerationJob.started_at).first()
+    if job is None:
+        return None
+
+    now = datetime.utcnow()
+    _close_stage(job, now)
+    job.state = 'running'
+    job.stage = 'started'
+    job.message = 'Job started'
+    job.started_at = now
+    job.stage_started_at = now
+    job.updated_at = now
+    job.heartbeat_at = now
+    job.event_id = _next_event_id()
+    job.queued_kind = None
+    job.active_slot = 1
+    job.worker_pid = worker_pid
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker is running a job (or claimed this one first)
+        db.session.rollback()
+        return None
+    return job
+
+
+def heartbeat(job_id):
+    """
+    Record that the worker running `job_id` is alive.
+
+    Returns:
+        True if cancellation of the job has been requested
+    """
+    db.session.rollback()
+    job = db.session.get(RegenerationJob, job_id)
+    if job is None:
+        return False
+    job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+    return job.cancel_requested
+
+
+def cancel_job(job_id):
+    """
+    Cancel a job: queued jobs are cancelled immediately, running ones are
+    stopped by their worker at its next heartbeat.
+
+    Returns:
+        The job, or None if it doesn't exist
+    """
+    _ensure_table()
+    job = db.session.get(RegenerationJob, job_id)
+    if job is None:
+        return None
+    if job.state == 'queued':
+        finish_job(job_id, error='Cancelled', state='cancelled')
+    elif job.state == 'running':
+        job.cancel_requested = True
+        job.message = 'Cancelling...'
+        job.event_id = _next_event_id()
+        db.session.commit()
+    return job
+
+
+def update_job(job_id, stage, message='', done=None, total=None, rows=None, force=False):
+    """Record a progress event; writes within a stage are throttled unless `force`."""
+    job = db.session.get(RegenerationJob, job_id)
+    if job is None:
+        return
+    now = datetime.utcnow()
+    if (not force and stage == job.stage
+            and (now - job.updated_at).total_seconds() < WRITE_INTERVAL):
+        return
+
+    if stage != job.stage:
+        _close_stage(job, now)
+        job.stage = stage
+        job.stage_started_at = now
+    job.message = message[:255]
+    percent = stage_percent(stage, done, total)
+    if percent is not None:
+        job.percent = percent
+    if rows is not None:
+        job.rows_produced = rows
+    job.updated_at = now
+    job.event_id = _next_event_id()
+    db.session.commit()
+
+
+def finish_job(job_id, error=None, state=None):
+    """
+    Mark a job succeeded (or failed with `error`) and free its slot.
+
+    `state` overrides the final state, e.g. 'cancelled'.
+    """
+    job = db.session.get(RegenerationJob, job_id)
+    if job is None:
+        return
+    now = datetime.utcnow()
+    _close_stage(job, now)
+    job.state = state or ('failed' if error else 'succeeded')
+    job.stage = 'error' if error else 'done'
+    if job.state == 'cancelled':
+        job.message = 'Cancelled'
+    elif error:
+        job.message = f'{job.kind.capitalize()} job failed: {error}'[:255]
+    else:
+        job.message = COMPLETE_MESSAGES[job.kind]
+    job.error = error
+    if not error:
+        job.percent = 100
+    job.finished_at = now
+    job.updated_at = now
+    job.event_id = _next_event_id()
+    job.active_slot = None
+    job.queued_kind = None
+    db.session.commit()
+
+
+def progress_callback(job_id):
+    """A pipeline progress callback that records events on `job_id`."""
+    def report(stage, message='', done=None, total=None, rows=None, **data):
+        update_job(job_id, stage, message, done=done, total=total, rows=rows)
+    return report
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+def estimate_remaining(job):
+    """
+    Seconds left for a running job, from the median stage durations of the
+    last ETA_HISTORY successful runs. None if there is no history yet.
+    """
+    history = RegenerationJob.query.filter_by(kind=job.kind, state='succeeded').order_by(
+        RegenerationJob.finished_at.desc()
+    ).limit(ETA_HISTORY).all()
+    if not history:
+        return None
+
+    past_timings = [_timings(past) for past in history]
+    typical = {
+        stage: _median([t[stage] for t in past_timings if stage in t]) or 0
+        for stage in STAGES
+    }
+
+    stage_order = list(STAGES)
+    current = job.stage if job.stage in typical else 'started'
+    in_stage = (datetime.utcnow() - job.stage_started_at).total_seconds() if job.stage_started_at else 0
+    remaining = max(typical[current] - in_stage, 0)
+    remaining += sum(typical[stage] for stage in stage_order[stage_order.index(current) + 1:])
+    return round(remaining)
+
+
+def serialize(job, with_eta=True):
+    if job is None:
+        return None
+    elapsed_end = job.finished_at or datetime.utcnow()
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'state': job.state,
+        'stage': job.stage,
+        'message': job.message,
+        'percent': job.percent,
+        'rows_produced': job.rows_produced,
+        'stage_timings': _timings(job),
+        'error': job.error,
+        'started_at': job.started_at.isoformat(timespec='seconds') + 'Z',
+        'finished_at': job.finished_at.isoformat(timespec='seconds') + 'Z' if job.finished_at else None,
+        'elapsed_seconds': round((elapsed_end - job.started_at).total_seconds()),
+        'cancel_requested': job.cancel_requested,
+        'eta_seconds': estimate_remaining(job) if with_eta and job.state in ACTIVE_STATES else None,
+    }
+
+
+def get_job(job_id):
+    _ensure_table()
+    return db.session.get(RegenerationJob, job_id)
+
+
+def latest_job():
+    _ensure_table()
+    return RegenerationJob.query.order_by(RegenerationJob.started_at.desc()).first()
+
+
+def active_job():
+    """The running job, else the oldest queued one."""
+    _ensure_table()
+    return (RegenerationJob.query.filter_by(state='running').first()
+            or RegenerationJob.query.filter_by(state='queued').order_by(RegenerationJob.started_at).first())
+
+
+def status(job_id=None):
+    """Registry view for /api/regeneration-status: job `job_id`, else the active or latest job."""
+    expire_stale_jobs()
+    job = get_job(job_id) if job_id is not None else active_job() or latest_job()
+    return {
+        'is_running': job is not None and job.state in ACTIVE_STATES,
+        'job': serialize(job)
+    }
+
+
+class RegistryEventSource:
+    """
+    Progress events for server-sent events, read from the registry so a
+    subscriber sees a regeneration running in any worker process.
+
+    One instance serves every stream of a web process: while any stream is
+    subscribed, a single poller thread reads the registry every
+    `poll_interval` seconds and wakes the streams through a Condition, so
+    the database sees one query per interval however many browsers watch.
+    At most `max_streams` streams are open at once (each holds a web
+    thread); subscribe() refuses the rest, which poll the status endpoint.
+
+    A stream either follows the most recently updated job, or (subscribed
+    with a `job_id`) only that job; the poller reads the followed jobs in
+    one more query.
+    """
+
+    def __init__(self, app, poll_interval=1.0, max_streams=MAX_EVENT_STREAMS):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.max_streams = max_streams
+        self._condition = threading.Condition()
+        self._streams = 0
+        self._latest = None
+        # Job id -> streams following it, and its latest event
+        self._followed = collections.Counter()
+        self._job_events = {}
+        self._poller = None
+
+    def subscribe(self, job_id=None):
+        """Take a stream slot (following `job_id` if given); False if all `max_streams` are in use."""
+        with self._condition:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            if job_id is not None:
+                self._followed[job_id] += 1
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='registry-events', daemon=True)
+                self._poller.start()
+            return True
+
+    def unsubscribe(self, job_id=None):
+        with self._condition:
+            self._streams -= 1
+            if job_id is not None:
+                self._followed[job_id] -= 1
+                if self._followed[job_id] <= 0:
+                    del self._followed[job_id]
+                    self._job_events.pop(job_id, None)
+
+    def _events(self, job_ids):
+        """
+        The event of the most recently updated job (so a job finishing is
+        reported before the next queued one takes over), and of `job_ids`.
+        """
+        _ensure_table()
+        latest = RegenerationJob.query.order_by(RegenerationJob.event_id.desc()).first()
+        followed = RegenerationJob.query.filter(RegenerationJob.id.in_(job_ids)).all() if job_ids else []
+        return self._event(latest), {job.id: self._event(job) for job in followed}
+
+    @staticmethod
+    def _event(job):
+        if job is None:
+            return None
+        event = serialize(job)
+        event['job_id'] = event.pop('id')
+        event['id'] = job.event_id
+        # Map job states onto the terminal stages the client listens for
+        if job.state in ('failed', 'cancelled'):
+            event['stage'] = 'error'
+        return event
+
+    def _poll(self):
+        with self.app.app_context():
+            while True:
+                with self._condition:
+                    if self._streams == 0:
+                        # The next subscriber starts a new poller with no stale event
+                        self._poller = None
+                        self._latest = None
+                        self._job_events.clear()
+                        return
+                    job_ids = list(self._followed)
+                try:
+                    # End the read transaction so the query sees other workers' commits
+                    db.session.rollback()
+                    event, job_events = self._events(job_ids)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Reading regeneration events failed: {e}")
+                    event, job_events = None, {}
+                with self._condition:
+                    changed = False
+                    if event is not None and (self._latest is None or event['id'] != self._latest['id']):
+                        self._latest = event
+                        changed = True
+                    for job_id, job_event in job_events.items():
+                        previous = self._job_events.get(job_id)
+                        if job_id in self._followed and (previous is None or job_event['id'] != previous['id']):
+                            self._job_events[job_id] = job_event
+                            changed = True
+                    if changed:
+                        self._condition.notify_all()
+                time.sleep(self.poll_interval)
+
+    def wait_for_events(self, after=None, timeout=15, job_id=None):
+        """The latest event (of `job_id` if given) newer than `after`, waiting up to `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                event = self._latest if job_id is None else self._job_events.get(job_id)
+                if event is not None and (after is None or event['id'] > after):
+                    return [event]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
@@ -0,0 +1,402 @@
+"""
+Model artifact store - trains the CatBoost recommendation model once per
+feature-dataset version and keeps it on disk so web requests only load it.
+
+Artifacts are keyed by the feature store version (a content hash of its
+partitions) plus the model hyperparameters, so a regenerated dataset (or a
+change to MODEL_PARAMS) produces a new artifact and everything else is reused.
+
+Each artifact is also exported to a small .npz evaluated by tree_model, so
+serving predictions never imports catboost - only training does.
+
+With MODEL_TRAINING_MODE=incremental, a new dataset version warm-starts from
+the previous artifact and only boosts on the months added since it was
+trained, falling back to a full retrain every FULL_RETRAIN_EVERY updates.
+Only an artifact trained on the same feature store, on a version the current
+one was upserted from (see feature_store.ancestors), is extended; anything
+else gets a full retrain.
+
+CLI usage (accuracy drift of incremental vs full retraining):
+    python -m backend.model_store report
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import feature_store
+from .tree_model import ObliviousTreeEnsemble
+
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), 'model_artifacts')
+
+FEATURE_COLS = [
+    'momentum', 'volatility', 'avg_correlation', 'max_correlation',
+    'min_correlation', 'market_correlation', 'sharpe', 'momentum_accel',
+    'dividend_yield'
+]
+
+MODEL_PARAMS = {
+    'iterations': 200,
+    'depth': 4,
+    'learning_rate': 0.05,
+    'random_state': 42,
+    'verbose': False
+}
+
+# 'full' retrains from scratch for every new dataset version, 'incremental'
+# extends the previous model with the newest months only
+TRAINING_MODE = os.getenv('MODEL_TRAINING_MODE', 'full')
+# CatBoost threads (-1 = all cores); the background worker lowers this to
+# leave CPU for the web processes. Not part of the artifact key.
+THREAD_COUNT = int(os.getenv('MODEL_THREAD_COUNT', '-1'))
+INCREMENTAL_ITERATIONS = 50
+FULL_RETRAIN_EVERY = 6
+KEEP_ARTIFACTS = 5
+
+# Loaded models by artifact key
+_models = {}
+_lock = threading.Lock()
+
+
+def artifact_key(data_version, params=None):
+    """Key for a model trained on `data_version` with `params`."""
+    params = MODEL_PARAMS if params is None else params
+    payload = json.dumps({'data': data_version, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def artifact_path(key):
+    return os.path.join(ARTIFACT_DIR, f'catboost_{key}.cbm')
+
+
+def metadata_path(key):
+    return os.path.join(ARTIFACT_DIR, f'catboost_{key}.json')
+
+
+def export_path(key):
+    return os.path.join(ARTIFACT_DIR, f'catboost_{key}.npz')
+
+
+def _catboost_classifier(**params):
+    # catboost is slow to import and large in memory; only training needs it
+    from catboost import CatBoostClassifier
+    # Without this every fit writes catboost_info/ into the working directory
+    return CatBoostClassifier(**{'allow_writing_files': False, **params})
+
+
+def load_catboost_model(key):
+    """The CatBoost model of an artifact (for training on top of it)."""
+    model = _catboost_classifier()
+    model.load_model(artifact_path(key))
+    return model
+
+
+def export_model(model, key):
+    """Convert a CatBoost model to the NumPy evaluator and save it next to the artifact."""
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    json_path = f'{artifact_path(key)}.{os.getpid()}.json.tmp'
+    try:
+        model.save_model(json_path, format='json')
+        with open(json_path) as f:
+            ensemble = ObliviousTreeEnsemble.from_catboost_json(json.load(f))
+    finally:
+        if os.path.exists(json_path):
+            os.remove(json_path)
+
+    path = export_path(key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    ensemble.save(tmp_path)
+    os.replace(tmp_path, path)
+    return ensemble
+
+
+def clean_features(df):
+    """Drop rows the model can't use (missing or infinite features)."""
+    df = df.replace([np.inf, -np.inf], np.nan)
+    return df.dropna()
+
+
+def load_features(root=None, start=None, end=None):
+    """Load (a date range of) the feature store, cleaned for the model."""
+    return clean_features(feature_store.read_features(start, end, root=root))
+
+
+def data_version(root=None):
+    """Version of the published feature data, raising if there is none."""
+    version = feature_store.current_version(root)
+    if version is None:
+        raise FileNotFoundError("No feature data published yet - regenerate the stock data first")
+    return version
+
+
+def train_model(df, params=None):
+    """Fit a fresh CatBoost classifier on the full feature dataset."""
+    params = MODEL_PARAMS if params is None else params
+    model = _catboost_classifier(**{'thread_count': THREAD_COUNT, **params})
+    model.fit(df[FEATURE_COLS], df['beat_market'])
+    return model
+
+
+def continue_training(model, df, params=None, iterations=INCREMENTAL_ITERATIONS):
+    """Boost `iterations` more trees on top of `model` using only `df`."""
+    params = MODEL_PARAMS if params is None else params
+    updated = _catboost_classifier(**{'thread_count': THREAD_COUNT, **params, 'iterations': iterations})
+    updated.fit(df[FEATURE_COLS], df['beat_market'], init_model=model)
+    return updated
+
+
+def save_model(model, key, metadata=None):
+    """
+    Write the model, its NumPy export (and its metadata) atomically so
+    readers never see a partial file.
+    """
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    path = artifact_path(key)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    model.save_model(tmp_path)
+    os.replace(tmp_path, path)
+    export_model(model, key)
+
+    if metadata is not None:
+        meta_path = metadata_path(key)
+        tmp_path = f'{meta_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, meta_path)
+
+    _prune_artifacts()
+    return path
+
+
+def _prune_artifacts():
+    """Keep only the newest KEEP_ARTIFACTS models (an incremental update only needs its parent)."""
+    models = sorted(
+        (entry for entry in os.scandir(ARTIFACT_DIR) if entry.name.endswith('.cbm')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    for entry in models[KEEP_ARTIFACTS:]:
+        stem = entry.path[:-len('.cbm')]
+        for path in (entry.path, stem + '.json', stem + '.npz'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _store_path(root):
+    return os.path.abspath(root or feature_store.DEFAULT_ROOT)
+
+
+def _latest_metadata(params, root=None):
+    """Metadata of the most recently saved artifact trained with `params` on the feature store at `root`."""
+    if not os.path.isdir(ARTIFACT_DIR):
+        return None
+
+    newest, newest_mtime = None, None
+    for entry in os.scandir(ARTIFACT_DIR):
+        if not entry.name.endswith('.json'):
+            continue
+        with open(entry.path) as f:
+            metadata = json.load(f)
+        if (metadata.get('params') != params or metadata.get('root') != _store_path(root)
+                or not os.path.exists(artifact_path(metadata['key']))):
+            continue
+        if newest is None or entry.stat().st_mtime > newest_mtime:
+            newest, newest_mtime = metadata, entry.stat().st_mtime
+    return newest
+
+
+def _next_month(month):
+    return str(pd.Period(month, freq='M') + 1)
+
+
+def _extends(incremental_updates, full_every=FULL_RETRAIN_EVERY):
+    """
+    Whether a model `incremental_updates` updates past its last full retrain
+    is extended again; otherwise the next update is a full retrain.
+    """
+    return incremental_updates < full_every
+
+
+def _train_for_version(key, version, root, df, params, mode):
+    """Train (fully or incrementally) the model for a dataset version and save it."""
+    months = feature_store.list_months(root)
+    metadata = {
+        'key': key,
+        'root': _store_path(root),
+        'data_version': version,
+        'params': params,
+        'trained_through': months[-1],
+    }
+
+    previous = _latest_metadata(params, root) if mode == 'incremental' else None
+    if (previous is not None
+            and previous['data_version'] in feature_store.ancestors(root)
+            and _extends(previous['incremental_updates'])
+            and previous['trained_through'] < months[-1]):
+        new_rows = load_features(root, start=_next_month(previous['trained_through']))
+        print(f"Extending model {previous['key']} with {len(new_rows)} rows "
+              f"after {previous['trained_through']}...")
+        model = continue_training(load_catboost_model(previous['key']), new_rows, params)
+        metadata.update(mode='incremental', parent=previous['key'],
+                        parent_data_version=previous['data_version'],
+                        incremental_updates=previous['incremental_updates'] + 1)
+    else:
+        print(f"No model artifact for {key}, training...")
+        if df is None:
+            df = load_features(root)
+        model = train_model(df, params)
+        metadata.update(mode='full', parent=None, parent_data_version=None, incremental_updates=0)
+
+    save_model(model, key, metadata)
+    return model
+
+
+def get_model(root=None, df=None, params=None, mode=None):
+    """
+    Return the model for the current feature data, training it only if no
+    artifact exists for this (data version, hyperparameters) pair yet.
+
+    Args:
+        root: Feature store directory (defaults to backend/feature_store)
+        df: Already-loaded features, used only if a full retrain is needed
+        params: CatBoost hyperparameters (defaults to MODEL_PARAMS)
+        mode: 'full' or 'incremental' (defaults to MODEL_TRAINING_MODE)
+
+    Returns:
+        ObliviousTreeEnsemble with the model's predict_proba/predict
+    """
+    params = MODEL_PARAMS if params is None else params
+    version = data_version(root)
+    key = artifact_key(version, params)
+    if key in _models:
+        return _models[key]
+
+    with _lock:
+        if key in _models:
+            return _models[key]
+
+        if os.path.exists(export_path(key)):
+            model = ObliviousTreeEnsemble.load(export_path(key))
+        elif os.path.exists(artifact_path(key)):
+            # Artifact saved before models were exported
+            model = export_model(load_catboost_model(key), key)
+        else:
+            _train_for_version(key, version, root, df, params, mode or TRAINING_MODE)
+            model = ObliviousTreeEnsemble.load(export_path(key))
+
+        # Only the current dataset's model is worth keeping in memory
+        _models.clear()
+        _models[key] = model
+        return model
+
+
+def load_model(root=None, params=None):
+    """
+    Like get_model, but only loads an exported artifact: returns None
+    instead of training or importing catboost when there is none for the
+    current feature data.
+    """
+    params = MODEL_PARAMS if params is None else params
+    key = artifact_key(data_version(root), params)
+    if key in _models:
+        return _models[key]
+
+    with _lock:
+        if key not in _models:
+            if not os.path.exists(export_path(key)):
+                return None
+            _models.clear()
+            _models[key] = ObliviousTreeEnsemble.load(export_path(key))
+        return _models[key]
+
+
+def clear_cache():
+    """Forget in-memory models (artifacts on disk are kept)."""
+    with _lock:
+        _models.clear()
+
+
+def walk_forward_split(df, train_fraction=0.7):
+    """
+    Split by date: the first `train_fraction` of dates train, the rest test.
+
+    Returns:
+        (train, test, split_date)
+    """
+    sorted_dates = df['date'].sort_values().unique()
+    split_date = sorted_dates[int(len(sorted_dates) * train_fraction)]
+    return df[df['date'] <= split_date], df[df['date'] > split_date], split_date
+
+
+def _accuracy(model, rows):
+    return float((model.predict(rows[FEATURE_COLS]).astype(int) == rows['beat_market'].to_numpy()).mean())
+
+
+def drift_report(df=None, root=None, train_fraction=0.7, params=None, full_every=FULL_RETRAIN_EVERY):
+    """
+    Compare incremental training with full retraining over the walk-forward
+    test period.
+
+    Both strategies start from a model trained on the training split. Each
+    test month is scored by both models, then the full model is retrained on
+    everything up to that month while the incremental model is extended with
+    that month's rows only (with a full retrain every `full_every` updates,
+    as in production).
+
+    Returns:
+        DataFrame with one row per test month
+    """
+    params = MODEL_PARAMS if params is None else params
+    if df is None:
+        df = load_features(root)
+
+    train, test, split_date = walk_forward_split(df, train_fraction)
+    full_model = train_model(train, params)
+    incremental_model = full_model
+    updates_since_full = 0
+
+    rows = []
+    for date in sorted(test['date'].unique()):
+        month_rows = test[test['date'] == date]
+        acc_full = _accuracy(full_model, month_rows)
+        acc_incremental = _accuracy(incremental_model, month_rows)
+        rows.append({
+            'date': pd.Timestamp(date).strftime('%Y-%m'),
+            'rows': len(month_rows),
+            'acc_full': acc_full,
+            'acc_incremental': acc_incremental,
+            'drift': acc_incremental - acc_full,
+            'incremental_trees': incremental_model.tree_count_,
+        })
+
+        seen = df[df['date'] <= date]
+        full_model = train_model(seen, params)
+        if _extends(updates_since_full, full_every):
+            incremental_model = continue_training(incremental_model, month_rows, params)
+            updates_since_full += 1
+        else:
+            incremental_model, updates_since_full = full_model, 0
+
+    report = pd.DataFrame(rows)
+    report.attrs['split_date'] = pd.Timestamp(split_date).strftime('%Y-%m-%d')
+    return report
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'report':
+        report = drift_report(root=sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"Walk-forward split date: {report.attrs['split_date']}")
+        print(report.to_string(index=False, float_format=lambda v: f'{v:.4f}'))
+        print(f"\nMean accuracy - full: {report['acc_full'].mean():.2%}, "
+              f"incremental: {report['acc_incremental'].mean():.2%}, "
+              f"mean drift: {report['drift'].mean():+.2%}")
+    else:
+        print("Usage: python -m backend.model_store report [store_dir]")
+        sys.exit(1)
@@ -33,4 +33,56 @@ class Position(db.Model):
     Reinvest = db.Column(db.String(50), nullable=True)
     Reinvest_Capital_Gains = db.Column(db.String(50), nullable=True)
     Security_Type = db.Column(db.String(100), nullable=True)
-    Date = db.Column(db.String(50), nullable=True)
\ No newline at end of file
+    Date = db.Column(db.String(50), nullable=True)
+
+class RegenerationJob(db.Model):
+    __tablename__ = 'regeneration_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(20), nullable=False, default='regenerate')  # regenerate, score, train
+    params = db.Column(db.Text, nullable=True)  # JSON keyword arguments for the job
+    state = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    stage = db.Column(db.String(30), nullable=True)
+    message = db.Column(db.String(255), nullable=True)
+    percent = db.Column(db.Float, default=0)
+    rows_produced = db.Column(db.Integer, default=0)
+    stage_timings = db.Column(db.Text, nullable=True)  # JSON {stage: seconds}
+    error = db.Column(db.Text, nullable=True)
+    event_id = db.Column(db.BigInteger, default=0)  # increases on every update, used as the SSE event id
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    stage_started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # last liveness check by the worker
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # 1 while the job is running, NULL otherwise; the unique constraint allows only one running job
+    active_slot = db.Column(db.Integer, unique=True, nullable=True)
+    # The job's kind while it waits in the queue; unique so each kind is queued at most once
+    queued_kind = db.Column(db.String(20), unique=True, nullable=True)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    worker_pid = db.Column(db.Integer, nullable=True)
+    requested_by = db.Column(db.Integer, nullable=True)  # id of the user who queued the job, NULL from the CLI
+
+class JobEventSequence(db.Model):
+    __tablename__ = 'job_event_sequence'
+
+    id = db.Column(db.Integer, primary_key=True)  # a single row, id 1
+    value = db.Column(db.BigInteger, nullable=False)  # the last SSE event id handed out
+
+class PipelineRun(db.Model):
+    __tablename__ = 'pipeline_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), nullable=True)  # regeneration job that ran it, if any
+    mode = db.Column(db.String(20), nullable=True)  # full, incremental
+    provider = db.Column(db.String(20), nullable=True)
+    state = db.Column(db.String(20), nullable=False)  # succeeded, failed
+    error = db.Column(db.Text, nullable=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    wall_seconds = db.Column(db.Float, nullable=True)
+    cpu_seconds = db.Column(db.Float, nullable=True)
+    peak_rss_mb = db.Column(db.Float, nullable=True)
+    rows = db.Column(db.Integer, nullable=True)  # feature rows written
+    tickers = db.Column(db.Integer, nullable=True)  # tickers with usable prices
+    stages = db.Column(db.Text, nullable=True)  # JSON [{name, wall_seconds, cpu_seconds, peak_rss_mb, ...}]
+    batches = db.Column(db.Text, nullable=True)  # JSON, the same for each download batch
@@ -5,10 +5,11 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import numpy as np
-import yfinance as yf
 from datetime import datetime, timedelta
 import xgboost as xgb
-import time
+
+from backend import feature_store, ticker_metadata
+from backend.stock_data_generator import add_dividend_features, create_feature_dataset, download_prices
 
 large_cap_url = 'https://www.zacks.com/funds/etf/SPY/holding'
 mid_cap_url = 'https://www.zacks.com/funds/etf/MDY/holding'
@@ -78,85 +79,6 @@ if small_match:
             small_symbol_list.append(row[1].strip())
     print(f"Found {len(small_symbol_list)} small cap symbols:")
 
-def download_in_batches(tickers, period='5y', interval='1d', batch_size=20, delay=5):
-    """Download price data in batches, retrying failures at the end."""
-    all_prices = []
-    failed_tickers = []
-    total_batches = (len(tickers) - 1) // batch_size + 1
-
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        print(f"Downloading batch {batch_num}/{total_batches} ({len(batch)} tickers)...")
-
-        try:
-            data = yf.download(
-                batch, 
-                period=period, 
-                interval=interval, 
-                progress=False, 
-                threads=False,
-                auto_adjust=True
-            )
-            if not data.empty:
-                if isinstance(data.columns, pd.MultiIndex):
-                    prices = data['Close']
-                else:
-                    prices = data[['Close']]
-                    if len(batch) == 1:
-                        prices.columns = batch
-                # Track which tickers we actually got
-                got_tickers = set(prices.columns.tolist())
-                if missed := [t for t in batch if t not in got_tickers]:
-                    failed_tickers.extend(missed)
-                all_prices.append(prices)
-            else:
-                failed_tickers.extend(batch)
-        except Exception as e:
-            print(f"  Batch failed: {e}")
-            failed_tickers.extend(batch)
-
-        time.sleep(delay)
-
-    # Retry failed tickers
-    if failed_tickers:
-        print(f"\nRetrying {len(failed_tickers)} failed tickers...")
-        time.sleep(10)
-        retry_batches = (len(failed_tickers) - 1) // batch_size + 1
-        for i in range(0, len(failed_tickers), batch_size):
-            batch = failed_tickers[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            print(f"Retry batch {batch_num}/{retry_batches} ({len(batch)} tickers)...")
-            try:
-                data = yf.download(
-                    batch,
-                    period=period,
-                    interval=interval,
-                    progress=False,
-                    threads=False,
-                    auto_adjust=True
-                )
-                if not data.empty:
-                    if isinstance(data.columns, pd.MultiIndex):
-                        prices = data['Close']
-                    else:
-                        prices = data[['Close']]
-                        if len(batch) == 1:
-                            prices.columns = batch
-                    all_prices.append(prices)
-            except Exception as e:
-                print(f"  Retry failed: {e}")
-            time.sleep(delay)
-
-    # Combine all data
-    if all_prices:
-        combined = pd.concat(all_prices, axis=1)
-        combined = combined.loc[:, ~combined.columns.duplicated()]
-        print(f"\nTotal downloaded: {len(combined.columns)} tickers")
-        return combined
-
-    return pd.DataFrame()
-
 def is_valid_ticker(ticker):
     """Filter out invalid ticker symbols."""
     # Valid tickers: 1-5 letters, optionally followed by .A, .B, etc.
@@ -177,8 +99,8 @@ print("US Cash Index Added.")
 print(f"Valid tickers: {len(valid_tickers)}")
 print(f"Filtered out: {invalid_tickers}")
 
-# Download in batches
-prices = download_in_batches(valid_tickers, period='5y', interval='1d', batch_size=30, delay=2)
+# Download prices
+prices = download_prices(valid_tickers, period='5y', interval='1d')
 
 # Filter out bad data
 prices = prices.dropna(axis=1, how='all')
@@ -214,36 +136,10 @@ lowest_pairs = get_lowest_correlations(corr_matrix, n=10)
 #Now want to check dividend info to maximize returns
 def get_dividend_info(tickers):
     """Get dividend yield and info for a list of tickers."""
-    dividend_data = []
-    
-    for ticker in tickers:
-        try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            
-            dividend_data.append({
-                'ticker': ticker,
-                'dividend_yield': info.get('dividendYield', 0) or 0,
-                'dividend_rate': info.get('dividendRate', 0) or 0,
-                'payout_ratio': info.get('payoutRatio', 0) or 0,
-                'sector': info.get('sector', 'Unknown'),
-                'name': info.get('shortName', ticker)
-            })
-        except Exception as e:
-            print(f"  Error fetching {ticker}: {e}")
-            dividend_data.append({
-                'ticker': ticker,
-                'dividend_yield': 0,
-                'dividend_rate': 0,
-                'payout_ratio': 0,
-                'sector': 'Unknown',
-                'name': ticker
-            })
-    
-    df = pd.DataFrame(dividend_data)
+    df = ticker_metadata.get_metadata(tickers).rename_axis('ticker').reset_index()
     df['dividend_yield_pct'] = df['dividend_yield'] * 100
     df = df.sort_values('dividend_yield', ascending=False)
-    
+
     return df
 
 # Extract unique tickers from pairs
@@ -256,132 +152,6 @@ print(uncorr_dividends[['ticker', 'name', 'dividend_yield_pct', 'dividend_rate',
 
 
 #now use XGBoost for predicting future returns based on features like past correlations, momentum, div yield, volatility, etc.
-def create_feature_dataset(prices, lookback_months=6, forward_months=3):
-    """
-    Create a feature dataset for ML from price data.
-    
-    Each row = one stock at one point in time
-    Features = what we know at that time
-    Target = future return (what we're predicting)
-    """
-    
-    # Calculate daily returns
-    returns = prices.pct_change()
-
-    # We'll build features at monthly intervals
-    # Get month-end dates
-    monthly_dates = prices.resample('M').last().index
-
-    # Need enough history for lookback and enough future for target
-    valid_dates = monthly_dates[lookback_months:-forward_months]
-
-    all_rows = []
-
-    for date in valid_dates:
-        print(f"Processing {date.strftime('%Y-%m')}...")
-
-        # Get lookback window
-        lookback_start = date - pd.DateOffset(months=lookback_months)
-        lookback_returns = returns[lookback_start:date]
-
-        # Get forward window (for target)
-        forward_end = date + pd.DateOffset(months=forward_months)
-        forward_returns = returns[date:forward_end]
-
-        # Calculate correlation matrix for this period
-        corr_matrix = lookback_returns.corr()
-
-        # Market proxy (equal-weighted average of all stocks)
-        market_return = lookback_returns.mean(axis=1)
-
-        for ticker in prices.columns:
-            try:
-                ticker_returns = lookback_returns[ticker].dropna()
-
-                if len(ticker_returns) < 20:  # Skip if not enough data
-                    continue
-
-                # === FEATURES ===
-
-                # 1. Momentum (past return over lookback period)
-                momentum = (prices[ticker].loc[:date].iloc[-1] / 
-                           prices[ticker].loc[:date].iloc[-lookback_months*21] - 1)
-
-                # 2. Volatility (std of daily returns)
-                volatility = ticker_returns.std() * np.sqrt(252)  # Annualized
-
-                # 3. Average correlation with all other stocks
-                ticker_corrs = corr_matrix[ticker].drop(ticker)
-                avg_correlation = ticker_corrs.mean()
-
-                # 4. Max correlation (how tied to another stock)
-                max_correlation = ticker_corrs.max()
-
-                # 5. Min correlation (most diversifying pair)
-                min_correlation = ticker_corrs.min()
-
-                # 6. Correlation with "market" (equal-weight avg)
-                market_corr = ticker_returns.corr(market_return)
-
-                # 7. Sharpe ratio (return / volatility)
-                period_return = ticker_returns.sum()
-                sharpe = period_return / (ticker_returns.std() + 1e-6)
-
-                # 8. Recent vs older momentum (trend acceleration)
-                recent_return = ticker_returns.iloc[-21:].sum()  # Last month
-                older_return = ticker_returns.iloc[:-21].sum()   # Before that
-                momentum_accel = recent_return - older_return
-
-                # === TARGET ===
-                # Future return over forward_months
-                if ticker in forward_returns.columns:
-                    future_return = forward_returns[ticker].sum()
-                else:
-                    continue
-
-                # Did it beat the market?
-                market_future = forward_returns.mean(axis=1).sum()
-                beat_market = 1 if future_return > market_future else 0
-
-                all_rows.append({
-                    'ticker': ticker,
-                    'date': date,
-                    'momentum': momentum,
-                    'volatility': volatility,
-                    'avg_correlation': avg_correlation,
-                    'max_correlation': max_correlation,
-                    'min_correlation': min_correlation,
-                    'market_correlation': market_corr,
-                    'sharpe': sharpe,
-                    'momentum_accel': momentum_accel,
-                    'future_return': future_return,
-                    'beat_market': beat_market
-                })
-
-            except Exception as e:
-                continue
-
-    return pd.DataFrame(all_rows)
-
-
-def add_dividend_features(df, tickers):
-    """Add dividend yield as a feature."""
-    print("Fetching dividend data...")
-    
-    div_yields = {}
-    for i, ticker in enumerate(tickers):
-        if i % 100 == 0:
-            print(f"  Progress: {i}/{len(tickers)}")
-        try:
-            stock = yf.Ticker(ticker)
-            div_yields[ticker] = stock.info.get('dividendYield', 0) or 0
-        except:
-            div_yields[ticker] = 0
-    
-    df['dividend_yield'] = df['ticker'].map(div_yields)
-    return df
-
-
 # === RUN IT ===
 
 # Assuming you have 'prices' from your earlier download
@@ -398,5 +168,5 @@ unique_tickers = feature_df['ticker'].unique()
 feature_df = add_dividend_features(feature_df, unique_tickers)
 
 # Save it so you don't have to rebuild
-feature_df.to_csv('stock_features.csv', index=False)
-print("\nSaved to stock_features.csv")
\ No newline at end of file
+version = feature_store.write_features(feature_df)
+print(f"\nSaved to feature store (version {version})")
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Price cache - daily closes already downloaded, so a regeneration only asks
+yfinance for the days after each ticker's last cached close.
+
+Layout:
+    price_cache/
+        prices.parquet      adjusted closes, one column per ticker
+        _meta.json          per ticker: when it was last fetched and last requested
+
+Every update re-requests a few days before each ticker's last cached close.
+Those days also come back re-adjusted after a split or dividend, so when
+they no longer match the cache the ticker's whole history is downloaded
+again. Tickers new to the universe get the full history; tickers that leave
+it are kept for PRUNE_AFTER in case they come back, then dropped.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(__file__), 'price_cache')
+PRICES_NAME = 'prices.parquet'
+META_NAME = '_meta.json'
+
+# History served (and kept), matching download_prices' period='5y'
+HISTORY = pd.DateOffset(years=5)
+# Days before the last cached close that are requested again: they replace a
+# close cached mid-session and reveal re-adjusted history
+OVERLAP_DAYS = 7
+# Tickers whose last close is this much older than the newest one (stopped
+# trading) are fetched from their own start date
+STALE_AFTER_DAYS = 31
+# Relative change in an overlapping close that means the history was re-adjusted
+ADJUSTMENT_TOLERANCE = 1e-4
+# Tickers fetched more recently than this aren't requested again
+REFRESH_AFTER = timedelta(hours=12)
+# Tickers nobody has asked for in this long are dropped from the cache
+PRUNE_AFTER = timedelta(days=90)
+
+
+def _paths(root):
+    root = root or DEFAULT_ROOT
+    return os.path.join(root, PRICES_NAME), os.path.join(root, META_NAME)
+
+
+def load(root=None):
+    """
+    Returns:
+        (cached closes as a date x ticker frame, {ticker: {'fetched': iso, 'requested': iso}})
+    """
+    prices_path, meta_path = _paths(root)
+    if not os.path.exists(meta_path) or not os.path.exists(prices_path):
+        return pd.DataFrame(index=pd.DatetimeIndex([]), dtype=float), {}
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return pd.read_parquet(prices_path), meta
+
+
+def _save(root, prices, meta):
+    root = root or DEFAULT_ROOT
+    os.makedirs(root, exist_ok=True)
+    prices_path, meta_path = _paths(root)
+    for path, write in ((prices_path, lambda tmp: prices.to_parquet(tmp)),
+                        (meta_path, lambda tmp: _write_json(tmp, meta))):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def _last_dates(prices):
+    """Date of each column's last close (NaT for columns without one)."""
+    valid = prices.notna().to_numpy()
+    has_close = valid.any(axis=0)
+    last_row = len(valid) - 1 - np.argmax(valid[::-1], axis=0)
+    dates = np.where(has_close, prices.index.to_numpy()[last_row], np.datetime64('NaT'))
+    return pd.Series(pd.to_datetime(dates), index=prices.columns)
+
+
+def fetch_plan(tickers, prices, meta, now):
+    """
+    What to download for `tickers`: new tickers' full history, and for the
+    rest the days from a little before their last cached close. Each group is
+    one download_prices call, so tickers whose last close is recent share
+    one start date and the few that stopped trading a while ago share another.
+
+    Returns:
+        {start date string, or None for the full history: [tickers]}
+    """
+    last_dates = _last_dates(prices) if len(prices.columns) else pd.Series(dtype='datetime64[ns]')
+    new, cached = [], {}
+    for ticker in tickers:
+        last_date = last_dates.get(ticker, pd.NaT)
+        fetched = meta.get(ticker, {}).get('fetched')
+        if pd.isna(last_date):
+            new.append(ticker)
+        elif fetched is None or now - datetime.fromisoformat(fetched) >= REFRESH_AFTER:
+            cached[ticker] = last_date
+
+    plan = {None: new} if new else {}
+    if cached:
+        last_dates = pd.Series(cached)
+        recent = last_dates >= last_dates.max() - pd.Timedelta(days=STALE_AFTER_DAYS)
+        for group in (last_dates[recent], last_dates[~recent]):
+            if len(group):
+                start = (group.min() - pd.Timedelta(days=OVERLAP_DAYS)).strftime('%Y-%m-%d')
+                plan[start] = list(group.index)
+    return plan
+
+
+def readjusted(cached, fresh):
+    """
+    Tickers whose fresh closes disagree with the cache on the days both have,
+    before the cached last close (which may have been taken mid-session).
+    """
+    common = fresh.columns.intersection(cached.columns)
+    if common.empty:
+        return []
+    old = cached[common].reindex(fresh.index).to_numpy()
+    new = fresh[common].to_numpy()
+    before_last = fresh.index.to_numpy()[:, None] < _last_dates(cached[common]).to_numpy()[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.abs(new / old - 1)
+    changed = np.where(before_last & ~np.isnan(change), change, 0.0) > ADJUSTMENT_TOLERANCE
+    return list(common[changed.any(axis=0)])
+
+
+def _merge(cached, fresh):
+    """`cached` with the closes of `fresh` added, replacing any on the same date."""
+    index = cached.index.union(fresh.index)
+    columns = cached.columns.append(fresh.columns.difference(cached.columns))
+    merged = cached.reindex(index=index, columns=columns).to_numpy()
+    new = fresh.reindex(index=index, columns=columns).to_numpy()
+    merged = np.where(np.isnan(new), merged, new)
+    return pd.DataFrame(merged, index=index, columns=columns)
+
+
+def update_prices(tickers, download, root=None, start=None, now=None):
+    """
+    Bring the cache up to date for `tickers` and return their closes.
+
+    Args:
+        tickers: The ticker universe
+        download: `download(tickers, start)` -> date x ticker closes, from
+            `start` ('YYYY-MM-DD') or the full history if start is None
+        root: Cache directory (defaults to backend/price_cache)
+        start: First date to return (default: HISTORY before now)
+        now: Current time (for tests and benchmarks)
+
+    Returns:
+        Date x ticker closes of the requested tickers that have any
+    """
+    now = now or datetime.now()
+    prices, meta = load(root)
+
+    fetched = []
+    for fetch_start, batch in fetch_plan(tickers, prices, meta, now).items():
+        print(f"Price cache: downloading {len(batch)} tickers from {fetch_start or 'the start of their history'}")
+        fresh = download(batch, fetch_start)
+        if fresh.empty:
+            continue
+        if fetch_start is not None:
+            if stale := readjusted(prices, fresh):
+                print(f"Price cache: {len(stale)} tickers were re-adjusted, downloading their full history")
+                prices = prices.drop(columns=stale)
+                fresh = pd.concat([fresh.drop(columns=stale), download(stale, None)], axis=1)
+        fetched.append(fresh)
+        for ticker in fresh.columns:
+            meta.setdefault(ticker, {})['fetched'] = now.isoformat()
+
+    if fetched:
+        # Each ticker is in one batch, so the batches' columns don't overlap
+        prices = _merge(prices, pd.concat(fetched, axis=1))
+    for ticker in tickers:
+        meta.setdefault(ticker, {})['requested'] = now.isoformat()
+
+    # Drop what no run has needed for a while, and history older than anyone serves
+    dropped = [ticker for ticker, entry in meta.items()
+               if now - datetime.fromisoformat(entry['requested']) > PRUNE_AFTER]
+    prices = prices.drop(columns=[t for t in dropped if t in prices.columns])
+    meta = {ticker: entry for ticker, entry in meta.items() if ticker not in dropped}
+    prices = prices.loc[prices.index >= pd.Timestamp(now) - HISTORY].sort_index()
+    if fetched or dropped:
+        _save(root, prices, meta)
+
+    first = pd.Timestamp(start) if start is not None else pd.Timestamp(now) - HISTORY
+    columns = [ticker for ticker in dict.fromkeys(tickers) if ticker in prices.columns]
+    return prices.loc[prices.index >= first, columns]
@@ -0,0 +1,63 @@
+"""
+Regeneration progress - stage events emitted by the stock data pipeline and
+pushed to browsers as server-sent events.
+
+The pipeline calls a progress callback as `progress(stage, message, done=, total=)`;
+jobs.progress_callback records those events in the regeneration job registry,
+which is the event source for the stream.
+"""
+
+import json
+import time
+
+# Stage -> (start %, end %) of the overall run; `done`/`total` interpolate inside it.
+# 'training' is only used by model training jobs.
+STAGES = {
+    'queued': (0, 0),
+    'started': (0, 0),
+    'training': (5, 95),
+    'tickers': (0, 5),
+    'download': (5, 60),
+    'features': (60, 85),
+    'dividends': (85, 95),
+    'saved': (95, 100),
+    'done': (100, 100),
+}
+TERMINAL_STAGES = ('done', 'error')
+
+
+def stage_percent(stage, done=None, total=None):
+    """Overall percent complete for `done` of `total` units of work in `stage`."""
+    if stage not in STAGES:
+        return None
+    start, end = STAGES[stage]
+    if done is None or not total:
+        return start
+    return round(start + (end - start) * min(done, total) / total, 1)
+
+
+def format_sse(event):
+    """Serialize an event in text/event-stream format."""
+    return f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+
+
+def event_stream(source, last_event_id=None, max_seconds=300, keepalive=15, job_id=None):
+    """
+    Generate an SSE stream from `source` (anything with wait_for_events),
+    of job `job_id`'s events only if given.
+
+    The stream closes after a terminal event or after `max_seconds`; the
+    browser's EventSource then reconnects with Last-Event-ID and resumes.
+    """
+    yield 'retry: 3000\n\n'
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        events = source.wait_for_events(after=last_event_id, timeout=keepalive, job_id=job_id)
+        if not events:
+            yield ': keepalive\n\n'
+            continue
+        for event in events:
+            yield format_sse(event)
+            last_event_id = event['id']
+            if event['stage'] in TERMINAL_STAGES:
+                return
@@ -0,0 +1,204 @@
+"""
+Data providers - where the regeneration pipeline gets its ticker universe,
+daily closes and ticker metadata.
+
+A provider has four methods:
+
+    universe()                               -> (large, mid, small) symbol lists
+    fetch_close(ticker, period, interval, start) -> closes Series, or None if none
+    fetch_info(ticker)                       -> {ticker_metadata.FIELDS column: value}
+    rate_limiter()                           -> what paces a download's calls
+
+fetch_close and fetch_info run on the downloader's worker threads and may
+raise downloader.RateLimited.
+
+YahooProvider is the live one (Zacks ETF pages, yfinance). OfflineProvider
+serves recorded or synthetic data from memory, deterministically and with
+optional simulated latency, so the whole pipeline can be run and profiled
+on a machine without network access.
+
+Configuration (environment variables):
+    DATA_PROVIDER      'yahoo' (default), 'synthetic' or 'recorded' (replays
+                       the closes and metadata cached by earlier live runs)
+    SYNTHETIC_TICKERS  tickers the synthetic provider makes up (default 1500)
+    SYNTHETIC_YEARS    years of closes it makes up (default 5)
+    SYNTHETIC_LATENCY  seconds each offline call takes (default 0)
+"""
+
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import downloader
+
+DATA_PROVIDER = os.getenv('DATA_PROVIDER', 'yahoo')
+PROVIDERS = ('yahoo', 'synthetic', 'recorded')
+
+SECTORS = ('Technology', 'Healthcare', 'Financial Services', 'Industrials', 'Consumer Cyclical',
+           'Consumer Defensive', 'Energy', 'Utilities', 'Real Estate', 'Basic Materials',
+           'Communication Services')
+
+
+class YahooProvider:
+    """Live data: ETF holdings from Zacks, closes and `info` from yfinance."""
+
+    name = 'yahoo'
+    # Caches of a live provider live at their default paths
+    cache_scope = None
+
+    def universe(self):
+        from .stock_data_generator import get_all_tickers
+        return get_all_tickers()
+
+    def rate_limiter(self):
+        return downloader.RateLimiter()
+
+    def fetch_close(self, ticker, period='5y', interval='1d', start=None):
+        from .stock_data_generator import fetch_close
+        return fetch_close(ticker, period, interval, start)
+
+    def fetch_info(self, ticker):
+        from .ticker_metadata import fetch_info
+        return fetch_info(ticker)
+
+
+def synthetic_prices(n_tickers=1500, n_years=5, seed=42, end=None, columns=None):
+    """
+    Daily closes shaped like download_prices() output: a market factor
+    plus noise, with late listings, delistings and scattered missing days.
+    Business days from 2020-01-01, or up to `end` if given.
+    """
+    rng = np.random.default_rng(seed)
+    n_days = 252 * n_years
+    dates = pd.bdate_range(end=end, periods=n_days) if end is not None else pd.bdate_range('2020-01-01', periods=n_days)
+    market = rng.normal(0.0003, 0.01, (n_days, 1))
+    beta = rng.uniform(0.3, 1.5, n_tickers)
+    daily = market * beta + rng.normal(0, 0.015, (n_days, n_tickers))
+    prices = 100 * np.exp(np.cumsum(daily, axis=0))
+
+    listed = rng.random(n_tickers) < 0.1
+    prices[:, listed] = np.where(
+        np.arange(n_days)[:, None] < rng.integers(0, n_days // 2, listed.sum()), np.nan, prices[:, listed]
+    )
+    delisted = rng.random(n_tickers) < 0.05
+    prices[:, delisted] = np.where(
+        np.arange(n_days)[:, None] >= rng.integers(n_days // 2, n_days, delisted.sum()), np.nan, prices[:, delisted]
+    )
+    prices[rng.random(prices.shape) < 0.002] = np.nan
+    return pd.DataFrame(prices, index=dates, columns=columns or [f'T{i:04d}' for i in range(n_tickers)])
+
+
+def synthetic_symbol(i):
+    """The i-th made-up symbol: four letters, so it passes is_valid_ticker."""
+    letters = []
+    for _ in range(4):
+        i, letter = divmod(i, 26)
+        letters.append(chr(ord('A') + letter))
+    return ''.join(reversed(letters))
+
+
+def _period_start(end, period):
+    """First date of a yfinance-style `period` ('5y', '6mo', '30d', 'max') ending at `end`."""
+    if period == 'max':
+        return pd.Timestamp.min
+    count, unit = re.fullmatch(r'(\d+)(y|mo|d)', period).groups()
+    offset = {'y': 'years', 'mo': 'months', 'd': 'days'}[unit]
+    return end - pd.DateOffset(**{offset: int(count)})
+
+
+class OfflineProvider:
+    """
+    Recorded or synthetic data served from memory. Every call sleeps
+    `latency` seconds first, like a round trip to the live services.
+
+    Args:
+        prices: Date x ticker closes to serve (default: synthetic_prices for
+            `n_tickers` x `n_years`, ending today, under synthetic_symbol names)
+        metadata: DataFrame indexed by ticker with ticker_metadata.FIELDS
+            columns (default: made up from `seed`)
+    """
+
+    name = 'offline'
+    # Kept apart from the live caches so offline data never mixes with real data
+    cache_scope = 'offline'
+
+    def __init__(self, prices=None, metadata=None, n_tickers=1500, n_years=5, latency=0.0, seed=42):
+        if prices is None:
+            columns = [synthetic_symbol(i) for i in range(n_tickers)]
+            prices = synthetic_prices(n_tickers, n_years, seed, end=pd.Timestamp.today().normalize(),
+                                      columns=columns)
+        self.prices = prices
+        self.metadata = metadata
+        self.latency = latency
+        self.seed = seed
+
+    @classmethod
+    def from_caches(cls, price_cache_root=None, metadata_path=None, latency=0.0):
+        """Replay the closes and metadata cached by earlier live runs."""
+        from . import price_cache, ticker_metadata
+
+        prices, _ = price_cache.load(price_cache_root)
+        if prices.empty:
+            raise ValueError("The price cache is empty; run a live regeneration first")
+        return cls(prices, ticker_metadata.load(metadata_path), latency=latency)
+
+    def rate_limiter(self):
+        # Simulated latency is the only cost of a call
+        return downloader.Unlimited()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def universe(self):
+        """The served tickers split into thirds, with a few listed in two ETFs."""
+        self._wait()
+        tickers = list(self.prices.columns)
+        third = len(tickers) // 3
+        large, mid, small = tickers[:third], tickers[third:2 * third], tickers[2 * third:]
+        return large + mid[:third // 20], mid, small
+
+    def fetch_close(self, ticker, period='5y', interval='1d', start=None):
+        self._wait()
+        if ticker not in self.prices.columns:
+            return None
+        close = self.prices[ticker]
+        first = pd.Timestamp(start) if start is not None else _period_start(close.index[-1], period)
+        close = close[close.index >= first].dropna()
+        return close if len(close) else None
+
+    def fetch_info(self, ticker):
+        self._wait()
+        if self.metadata is not None:
+            if ticker not in self.metadata.index:
+                return None
+            row = self.metadata.loc[ticker]
+            return {column: row.get(column) for column in ('name', 'sector', 'dividend_yield',
+                                                           'dividend_rate', 'payout_ratio')}
+        # Seeded by the symbol, so a ticker's figures don't depend on call order
+        rng = np.random.default_rng([self.seed, *ticker.encode()])
+        dividend_yield = float(rng.uniform(0.005, 0.06)) if rng.random() < 0.6 else 0.0
+        return {
+            'name': f'{ticker} Holdings',
+            'sector': SECTORS[rng.integers(len(SECTORS))],
+            'dividend_yield': dividend_yield,
+            'dividend_rate': round(dividend_yield * 100, 2),
+            'payout_ratio': float(rng.uniform(0.2, 0.8)) if dividend_yield else 0.0,
+        }
+
+
+def get_provider(name=None):
+    """The provider called `name` (default DATA_PROVIDER)."""
+    name = name or DATA_PROVIDER
+    if name == 'yahoo':
+        return YahooProvider()
+    if name == 'synthetic':
+        return OfflineProvider(n_tickers=int(os.getenv('SYNTHETIC_TICKERS', '1500')),
+                               n_years=int(os.getenv('SYNTHETIC_YEARS', '5')),
+                               latency=float(os.getenv('SYNTHETIC_LATENCY', '0')))
+    if name == 'recorded':
+        return OfflineProvider.from_caches(latency=float(os.getenv('SYNTHETIC_LATENCY', '0')))
+    raise ValueError(f"Unknown data provider: {name} (expected one of {', '.join(PROVIDERS)})")
@@ -1,10 +1,12 @@
+# Run from the repository root: python -m backend.recommendation
 import pandas as pd
 import numpy as np
 from catboost import CatBoostClassifier
 
+from backend import feature_store
+
 # Load features
-df = pd.read_csv('../backend/stock_features.csv')
-df['date'] = pd.to_datetime(df['date'])
+df = feature_store.read_features()
 df = df.replace([np.inf, -np.inf], np.nan)
 df = df.dropna()
 
@@ -0,0 +1,118 @@
+"""
+Run history - the instrumentation record of every regeneration run (see
+instrumentation), kept in the database for the admin endpoint.
+
+Each run is compared with the median of the runs before it, stage by
+stage, so a stage that got slower or bigger (a slow provider, a growing
+correlation stage) stands out.
+
+All functions need a Flask app context.
+"""
+
+import json
+from datetime import datetime
+from statistics import median
+
+from .models import db, PipelineRun
+
+# Earlier runs a run's stages are compared with
+BASELINE_RUNS = 10
+
+_table_ready = False
+
+
+def _ensure_table():
+    global _table_ready
+    if not _table_ready:
+        PipelineRun.__table__.create(db.engine, checkfirst=True)
+        _table_ready = True
+
+
+def record_run(record, job_id=None, error=None):
+    """
+    Save a RunMetrics.record() as a finished (or, with `error`, failed) run.
+
+    Returns:
+        The new PipelineRun
+    """
+    _ensure_table()
+    stages = {entry['name']: entry for entry in record['stages']}
+    run = PipelineRun(
+        job_id=job_id,
+        mode=record.get('mode'),
+        provider=record.get('provider'),
+        state='failed' if error else 'succeeded',
+        error=error,
+        started_at=datetime.fromisoformat(record['started_at']),
+        finished_at=datetime.utcnow(),
+        wall_seconds=record['wall_seconds'],
+        cpu_seconds=record['cpu_seconds'],
+        peak_rss_mb=record['peak_rss_mb'],
+        # 'score' runs write no partitions; their rows are the snapshot's
+        rows=stages.get('write', stages.get('snapshot', {})).get('rows'),
+        tickers=stages.get('prices', {}).get('tickers'),
+        stages=json.dumps(record['stages']),
+        batches=json.dumps(record['batches']),
+    )
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def _baseline(runs):
+    """Median wall time and peak RSS of each stage over `runs`, skipping stages resumed from a checkpoint."""
+    values = {}
+    for run in runs:
+        for entry in json.loads(run.stages or '[]'):
+            if not entry.get('resumed'):
+                values.setdefault(entry['name'], []).append(entry)
+    return {
+        name: {'wall_seconds': median([entry['wall_seconds'] for entry in entries]),
+               'peak_rss_mb': median([entry['peak_rss_mb'] for entry in entries])}
+        for name, entries in values.items()
+    }
+
+
+def serialize(run, baseline=None):
+    """
+    A run as JSON. With `baseline` (from _baseline), each stage also gets
+    its wall time and peak RSS as a ratio of the baseline's.
+    """
+    stages = json.loads(run.stages or '[]')
+    for entry in stages:
+        typical = (baseline or {}).get(entry['name'])
+        if typical and not entry.get('resumed'):
+            for key in ('wall_seconds', 'peak_rss_mb'):
+                if typical[key]:
+                    entry[f'{key}_vs_median'] = round(entry[key] / typical[key], 2)
+    return {
+        'id': run.id,
+        'job_id': run.job_id,
+        'mode': run.mode,
+        'provider': run.provider,
+        'state': run.state,
+        'error': run.error,
+        'started_at': run.started_at.isoformat(timespec='seconds') + 'Z',
+        'finished_at': run.finished_at.isoformat(timespec='seconds') + 'Z',
+        'wall_seconds': run.wall_seconds,
+        'cpu_seconds': run.cpu_seconds,
+        'peak_rss_mb': run.peak_rss_mb,
+        'rows': run.rows,
+        'tickers': run.tickers,
+        'stages': stages,
+        'batches': json.loads(run.batches or '[]'),
+    }
+
+
+def recent_runs(limit=20):
+    """
+    The last `limit` runs, newest first, each compared with the median of
+    the BASELINE_RUNS successful runs of the same mode before it.
+    """
+    _ensure_table()
+    runs = PipelineRun.query.order_by(PipelineRun.started_at.desc()).limit(limit + BASELINE_RUNS).all()
+    result = []
+    for i, run in enumerate(runs[:limit]):
+        earlier = [past for past in runs[i + 1:] if past.state == 'succeeded' and past.mode == run.mode]
+        result.append(serialize(run, _baseline(earlier[:BASELINE_RUNS])))
+    return result
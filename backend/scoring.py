@@ -0,0 +1,283 @@
+"""
+Batch scoring - model probabilities for arbitrary ticker lists.
+
+A month of the feature store is loaded once into a float32 feature matrix
+with a ticker -> row index, so scoring a request is a dict lookup per ticker
+plus one batched predict_proba over the selected rows.
+
+The matrix is cached as a .npy file in the feature store version directory
+and memory-mapped, so every process on the machine shares one copy in the
+page cache. With PRELOAD_MODELS=1 and gunicorn --preload, the master process
+maps the latest month and loads the model before forking (see preload()).
+Every lookup checks the published version, so workers switch to new data
+after a regeneration without a restart.
+
+A 'score' run of the generator (today's features from recent closes) publishes
+its rows with publish_live(); until the next regeneration or month-end snapshot,
+latest-month lookups score those rows, so /api/score and the holdings page
+agree with the recommendations page.
+"""
+
+import gc
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from . import feature_store, model_store, snapshot
+
+# Most months kept in memory at once (the latest plus recent as-of lookups)
+MAX_CACHED_MONTHS = 6
+MAX_TICKERS = 10000
+
+
+def _cache_paths(month, root, version):
+    return (feature_store.derived_path(f'_features-{month}.npy', root, version),
+            feature_store.derived_path(f'_tickers-{month}.json', root, version))
+
+
+def _live_paths(root, version, snapshot_version='*'):
+    return (feature_store.derived_path(f'_features-live-{snapshot_version}.npy', root, version),
+            feature_store.derived_path('_tickers-live.json', root, version))
+
+
+def _write_atomic(path, write):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class FeatureIndex:
+    """One month of cleaned feature rows, addressable by ticker."""
+
+    def __init__(self, tickers, matrix, month, data_version, version=None):
+        self.month = month
+        self.data_version = data_version
+        # The recommendation snapshot version the rows were scored for
+        self.version = version or model_store.artifact_key(data_version)
+        self.tickers = tickers
+        self.rows = {ticker: i for i, ticker in enumerate(tickers)}
+        self.matrix = matrix
+
+    @classmethod
+    def load(cls, month, root=None, version=None):
+        """
+        Map the cached matrix of `month`, building the cache from the
+        Parquet partition first if it doesn't exist yet.
+        """
+        version = version or model_store.data_version(root)
+        matrix_path, tickers_path = _cache_paths(month, root, version)
+        if not os.path.exists(tickers_path):
+            df = model_store.clean_features(feature_store.read_month(month, root, version=version))
+            matrix = np.ascontiguousarray(df[model_store.FEATURE_COLS].to_numpy(dtype=np.float32))
+            _write_atomic(matrix_path, lambda f: np.save(f, matrix))
+            # Written last: its presence means the matrix is complete
+            _write_atomic(tickers_path, lambda f: f.write(json.dumps(df['ticker'].tolist()).encode()))
+
+        with open(tickers_path) as f:
+            tickers = json.load(f)
+        return cls(tickers, np.load(matrix_path, mmap_mode='r'), month, version)
+
+    @classmethod
+    def load_live(cls, root=None, version=None):
+        """The rows published by publish_live() for data `version`, or None if there are none."""
+        version = version or model_store.data_version(root)
+        for _ in range(2):
+            try:
+                with open(_live_paths(root, version)[1]) as f:
+                    live = json.load(f)
+                matrix = np.load(_live_paths(root, version, live['version'])[0], mmap_mode='r')
+            except FileNotFoundError:
+                # None published, or a newer run replaced the matrix between the two reads
+                continue
+            return cls(live['tickers'], matrix, live['as_of'], version, live['version'])
+        return None
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def lookup(self, tickers):
+        """
+        Returns:
+            (row positions of the known tickers, known tickers, unknown tickers)
+        """
+        positions, found, missing = [], [], []
+        for ticker in tickers:
+            row = self.rows.get(ticker)
+            if row is None:
+                missing.append(ticker)
+            else:
+                positions.append(row)
+                found.append(ticker)
+        return np.asarray(positions, dtype=np.intp), found, missing
+
+
+# (data version, month) -> FeatureIndex
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_index(root=None, month=None):
+    """
+    The feature index for `month` ('YYYY-MM' or any date in it, default the
+    latest) of the published feature store, built on first use. The default
+    is the rows of the last 'score' run instead, if it published any.
+
+    Raises:
+        KeyError: if the store has no partition for `month`
+        ValueError: if `month` isn't a date
+    """
+    version = model_store.data_version(root)
+    if month is None:
+        live = _live_index(root, version)
+        if live is not None:
+            return live
+    months = sorted(feature_store.load_manifest(root, version)['partitions'])
+    month = months[-1] if month is None else pd.Timestamp(month).strftime('%Y-%m')
+    if month not in months:
+        raise KeyError(month)
+
+    key = (version, month)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FeatureIndex.load(month, root, version)
+            # Indexes of older dataset versions are never asked for again
+            for old_key in [k for k in _indexes if k[0] != version]:
+                del _indexes[old_key]
+            if len(_indexes) >= MAX_CACHED_MONTHS:
+                del _indexes[next(iter(_indexes))]
+            _indexes[key] = index
+    return index
+
+
+def _live_index(root, version):
+    try:
+        mtime = os.stat(_live_paths(root, version)[1]).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    key = (version, 'live', mtime)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FeatureIndex.load_live(root, version)
+            if index is None:
+                return None
+            for old_key in [k for k in _indexes if k[1] == 'live' or k[0] != version]:
+                del _indexes[old_key]
+            _indexes[key] = index
+    return index
+
+
+def publish_live(df, snapshot_version, root=None):
+    """
+    Make cleaned feature rows of one date (generate_stock_features' 'score'
+    mode) what latest-month lookups score, under the recommendation snapshot
+    version they were published with. They are kept in the current data
+    version's directory, so the next regeneration supersedes them.
+    """
+    version = model_store.data_version(root)
+    matrix_path, tickers_path = _live_paths(root, version, snapshot_version)
+    matrix = np.ascontiguousarray(df[model_store.FEATURE_COLS].to_numpy(dtype=np.float32))
+    _write_atomic(matrix_path, lambda f: np.save(f, matrix))
+    live = {'version': snapshot_version, 'as_of': df['date'].max().strftime('%Y-%m-%d'),
+            'tickers': df['ticker'].tolist()}
+    # Written last, and naming its matrix, so readers never pair it with another run's matrix
+    _write_atomic(tickers_path, lambda f: f.write(json.dumps(live).encode()))
+    _remove_live_matrices(root, version, keep=matrix_path)
+
+
+def clear_live(root=None):
+    """Go back to scoring the latest month of the store (a month-end snapshot was written)."""
+    version = model_store.data_version(root)
+    try:
+        os.remove(_live_paths(root, version)[1])
+    except FileNotFoundError:
+        pass
+    _remove_live_matrices(root, version)
+
+
+def _remove_live_matrices(root, version, keep=None):
+    # Processes that mapped a removed matrix keep reading it until they switch
+    for path in glob.glob(_live_paths(root, version)[0]):
+        if path != keep:
+            os.remove(path)
+
+
+def preload(root=None):
+    """
+    Load the latest feature index and the model into this process. Called in
+    the gunicorn master (with --preload) so forked workers share them
+    copy-on-write instead of each loading its own copy.
+
+    Only an existing model artifact is loaded - training belongs to the
+    background worker, not to server startup - so the model is None when
+    there is no artifact for the current feature data yet.
+    """
+    index = get_index(root)
+    model = model_store.load_model(root)
+    # Keep the garbage collector from touching (and so copying) the preloaded
+    # objects' pages in the workers
+    gc.collect()
+    gc.freeze()
+    return index, model
+
+
+def clear_cache():
+    with _lock:
+        _indexes.clear()
+
+
+def normalize_tickers(tickers):
+    """Upper-cased, de-duplicated tickers (strings) in request order."""
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+
+
+def score(tickers, root=None, month=None, model=None):
+    """
+    Score `tickers` against the model for the current feature data. The
+    model is only loaded, never trained here (snapshot.ModelNotReady if it
+    hasn't been trained yet).
+
+    Returns:
+        dict with the month scored, the model version, per-ticker results
+        (prob_beat_market and the feature vector) and the unknown tickers
+    """
+    index = get_index(root, month)
+    positions, found, missing = index.lookup(normalize_tickers(tickers))
+
+    if len(positions):
+        model = model or model_store.load_model(root)
+        if model is None:
+            raise snapshot.ModelNotReady(f"No model artifact for {model_store.data_version(root)} yet")
+        features = index.matrix[positions]
+        probs = model.predict_proba(features)[:, 1]
+    else:
+        features, probs = np.empty((0, len(model_store.FEATURE_COLS)), dtype=np.float32), []
+
+    results = [
+        {
+            'ticker': ticker,
+            'prob_beat_market': float(prob),
+            'features': dict(zip(model_store.FEATURE_COLS, row)),
+        }
+        for ticker, prob, row in zip(found, probs, features.tolist())
+    ]
+    return {
+        'as_of': index.month,
+        'version': index.version,
+        'results': results,
+        'missing': missing,
+    }
@@ -0,0 +1,207 @@
+"""
+Recommendation snapshots - the stats block, top-20 table and curated picks
+for the latest feature date, computed once at regeneration time and saved
+as a small JSON file so the web routes only have to read it.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), 'snapshots')
+LATEST_NAME = 'latest.json'
+KEEP_VERSIONS = 5
+
+RECOMMENDATION_COUNT = 20
+CURATED_COUNT = 5
+# Extra rows kept in each list so tickers a user already owns can be hidden
+# without the page showing fewer picks
+SPARE_ROWS = 20
+
+RECOMMENDATION_COLS = [
+    'ticker', 'prob_beat_market', 'sharpe', 'momentum', 'momentum_accel', 'volatility',
+    'dividend_yield', 'avg_correlation', 'market_correlation'
+]
+CURATED_COLS = ['ticker', 'prob_beat_market', 'sharpe', 'volatility', 'dividend_yield']
+
+# (path, mtime) -> parsed snapshot
+_cached = {}
+_lock = threading.Lock()
+
+
+class ModelNotReady(Exception):
+    """
+    No model artifact exists for the current feature data. Web requests
+    raise this instead of training in the web process; a 'train' job
+    (see worker) makes the artifact.
+    """
+
+
+def build_snapshot(df, model, version):
+    """
+    Score the latest date in `df` and precompute everything the
+    recommendations page shows.
+
+    Args:
+        df: Cleaned feature rows, at least the latest month (see model_store.clean_features)
+        model: Fitted classifier
+        version: Identifier of the features + model the snapshot came from
+
+    Returns:
+        dict with version, stats, recommendations and curated_picks
+    """
+    from . import model_store
+
+    latest_date = df['date'].max()
+    latest = df[df['date'] == latest_date].copy()
+    latest['prob_beat_market'] = model.predict_proba(latest[model_store.FEATURE_COLS])[:, 1]
+
+    # Filter to stocks with >50% probability as baseline
+    candidates = latest[latest['prob_beat_market'] >= 0.5]
+
+    # Top recommendations
+    recommendations = candidates.sort_values(
+        'prob_beat_market', ascending=False
+    ).head(RECOMMENDATION_COUNT + SPARE_ROWS)[RECOMMENDATION_COLS].to_dict('records')
+
+    # Best Overall: High probability + positive Sharpe ratio (risk-adjusted returns)
+    best_overall = candidates[candidates['sharpe'] > 0].sort_values(
+        'prob_beat_market', ascending=False
+    ).head(CURATED_COUNT + SPARE_ROWS)[CURATED_COLS].to_dict('records')
+
+    # Income Focused: Best dividend yields (>1%) with decent probability
+    income_focused = candidates[candidates['dividend_yield'] >= 0.01].sort_values(
+        ['dividend_yield', 'prob_beat_market'], ascending=[False, False]
+    ).head(CURATED_COUNT + SPARE_ROWS)[CURATED_COLS].to_dict('records')
+
+    # Low Risk: Lower volatility (<50%) with good probability
+    low_risk = candidates[candidates['volatility'] < 0.5].sort_values(
+        ['volatility', 'prob_beat_market'], ascending=[True, False]
+    ).head(CURATED_COUNT + SPARE_ROWS)[CURATED_COLS].to_dict('records')
+
+    probs = latest['prob_beat_market']
+    stats = {
+        'total_analyzed': len(latest),
+        'above_50': int((probs > 0.5).sum()),
+        'above_55': int((probs > 0.55).sum()),
+        'above_60': int((probs > 0.6).sum()),
+        'avg_prob': float(probs.mean() * 100),
+        'max_prob': float(probs.max() * 100),
+        'last_updated': latest_date.strftime('%Y-%m-%d')
+    }
+
+    return {
+        'version': version,
+        'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'stats': stats,
+        'recommendations': recommendations,
+        'curated_picks': {
+            'best_overall': best_overall,
+            'income_focused': income_focused,
+            'low_risk': low_risk
+        }
+    }
+
+
+def select(snapshot, exclude=()):
+    """
+    The recommendations and curated picks to show, skipping tickers in `exclude`.
+
+    Returns:
+        (recommendations, curated_picks)
+    """
+    def pick(rows, count):
+        return [row for row in rows if row['ticker'] not in exclude][:count]
+
+    recommendations = pick(snapshot['recommendations'], RECOMMENDATION_COUNT)
+    curated_picks = {name: pick(rows, CURATED_COUNT) for name, rows in snapshot['curated_picks'].items()}
+    return recommendations, curated_picks
+
+
+def write_snapshot(snapshot, directory=None):
+    """Save a versioned snapshot and atomically make it the latest one."""
+    directory = directory or SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+    payload = json.dumps(snapshot, default=float)
+
+    for name in (f"recommendations_{snapshot['version']}.json", LATEST_NAME):
+        path = os.path.join(directory, name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    # Keep a few old versions around for inspection, drop the rest
+    versions = sorted(
+        (entry for entry in os.scandir(directory)
+         if entry.name.startswith('recommendations_') and entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    for entry in versions[KEEP_VERSIONS:]:
+        os.remove(entry.path)
+
+    return os.path.join(directory, LATEST_NAME)
+
+
+def load_snapshot(directory=None):
+    """Return the latest snapshot, or None if none has been written yet."""
+    path = os.path.join(directory or SNAPSHOT_DIR, LATEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    key = (path, mtime)
+    snapshot = _cached.get(key)
+    if snapshot is None:
+        with open(path) as f:
+            snapshot = json.load(f)
+        with _lock:
+            _cached.clear()
+            _cached[key] = snapshot
+    return snapshot
+
+
+def clear_cache():
+    """Forget the in-memory copy of the latest snapshot."""
+    with _lock:
+        _cached.clear()
+
+
+def refresh_snapshot(root=None, directory=None, train=True):
+    """
+    Get the (persisted) model, score the latest month and write a new snapshot.
+    With train=False the model is only loaded, raising ModelNotReady if it
+    hasn't been trained for the current feature data.
+    """
+    # Only regeneration and first use need the feature store and model; the
+    # web routes just read the snapshot file
+    from . import feature_store, model_store
+
+    version = model_store.artifact_key(model_store.data_version(root))
+    model = model_store.get_model(root) if train else model_store.load_model(root)
+    if model is None:
+        raise ModelNotReady(f"No model artifact for {version} yet")
+    latest = model_store.clean_features(feature_store.read_latest(root))
+    snapshot = build_snapshot(latest, model, version)
+    write_snapshot(snapshot, directory)
+
+    # Score the latest month again (not a 'score' run's rows), and cache its
+    # scoring matrix now rather than on a web request
+    from . import scoring
+    scoring.clear_live(root)
+    scoring.get_index(root)
+    return snapshot
+
+
+def get_snapshot(root=None, directory=None):
+    """
+    Latest snapshot, building one from the feature store and the persisted
+    model on first use (raising ModelNotReady rather than training one).
+    """
+    snapshot = load_snapshot(directory)
+    if snapshot is None:
+        snapshot = refresh_snapshot(root, directory, train=False)
+    return snapshot
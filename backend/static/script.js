@@ -40,6 +40,7 @@ function checkRegenerationStatusEarly() {
         if (elapsedMs > 100 * 60 * 1000) {
             localStorage.removeItem('isRegeneratingStockData');
             localStorage.removeItem('regenerationStartTime');
+            localStorage.removeItem('followedJobId');
             return;
         }
 
@@ -60,15 +61,23 @@ function checkRegenerationStatusEarly() {
     }
 }
 
+// Query string selecting the job this browser queued (its id is kept across
+// reloads); without one the progress endpoints report whichever job is running
+function followedJobQuery() {
+    const jobId = localStorage.getItem('followedJobId');
+    return jobId ? `?job_id=${encodeURIComponent(jobId)}` : '';
+}
+
 // Verify that the regeneration task is actually running on the backend
 function verifyRegenerationTaskRunning() {
-    fetch('/api/regeneration-status')
+    fetch(`/api/regeneration-status${followedJobQuery()}`)
         .then(response => response.json())
         .then(data => {
             if (!data.is_running) {
                 // Task is not actually running, clear localStorage
                 localStorage.removeItem('isRegeneratingStockData');
                 localStorage.removeItem('regenerationStartTime');
+                localStorage.removeItem('followedJobId');
 
                 // Reset button UI
                 const regenerateBtn = document.getElementById('regenerate-btn');
@@ -419,7 +428,41 @@ function deleteFile(fileId) {
     });
 }
 
-// Refresh recommendations with latest data from stock_features.csv
+// Version (ETag) of the recommendations currently shown on the page
+let recommendationsETag = null;
+
+function currentRecommendationsETag() {
+    if (recommendationsETag === null && document.body && document.body.dataset.recommendationsVersion) {
+        recommendationsETag = `"${document.body.dataset.recommendationsVersion}"`;
+    }
+    return recommendationsETag;
+}
+
+// Conditionally fetch recommendations: resolves to the response data, or to
+// null when the server answers 304 Not Modified (nothing new since last time)
+function fetchRecommendationsIfChanged() {
+    const headers = {};
+    const etag = currentRecommendationsETag();
+    if (etag) {
+        headers['If-None-Match'] = etag;
+    }
+
+    return fetch('/api/refresh-recommendations', { headers: headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304) {
+                return null;
+            }
+            const newETag = response.headers.get('ETag');
+            return response.json().then(data => {
+                if (data.success && newETag) {
+                    recommendationsETag = newETag;
+                }
+                return data;
+            });
+        });
+}
+
+// Refresh recommendations with latest data from the feature store
 function refreshRecommendations() {
     const refreshBtn = document.getElementById('refresh-btn');
     const refreshBtnText = document.getElementById('refresh-btn-text');
@@ -431,12 +474,15 @@ function refreshRecommendations() {
     refreshBtnText.textContent = 'Updating...';
     refreshSpinner.style.display = 'inline-block';
 
-    fetch('/api/refresh-recommendations', {
-        method: 'POST'
-    })
-    .then(response => response.json())
+    fetchRecommendationsIfChanged()
     .then(data => {
-        if (data.success) {
+        if (data === null) {
+            // Nothing changed since the data on the page
+            refreshBtn.disabled = false;
+            refreshBtnText.textContent = 'Refresh Data';
+            refreshSpinner.style.display = 'none';
+            showNotification('Recommendations are already up to date.', 'info');
+        } else if (data.success) {
             // Update the stats
             const stats = data.stats;
 
@@ -503,7 +549,7 @@ function refreshRecommendations() {
     });
 }
 
-// Regenerate stock_features.csv from fresh yfinance data
+// Regenerate the feature store from fresh yfinance data
 function regenerateStockData() {
     const regenerateBtn = document.getElementById('regenerate-btn');
     const regenerateBtnText = document.getElementById('regenerate-btn-text');
@@ -524,62 +570,19 @@ function regenerateStockData() {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            regenerateBtnText.textContent = 'Processing... (10-20 min)';
+            regenerateBtnText.textContent = 'Processing...';
             showNotification(data.message, 'info');
+            localStorage.setItem('followedJobId', data.job_id);
 
-            // Poll for completion every 30 seconds and refresh recommendations when done
-            let pollCount = 0;
-            const maxPolls = 200; // ~100 minutes max
-            const pollInterval = setInterval(() => {
-                pollCount++;
-
-                // Update status text with elapsed time estimate
-                const elapsedMinutes = Math.floor((pollCount * 30) / 60);
-                regenerateBtnText.textContent = `Processing... (${elapsedMinutes} min elapsed)`;
-
-                // Check if we can load the new data by trying to refresh
-                fetch('/api/refresh-recommendations', { method: 'POST' })
-                    .then(response => response.json())
-                    .then(pollData => {
-                        if (pollData.success) {
-                            // Data regeneration likely complete, show success
-                            regenerateBtnText.textContent = 'Finalizing...';
-                            showNotification('Stock data regeneration complete! Recommendations updated.', 'success');
-                            clearInterval(pollInterval);
-
-                            // Update recommendations on page
-                            updateRecommendationsFromData(pollData);
-
-                            // Reset button after a short delay and clear localStorage
-                            setTimeout(() => {
-                                regenerateBtn.disabled = false;
-                                regenerateBtnText.textContent = 'Regenerate Stock Data';
-                                regenerateSpinner.style.display = 'none';
-                                localStorage.removeItem('isRegeneratingStockData');
-                                localStorage.removeItem('regenerationStartTime');
-                            }, 1000);
-                        }
-                    })
-                    .catch(() => {
-                        // Still generating, continue polling
-                        if (pollCount >= maxPolls) {
-                            clearInterval(pollInterval);
-                            regenerateBtn.disabled = false;
-                            regenerateBtnText.textContent = 'Regenerate Stock Data';
-                            regenerateSpinner.style.display = 'none';
-                            localStorage.removeItem('isRegeneratingStockData');
-                            localStorage.removeItem('regenerationStartTime');
-                            showNotification('Stock data regeneration may still be running. Please refresh the page manually.', 'info');
-                        }
-                    });
-            }, 30000); // Poll every 30 seconds
-
+            // Progress is pushed by the server, no polling needed
+            subscribeToRegenerationProgress();
         } else {
             regenerateBtn.disabled = false;
             regenerateBtnText.textContent = 'Regenerate Stock Data';
             regenerateSpinner.style.display = 'none';
             localStorage.removeItem('isRegeneratingStockData');
             localStorage.removeItem('regenerationStartTime');
+            localStorage.removeItem('followedJobId');
 
             showNotification('Failed to start regeneration: ' + data.error, 'error');
         }
@@ -592,13 +595,229 @@ function regenerateStockData() {
         regenerateSpinner.style.display = 'none';
         localStorage.removeItem('isRegeneratingStockData');
         localStorage.removeItem('regenerationStartTime');
+        localStorage.removeItem('followedJobId');
 
         showNotification('Failed to start data regeneration: ' + error.message, 'error');
     });
 }
 
 
-// Set up polling when DOM is ready (button state already set by checkRegenerationStatusEarly)
+// Queue a scoring-only refresh: today's features from recent prices, scored
+// with the current model. Runs as a background job like a regeneration.
+function scoreNow() {
+    const regenerateBtn = document.getElementById('regenerate-btn');
+    const regenerateBtnText = document.getElementById('regenerate-btn-text');
+    const regenerateSpinner = document.getElementById('regenerate-spinner');
+
+    regenerateBtn.disabled = true;
+    regenerateBtnText.textContent = 'Starting...';
+    regenerateSpinner.style.display = 'inline-block';
+    setJobButtonsDisabled(true);
+
+    localStorage.setItem('isRegeneratingStockData', 'true');
+    localStorage.setItem('regenerationStartTime', Date.now().toString());
+
+    fetch('/api/score-now', {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            regenerateBtnText.textContent = 'Processing...';
+            showNotification(data.message, 'info');
+            localStorage.setItem('followedJobId', data.job_id);
+            subscribeToRegenerationProgress();
+        } else {
+            throw new Error(data.error || 'Unknown error occurred');
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+
+        regenerateBtn.disabled = false;
+        regenerateBtnText.textContent = 'Regenerate Stock Data';
+        regenerateSpinner.style.display = 'none';
+        setJobButtonsDisabled(false);
+        localStorage.removeItem('isRegeneratingStockData');
+        localStorage.removeItem('regenerationStartTime');
+        localStorage.removeItem('followedJobId');
+
+        showNotification('Failed to start scoring refresh: ' + error.message, 'error');
+    });
+}
+
+// The job this browser queued and the progress display follows, so it can be cancelled
+let followedJobId = null;
+
+function cancelJob() {
+    if (followedJobId === null) {
+        return;
+    }
+    fetch(`/api/jobs/${followedJobId}/cancel`, {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showNotification('Cancelling the job...', 'info');
+        } else {
+            showNotification('Failed to cancel: ' + data.error, 'error');
+        }
+    })
+    .catch(error => {
+        showNotification('Failed to cancel: ' + error.message, 'error');
+    });
+}
+
+function setJobButtonsDisabled(disabled) {
+    const scoreBtn = document.getElementById('score-btn');
+    if (scoreBtn) {
+        scoreBtn.disabled = disabled;
+    }
+}
+
+// Follow regeneration progress over server-sent events and load the new
+// recommendations once the run has finished. When the server has no stream
+// free it refuses the connection, and the status endpoint is polled instead.
+let regenerationEvents = null;
+let regenerationPoll = null;
+
+function subscribeToRegenerationProgress() {
+    if (regenerationEvents !== null || regenerationPoll !== null) {
+        return;
+    }
+
+    const regenerateBtn = document.getElementById('regenerate-btn');
+    const regenerateBtnText = document.getElementById('regenerate-btn-text');
+    const regenerateSpinner = document.getElementById('regenerate-spinner');
+    const progressContainer = document.getElementById('regeneration-progress');
+    const progressBar = document.getElementById('regeneration-progress-bar');
+    const progressText = document.getElementById('regeneration-progress-text');
+
+    if (!regenerateBtn || !regenerateBtnText || !regenerateSpinner) {
+        return;
+    }
+
+    const cancelBtn = document.getElementById('cancel-job-btn');
+    followedJobId = localStorage.getItem('followedJobId');
+
+    if (progressContainer) {
+        progressContainer.style.display = 'block';
+    }
+    setJobButtonsDisabled(true);
+
+    const finish = () => {
+        if (regenerationEvents !== null) {
+            regenerationEvents.close();
+            regenerationEvents = null;
+        }
+        if (regenerationPoll !== null) {
+            clearInterval(regenerationPoll);
+            regenerationPoll = null;
+        }
+
+        regenerateBtn.disabled = false;
+        regenerateBtnText.textContent = 'Regenerate Stock Data';
+        regenerateSpinner.style.display = 'none';
+        setJobButtonsDisabled(false);
+        followedJobId = null;
+        if (cancelBtn) {
+            cancelBtn.style.display = 'none';
+        }
+        localStorage.removeItem('isRegeneratingStockData');
+        localStorage.removeItem('regenerationStartTime');
+        localStorage.removeItem('followedJobId');
+
+        if (progressContainer) {
+            setTimeout(() => {
+                progressContainer.style.display = 'none';
+            }, 3000);
+        }
+    };
+
+    let finished = false;
+    const handleUpdate = (update) => {
+        // Another job's progress (e.g. a regeneration this one is queued behind)
+        if (finished || (followedJobId !== null && update.job_id !== followedJobId)) {
+            return;
+        }
+        if (cancelBtn) {
+            const active = followedJobId !== null && update.stage !== 'done' && update.stage !== 'error';
+            cancelBtn.style.display = active ? 'flex' : 'none';
+        }
+        if (update.percent !== null && update.percent !== undefined) {
+            if (progressBar) {
+                progressBar.style.width = `${update.percent}%`;
+            }
+            regenerateBtnText.textContent = `Processing... (${Math.floor(update.percent)}%)`;
+        }
+        if (progressText) {
+            let text = update.message;
+            if (update.eta_seconds !== null && update.eta_seconds !== undefined) {
+                text += ` - about ${Math.max(1, Math.round(update.eta_seconds / 60))} min left`;
+            }
+            progressText.textContent = text;
+        }
+
+        if (update.stage === 'done') {
+            finished = true;
+            regenerateBtnText.textContent = 'Finalizing...';
+            fetchRecommendationsIfChanged()
+                .then(data => {
+                    if (data && data.success) {
+                        updateRecommendationsFromData(data);
+                    }
+                    showNotification(`${update.message}! Recommendations updated.`, 'success');
+                })
+                .catch(() => {
+                    showNotification(`${update.message}. Please refresh the page.`, 'info');
+                })
+                .finally(finish);
+        } else if (update.stage === 'error') {
+            finished = true;
+            showNotification(update.message, 'error');
+            finish();
+        }
+    };
+
+    const pollStatus = () => {
+        regenerationPoll = setInterval(() => {
+            fetch(`/api/regeneration-status${followedJobQuery()}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.job) {
+                        return;
+                    }
+                    const update = data.job;
+                    update.job_id = update.id;
+                    if (update.state === 'failed' || update.state === 'cancelled') {
+                        update.stage = 'error';
+                    }
+                    handleUpdate(update);
+                })
+                .catch(() => {
+                    // The server may be restarting; try again on the next tick
+                });
+        }, 5000);
+    };
+
+    if (typeof EventSource === 'undefined') {
+        pollStatus();
+        return;
+    }
+
+    regenerationEvents = new EventSource(`/api/regeneration-events${followedJobQuery()}`);
+    regenerationEvents.onmessage = (event) => handleUpdate(JSON.parse(event.data));
+    regenerationEvents.onerror = () => {
+        // A refused stream (every slot taken) closes for good; dropped ones reconnect by themselves
+        if (regenerationEvents !== null && regenerationEvents.readyState === EventSource.CLOSED) {
+            regenerationEvents = null;
+            pollStatus();
+        }
+    };
+}
+
+// Resume following progress when DOM is ready (button state already set by checkRegenerationStatusEarly)
 document.addEventListener('DOMContentLoaded', function() {
     const isRegenerating = localStorage.getItem('isRegeneratingStockData');
     if (isRegenerating === 'true') {
@@ -610,53 +829,11 @@ document.addEventListener('DOMContentLoaded', function() {
         if (elapsedMs > 100 * 60 * 1000) {
             localStorage.removeItem('isRegeneratingStockData');
             localStorage.removeItem('regenerationStartTime');
+            localStorage.removeItem('followedJobId');
             return;
         }
 
-        const regenerateBtn = document.getElementById('regenerate-btn');
-        const regenerateBtnText = document.getElementById('regenerate-btn-text');
-        const regenerateSpinner = document.getElementById('regenerate-spinner');
-
-        // Resume polling for completion
-        let elapsedMinutes = Math.floor(elapsedMs / 60000);
-        let pollCount = Math.floor(elapsedMs / 30000);
-        const maxPolls = 200;
-
-        const pollInterval = setInterval(() => {
-            pollCount++;
-            const totalElapsedMinutes = elapsedMinutes + Math.floor((pollCount * 30000) / 60000);
-            regenerateBtnText.textContent = `Processing... (${totalElapsedMinutes} min elapsed)`;
-
-            fetch('/api/refresh-recommendations', { method: 'POST' })
-                .then(response => response.json())
-                .then(pollData => {
-                    if (pollData.success) {
-                        regenerateBtnText.textContent = 'Finalizing...';
-                        showNotification('Stock data regeneration complete! Recommendations updated.', 'success');
-                        clearInterval(pollInterval);
-                        updateRecommendationsFromData(pollData);
-
-                        setTimeout(() => {
-                            regenerateBtn.disabled = false;
-                            regenerateBtnText.textContent = 'Regenerate Stock Data';
-                            regenerateSpinner.style.display = 'none';
-                            localStorage.removeItem('isRegeneratingStockData');
-                            localStorage.removeItem('regenerationStartTime');
-                        }, 1000);
-                    }
-                })
-                .catch(() => {
-                    if (pollCount >= maxPolls) {
-                        clearInterval(pollInterval);
-                        regenerateBtn.disabled = false;
-                        regenerateBtnText.textContent = 'Regenerate Stock Data';
-                        regenerateSpinner.style.display = 'none';
-                        localStorage.removeItem('isRegeneratingStockData');
-                        localStorage.removeItem('regenerationStartTime');
-                        showNotification('Stock data regeneration may still be running. Please refresh the page manually.', 'info');
-                    }
-                });
-        }, 30000);
+        subscribeToRegenerationProgress();
     }
 });
 
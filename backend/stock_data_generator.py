@@ -1,70 +1,145 @@
 """
 Stock data generation module - handles downloading and feature engineering for stock data.
-Can be used both as a CLI script and imported by Flask app for API endpoints.
+Can be used both as a CLI script (python -m backend.stock_data_generator) and imported
+by Flask app for API endpoints.
+
+CLI usage:
+    python -m backend.stock_data_generator [store_dir] [full|incremental|score]
+
+Configuration (environment variables):
+    DATA_PROVIDER      'yahoo' (default), or 'synthetic'/'recorded' to run offline (see providers)
+    DOWNLOAD_WORKERS   concurrent yfinance price requests (default 4)
+    FEATURE_WORKERS    processes computing feature months in parallel, 1 = none (default 1)
+    FEATURE_GENERATION_MODE
+                       'full' rebuilds every month, 'incremental' computes only the
+                       months that are new or whose targets were incomplete, 'score'
+                       only scores today's features from recent closes (default full)
 """
 
+import contextlib
+import html
+import multiprocessing
+import os
 import re
 import json
+import tempfile
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
 import numpy as np
 import yfinance as yf
+from yfinance.exceptions import YFException, YFRateLimitError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import time
 
+from . import checkpoints, downloader, feature_store, price_cache, providers, snapshot, ticker_metadata
+from .correlation import RollingCorrelation
+from .instrumentation import RunMetrics
 
-def fetch_etf_holdings(url, headers):
-    """Fetch ETF holdings from Zacks website."""
-    try:
-        data = requests.get(url, headers=headers, timeout=10)
-        html_content = data.text
-
-        # Extract JavaScript data
-        pattern = r'etf_holdings\.formatted_data\s*=\s*(\[.*?\]);'
-        match = re.search(pattern, html_content, re.DOTALL)
-
-        if match:
-            data_str = match.group(1)
-            holdings_data = json.loads(data_str)
-            symbol_list = []
-
-            for row in holdings_data:
-                symbol_html = row[1]
-                symbol_soup = BeautifulSoup(symbol_html, 'html.parser')
-                symbol_span = symbol_soup.find('span', class_='hoverquote-symbol')
-                if symbol_span:
-                    symbol_list.append(symbol_span.get_text(strip=True))
-                else:
-                    symbol_list.append(row[1].strip())
-
-            return symbol_list
+
+# ETF pages whose holdings make up the universe
+ETF_HOLDINGS_URLS = {
+    'large': 'https://www.zacks.com/funds/etf/SPY/holding',
+    'mid': 'https://www.zacks.com/funds/etf/MDY/holding',
+    'small': 'https://www.zacks.com/funds/etf/SPSM/holding',
+}
+# Each page's last holdings, with the ETag/Last-Modified to revalidate them
+ETF_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'etf_holdings_cache.json')
+# Holdings fetched more recently than this are used without asking Zacks
+ETF_CACHE_TTL = timedelta(hours=20)
+
+HOLDINGS_PATTERN = re.compile(r'etf_holdings\.formatted_data\s*=\s*(\[.*?\]);', re.DOTALL)
+# The text of a row's <span class="hoverquote-symbol">
+SYMBOL_PATTERN = re.compile(r'<span[^>]*\bclass="[^"]*\bhoverquote-symbol\b[^"]*"[^>]*>([^<]*)')
+
+
+def parse_etf_holdings(html_content):
+    """Symbols in a Zacks holdings page, in page order."""
+    match = HOLDINGS_PATTERN.search(html_content)
+    if not match:
         return []
+    symbol_list = []
+    for row in json.loads(match.group(1)):
+        symbol = SYMBOL_PATTERN.search(row[1])
+        symbol_list.append(html.unescape(symbol.group(1)).strip() if symbol else row[1].strip())
+    return symbol_list
+
+
+def fetch_etf_holdings(url, headers, cached=None):
+    """
+    Fetch ETF holdings from Zacks website. With `cached` (an earlier result
+    for the page) the request is conditional, and if the page hasn't changed,
+    or can't be fetched, its holdings are reused. A page that fails (an error
+    status, or no holdings in it) never replaces them or their ETag.
+
+    Returns:
+        {'symbols': [...], 'etag': ..., 'last_modified': ..., 'fetched_at': iso time}
+    """
+    request_headers = dict(headers)
+    if cached:
+        if cached.get('etag'):
+            request_headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            request_headers['If-Modified-Since'] = cached['last_modified']
+    try:
+        response = requests.get(url, headers=request_headers, timeout=10)
+        fetched_at = datetime.now().isoformat()
+        if response.status_code == 304 and cached:
+            return {**cached, 'fetched_at': fetched_at}
+        response.raise_for_status()
+        symbols = parse_etf_holdings(response.text)
+        if not symbols:
+            raise ValueError(f"no holdings found in {url} (status {response.status_code})")
+        return {
+            'symbols': symbols,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': fetched_at,
+        }
     except Exception as e:
         print(f"Error fetching ETF holdings: {e}")
-        return []
+        return cached or {'symbols': [], 'etag': None, 'last_modified': None, 'fetched_at': None}
 
 
-def get_all_tickers():
+def get_all_tickers(cache_path=None):
     """Fetch all ticker symbols from large, mid, and small cap ETFs."""
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     }
-
-    large_cap_url = 'https://www.zacks.com/funds/etf/SPY/holding'
-    mid_cap_url = 'https://www.zacks.com/funds/etf/MDY/holding'
-    small_cap_url = 'https://www.zacks.com/funds/etf/SPSM/holding'
+    cache_path = cache_path or ETF_CACHE_PATH
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    def holdings(url):
+        cached = cache.get(url)
+        if cached and datetime.now() - datetime.fromisoformat(cached['fetched_at']) < ETF_CACHE_TTL:
+            return cached
+        return fetch_etf_holdings(url, headers, cached)
 
     print("Fetching ETF holdings...")
-    large_symbol_list = fetch_etf_holdings(large_cap_url, headers)
-    mid_symbol_list = fetch_etf_holdings(mid_cap_url, headers)
-    small_symbol_list = fetch_etf_holdings(small_cap_url, headers)
+    urls = list(ETF_HOLDINGS_URLS.values())
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        results = dict(zip(urls, pool.map(holdings, urls)))
+
+    # An empty result is a failed fetch, not holdings worth keeping
+    updated = {url: result for url, result in results.items() if result['symbols'] and result != cache.get(url)}
+    if updated:
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({**cache, **updated}, f, indent=2)
+        os.replace(tmp_path, cache_path)
 
-    print(f"Found {len(large_symbol_list)} large cap symbols")
-    print(f"Found {len(mid_symbol_list)} mid cap symbols")
-    print(f"Found {len(small_symbol_list)} small cap symbols")
+    symbol_lists = [results[ETF_HOLDINGS_URLS[cap]]['symbols'] for cap in ('large', 'mid', 'small')]
+    for cap, symbol_list in zip(('large', 'mid', 'small'), symbol_lists):
+        print(f"Found {len(symbol_list)} {cap} cap symbols")
+    return tuple(symbol_lists)
 
-    return large_symbol_list, mid_symbol_list, small_symbol_list
+
+def _report(progress, stage, message, **data):
+    """Send a progress event if the caller asked for them."""
+    if progress is not None:
+        progress(stage, message, **data)
 
 
 def is_valid_ticker(ticker):
@@ -76,7 +151,7 @@ def is_valid_ticker(ticker):
 def filter_tickers(large_list, mid_list, small_list):
     """Filter and deduplicate ticker list."""
     all_tickers = large_list + mid_list + small_list
-    all_tickers = list(set(all_tickers))
+    all_tickers = sorted(set(all_tickers))
     print(f"Total unique tickers: {len(all_tickers)}")
 
     valid_tickers = [t for t in all_tickers if is_valid_ticker(t)]
@@ -91,258 +166,676 @@ def filter_tickers(large_list, mid_list, small_list):
     return valid_tickers
 
 
-def download_in_batches(tickers, period='5y', interval='1d', batch_size=20, delay=5):
-    """Download price data in batches, retrying failures at the end."""
-    all_prices = []
-    failed_tickers = []
-    total_batches = (len(tickers) - 1) // batch_size + 1
-
-    for i in range(0, len(tickers), batch_size):
-        batch = tickers[i:i + batch_size]
-        batch_num = i // batch_size + 1
-        print(f"Downloading batch {batch_num}/{total_batches} ({len(batch)} tickers)...")
-
-        try:
-            data = yf.download(
-                batch,
-                period=period,
-                interval=interval,
-                progress=False,
-                threads=False,
-                auto_adjust=True
-            )
-            if not data.empty:
-                if isinstance(data.columns, pd.MultiIndex):
-                    prices = data['Close']
-                else:
-                    prices = data[['Close']]
-                    if len(batch) == 1:
-                        prices.columns = batch
-                # Track which tickers we actually got
-                got_tickers = set(prices.columns.tolist())
-                if missed := [t for t in batch if t not in got_tickers]:
-                    failed_tickers.extend(missed)
-                all_prices.append(prices)
-            else:
-                failed_tickers.extend(batch)
-        except Exception as e:
-            print(f"  Batch failed: {e}")
-            failed_tickers.extend(batch)
-
-        time.sleep(delay)
-
-    # Retry failed tickers
-    if failed_tickers:
-        print(f"\nRetrying {len(failed_tickers)} failed tickers...")
-        time.sleep(10)
-        retry_batches = (len(failed_tickers) - 1) // batch_size + 1
-        for i in range(0, len(failed_tickers), batch_size):
-            batch = failed_tickers[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            print(f"Retry batch {batch_num}/{retry_batches} ({len(batch)} tickers)...")
-            try:
-                data = yf.download(
-                    batch,
-                    period=period,
-                    interval=interval,
-                    progress=False,
-                    threads=False,
-                    auto_adjust=True
-                )
-                if not data.empty:
-                    if isinstance(data.columns, pd.MultiIndex):
-                        prices = data['Close']
-                    else:
-                        prices = data[['Close']]
-                        if len(batch) == 1:
-                            prices.columns = batch
-                    all_prices.append(prices)
-            except Exception as e:
-                print(f"  Retry failed: {e}")
-            time.sleep(delay)
-
-    # Combine all data
-    if all_prices:
-        combined = pd.concat(all_prices, axis=1)
-        combined = combined.loc[:, ~combined.columns.duplicated()]
-        print(f"\nTotal downloaded: {len(combined.columns)} tickers")
-        return combined
-
-    return pd.DataFrame()
-
-
-def create_feature_dataset(prices, lookback_months=6, forward_months=3):
+# Calls to yfinance in flight at once (see downloader for the rate limiting)
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', str(downloader.WORKERS)))
+
+
+def fetch_close(ticker, period='5y', interval='1d', start=None):
+    """
+    Adjusted closes of one ticker from yfinance (from `start` if given, else
+    `period`), None if it has none. Raises downloader.RateLimited when throttled.
     """
-    Create a feature dataset for ML from price data.
+    date_range = {'start': start} if start is not None else {'period': period}
+    try:
+        history = yf.Ticker(ticker).history(**date_range, interval=interval, auto_adjust=True, raise_errors=True)
+    except YFRateLimitError as e:
+        raise downloader.RateLimited(str(e)) from e
+    except YFException:
+        # Delisted, no data in the range, ...
+        return None
+    close = history['Close'].dropna()
+    if close.empty:
+        return None
+    # Daily bars are stamped midnight exchange time; keep just the date
+    close.index = close.index.tz_localize(None)
+    return close
+
+
+def download_prices(tickers, period='5y', interval='1d', progress=None, start=None, provider=None, workers=None):
+    """
+    Download adjusted closes concurrently (from `start` if given, else `period`).
 
-    Each row = one stock at one point in time
-    Features = what we know at that time
-    Target = future return (what we're predicting)
+    Args:
+        provider: Where the closes come from (default: yfinance; see providers)
+        workers: Calls in flight at once (default DOWNLOAD_WORKERS)
+
+    Returns:
+        Date x ticker closes of the tickers that have any
+    """
+    fetch_one = provider.fetch_close if provider is not None else fetch_close
+    print(f"Downloading {len(tickers)} tickers...")
+    closes, failed = downloader.download(
+        tickers, lambda ticker: fetch_one(ticker, period, interval, start), workers=workers or DOWNLOAD_WORKERS,
+        limiter=provider.rate_limiter() if provider is not None else None,
+        on_progress=lambda done, total: _report(progress, 'download', f"Downloaded {done}/{total} tickers",
+                                                done=done, total=total))
+    if failed:
+        print(f"No data for {len(failed)} tickers")
+    if not closes:
+        return pd.DataFrame()
+    combined = pd.concat(closes, axis=1).sort_index()
+    print(f"\nTotal downloaded: {len(combined.columns)} tickers")
+    return combined
+
+
+# 'full' downloads five years and rebuilds the store; 'incremental' downloads
+# only the history the new months need and upserts them into the store
+GENERATION_MODE = os.getenv('FEATURE_GENERATION_MODE', 'full')
+GENERATION_MODES = ('full', 'incremental', 'score')
+# Months of prices an incremental run downloads before the first month it
+# computes: the lookback window plus momentum's 126 trading days, and enough
+# for the 250-day minimum history filter
+INCREMENTAL_HISTORY_MONTHS = 13
+
+# Processes computing feature months in parallel (1 = all in this process)
+FEATURE_WORKERS = int(os.getenv('FEATURE_WORKERS', '1'))
+# Consecutive months per task. Each task computes its first month's
+# correlation moments from scratch, so the output is the same whatever the
+# number of workers.
+MONTHS_PER_TASK = 6
+
+# Tickers with fewer closes than this in the downloaded history are dropped
+MIN_PRICE_DAYS = 250
+
+# Trading days in a month: sizes the momentum window and the "recent" part of momentum_accel
+TRADING_DAYS_PER_MONTH = 21
+# Tickers with fewer daily returns than this in a month's lookback window get no row
+MIN_LOOKBACK_RETURNS = 20
+
+# Type of the price and return matrices held through feature generation; each
+# month's windows are taken out of them as float64 for the arithmetic
+MATRIX_DTYPE = np.float32
+# Tickers whose returns are computed (in float64) at a time
+RETURNS_BLOCK_COLUMNS = 256
+# Closes 'score' mode reads before the date it scores: the lookback window
+# (about 126 trading days) plus a margin, so the window's first return and
+# the closes carried into it are the ones a full history gives
+SCORE_HISTORY = pd.DateOffset(months=6, days=14)
+
+FEATURE_DATASET_COLUMNS = [
+    'ticker', 'date', 'momentum', 'volatility', 'avg_correlation', 'max_correlation',
+    'min_correlation', 'market_correlation', 'sharpe', 'momentum_accel', 'future_return', 'beat_market'
+]
+
+
+def _month_bounds(index, dates, lookback_months, forward_months):
     """
+    Row positions of each month's windows in the (sorted) trading day index.
 
-    # Calculate daily returns
-    returns = prices.pct_change()
+    Returns:
+        (months, 4) int array of (lo, hi, fwd_lo, fwd_hi): the lookback window
+        [date - lookback_months, date] is rows lo:hi and the forward window
+        [date, date + forward_months] is rows fwd_lo:fwd_hi, both including
+        their end dates like label slicing does
+    """
+    lo = index.searchsorted(dates - pd.DateOffset(months=lookback_months), side='left')
+    hi = index.searchsorted(dates, side='right')
+    fwd_lo = index.searchsorted(dates, side='left')
+    fwd_hi = index.searchsorted(dates + pd.DateOffset(months=forward_months), side='right')
+    return np.column_stack([lo, hi, fwd_lo, fwd_hi])
 
-    # We'll build features at monthly intervals
-    monthly_dates = prices.resample('M').last().index
 
-    # Need enough history for lookback and enough future for target
-    valid_dates = monthly_dates[lookback_months:-forward_months]
+def _forward_complete(dates, last_date, forward_months):
+    """
+    Which of `dates` (or whether a single date) have their whole forward
+    window in prices that end on `last_date`: the next trading day falls
+    after the window.
+    """
+    return dates + pd.DateOffset(months=forward_months) < last_date + pd.offsets.BDay(1)
 
-    all_rows = []
 
-    for date in valid_dates:
-        print(f"Processing {date.strftime('%Y-%m')}...")
+def _masked_sum(values, mask):
+    return np.where(mask, values, 0.0).sum(axis=0)
 
-        # Get lookback window
-        lookback_start = date - pd.DateOffset(months=lookback_months)
-        lookback_returns = returns[lookback_start:date]
 
-        # Get forward window (for target)
-        forward_end = date + pd.DateOffset(months=forward_months)
-        forward_returns = returns[date:forward_end]
+def _month_features(prices, returns, bounds, momentum_days, correlations):
+    """
+    Features and target of every ticker for one month.
 
-        # Calculate correlation matrix for this period
-        corr_matrix = lookback_returns.corr()
+    Args:
+        prices: (days, tickers) array of close prices (MATRIX_DTYPE)
+        returns: (days, tickers) array of daily returns (MATRIX_DTYPE)
+        bounds: (lo, hi, fwd_lo, fwd_hi) of the month (see _month_bounds)
+        momentum_days: trading days momentum is measured over
+        correlations: RollingCorrelation over `returns`
 
-        # Market proxy (equal-weighted average of all stocks)
-        market_return = lookback_returns.mean(axis=1)
+    Returns:
+        (boolean mask of the tickers that get a row, dict of FEATURE_DATASET_COLUMNS
+        arrays for those tickers, without ticker and date)
+    """
+    lo, hi, fwd_lo, fwd_hi = bounds
+    # Momentum needs momentum_days of history; months without it get no rows
+    if hi < momentum_days:
+        return np.zeros(returns.shape[1], dtype=bool), {}
+
+    window = returns[lo:hi].astype(float)
+    valid = ~np.isnan(window)
+    count = valid.sum(axis=0)
+    keep = count >= MIN_LOOKBACK_RETURNS
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1. Momentum (past return over lookback period)
+        momentum = prices[hi - 1].astype(float) / prices[hi - momentum_days] - 1
+
+        # 2. Volatility (annualized std of the ticker's daily returns)
+        period_return = _masked_sum(window, valid)
+        deviations = np.where(valid, window - period_return / count, 0.0)
+        sum_sq = (deviations ** 2).sum(axis=0)
+        std = np.sqrt(sum_sq / (count - 1))
+        volatility = std * np.sqrt(252)
+
+        # 3-5. Average, max and min correlation with all other stocks (see correlation.py)
+        avg_correlation, max_correlation, min_correlation = correlations.summary(lo, hi)
+
+        # 6. Correlation with the equal-weighted "market" over the days the ticker has returns
+        market = _masked_sum(window.T, valid.T) / valid.sum(axis=1)
+        market_window = np.broadcast_to(market[:, None], window.shape)
+        market_deviations = np.where(valid, market_window - _masked_sum(market_window, valid) / count, 0.0)
+        market_correlation = np.clip(
+            (deviations * market_deviations).sum(axis=0)
+            / np.sqrt(sum_sq) / np.sqrt((market_deviations ** 2).sum(axis=0)),
+            -1, 1
+        )
+
+        # 7. Sharpe ratio (return / volatility)
+        sharpe = period_return / (std + 1e-6)
+
+        # 8. Recent vs older momentum: the ticker's last 21 returns vs the ones before
+        returns_after = np.cumsum(valid[::-1], axis=0)[::-1]
+        recent = valid & (returns_after <= TRADING_DAYS_PER_MONTH)
+        momentum_accel = _masked_sum(window, recent) - _masked_sum(window, valid & ~recent)
+
+        # Target: future return and whether it beat the market's
+        forward = returns[fwd_lo:fwd_hi].astype(float)
+        forward_valid = ~np.isnan(forward)
+        future_return = _masked_sum(forward, forward_valid)
+        market_future = np.nansum(_masked_sum(forward.T, forward_valid.T) / forward_valid.sum(axis=1))
+        beat_market = (future_return > market_future).astype(np.int64)
+
+    features = {
+        'momentum': momentum,
+        'volatility': volatility,
+        'avg_correlation': avg_correlation,
+        'max_correlation': max_correlation,
+        'min_correlation': min_correlation,
+        'market_correlation': market_correlation,
+        'sharpe': sharpe,
+        'momentum_accel': momentum_accel,
+        'future_return': future_return,
+        'beat_market': beat_market,
+    }
+    return keep, {name: values[keep] for name, values in features.items()}
 
-        for ticker in prices.columns:
-            try:
-                ticker_returns = lookback_returns[ticker].dropna()
 
-                if len(ticker_returns) < 20:  # Skip if not enough data
-                    continue
+def _feature_months(prices, returns, bounds, momentum_days, correlations, start, stop):
+    """Yield _month_features() of months start:stop (rows of `bounds`), one task's worth."""
+    correlations.move_to(*bounds[start][:2], recompute=True)
+    for month in range(start, stop):
+        yield _month_features(prices, returns, bounds[month], momentum_days, correlations)
 
-                # === FEATURES ===
 
-                # 1. Momentum (past return over lookback period)
-                momentum = (prices[ticker].loc[:date].iloc[-1] /
-                           prices[ticker].loc[:date].iloc[-lookback_months*21] - 1)
+# Per-process state of the feature pool workers (see _init_feature_worker)
+_worker_state = {}
 
-                # 2. Volatility (std of daily returns)
-                volatility = ticker_returns.std() * np.sqrt(252)  # Annualized
 
-                # 3. Average correlation with all other stocks
-                ticker_corrs = corr_matrix[ticker].drop(ticker)
-                avg_correlation = ticker_corrs.mean()
+def _init_feature_worker(prices_path, returns_path, bounds, momentum_days):
+    # The matrices are memory-mapped, so every worker shares the parent's copy in the page cache
+    returns = np.load(returns_path, mmap_mode='r')
+    _worker_state.update(
+        prices=np.load(prices_path, mmap_mode='r'), returns=returns, bounds=bounds,
+        momentum_days=momentum_days, correlations=RollingCorrelation(returns),
+    )
 
-                # 4. Max correlation (how tied to another stock)
-                max_correlation = ticker_corrs.max()
 
-                # 5. Min correlation (most diversifying pair)
-                min_correlation = ticker_corrs.min()
+def _feature_task(task):
+    state = _worker_state
+    return list(_feature_months(state['prices'], state['returns'], state['bounds'],
+                                state['momentum_days'], state['correlations'], *task))
 
-                # 6. Correlation with "market" (equal-weight avg)
-                market_corr = ticker_returns.corr(market_return)
 
-                # 7. Sharpe ratio (return / volatility)
-                period_return = ticker_returns.sum()
-                sharpe = period_return / (ticker_returns.std() + 1e-6)
+@contextlib.contextmanager
+def _single_threaded_blas():
+    """Child processes started in this block use one BLAS thread each (the pool is the parallelism)."""
+    names = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+    saved = {name: os.environ.get(name) for name in names}
+    os.environ.update({name: '1' for name in names})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
 
-                # 8. Recent vs older momentum (trend acceleration)
-                recent_return = ticker_returns.iloc[-21:].sum()  # Last month
-                older_return = ticker_returns.iloc[:-21].sum()   # Before that
-                momentum_accel = recent_return - older_return
 
-                # === TARGET ===
-                # Future return over forward_months
-                if ticker in forward_returns.columns:
-                    future_return = forward_returns[ticker].sum()
-                else:
-                    continue
+def _iter_month_features(prices, returns, bounds, momentum_days, workers):
+    """
+    _month_features() of every month in `bounds`, in order. With more than
+    one worker, tasks of MONTHS_PER_TASK months run in a process pool that
+    memory-maps the price and return matrices from a temporary directory.
+    """
+    tasks = [(start, min(start + MONTHS_PER_TASK, len(bounds)))
+             for start in range(0, len(bounds), MONTHS_PER_TASK)]
+    if workers <= 1 or len(tasks) <= 1:
+        correlations = RollingCorrelation(returns)
+        for task in tasks:
+            yield from _feature_months(prices, returns, bounds, momentum_days, correlations, *task)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='features_') as tmp_dir:
+        paths = [os.path.join(tmp_dir, 'prices.npy'), os.path.join(tmp_dir, 'returns.npy')]
+        np.save(paths[0], prices)
+        np.save(paths[1], returns)
+        context = multiprocessing.get_context('spawn')
+        with _single_threaded_blas():
+            pool = context.Pool(min(workers, len(tasks)), initializer=_init_feature_worker,
+                                initargs=(*paths, bounds, momentum_days))
+        with pool:
+            # imap hands back tasks in submission order as they finish
+            for months in pool.imap(_feature_task, tasks):
+                yield from months
+
+
+def _daily_returns(prices):
+    """
+    Daily returns of `prices` (missing closes carried forward) as a
+    MATRIX_DTYPE array, computed in float64 a block of RETURNS_BLOCK_COLUMNS
+    columns at a time so no float64 copy of the whole matrix is made.
+    """
+    returns = np.empty(prices.shape, dtype=MATRIX_DTYPE)
+    for start in range(0, prices.shape[1], RETURNS_BLOCK_COLUMNS):
+        block = prices.iloc[:, start:start + RETURNS_BLOCK_COLUMNS].astype(float)
+        returns[:, start:start + RETURNS_BLOCK_COLUMNS] = block.ffill().pct_change(fill_method=None).to_numpy()
+    return returns
+
+
+def iter_feature_batches(prices, lookback_months=6, forward_months=3, progress=None, workers=None, start=None):
+    """
+    Create the feature dataset for ML from price data one month at a time.
+
+    Each row = one stock at one point in time
+    Features = what we know at that time
+    Target = future return (what we're predicting)
+
+    Each month is computed for all tickers at once on NumPy arrays, with its
+    lookback and forward windows found by row position (see _month_bounds).
+    Months are spread over `workers` processes (default FEATURE_WORKERS);
+    the result doesn't depend on how many. With `start`, only the month-ends
+    from that date on are computed (`prices` still needs their history).
+
+    Prices and returns are held as MATRIX_DTYPE and each month is yielded as
+    soon as it is computed, so memory stays at the two matrices plus a month
+    of rows however long the history.
+
+    Yields:
+        A FEATURE_DATASET_COLUMNS frame for every month-end that has rows
+    """
+
+    # Calculate daily returns (missing prices carry the last close forward)
+    return_values = _daily_returns(prices)
+    price_values = prices.to_numpy(dtype=MATRIX_DTYPE)
 
-                # Did it beat the market?
-                market_future = forward_returns.mean(axis=1).sum()
-                beat_market = 1 if future_return > market_future else 0
+    # We'll build features at monthly intervals
+    monthly_dates = prices.index.to_series().resample('ME').last().index
 
-                all_rows.append({
-                    'ticker': ticker,
-                    'date': date,
-                    'momentum': momentum,
-                    'volatility': volatility,
-                    'avg_correlation': avg_correlation,
-                    'max_correlation': max_correlation,
-                    'min_correlation': min_correlation,
-                    'market_correlation': market_corr,
-                    'sharpe': sharpe,
-                    'momentum_accel': momentum_accel,
-                    'future_return': future_return,
-                    'beat_market': beat_market
+    # Need enough history for lookback and enough future for target. The last
+    # months' forward windows can still run past the prices; their features are
+    # final, and their targets are recomputed by later incremental runs.
+    valid_dates = monthly_dates[lookback_months:-forward_months]
+    if start is not None:
+        valid_dates = valid_dates[valid_dates >= pd.Timestamp(start)]
+    bounds = _month_bounds(prices.index, valid_dates, lookback_months, forward_months)
+    tickers = prices.columns.to_numpy()
+    month_features = _iter_month_features(price_values, return_values, bounds,
+                                          lookback_months * TRADING_DAYS_PER_MONTH,
+                                          FEATURE_WORKERS if workers is None else workers)
+
+    n_rows = 0
+    # closing() shuts the worker pool down even if a month fails or the caller stops early
+    with contextlib.closing(month_features):
+        for month_num, date in enumerate(valid_dates, 1):
+            print(f"Processing {date.strftime('%Y-%m')}...")
+            _report(progress, 'features', f"Processing {date.strftime('%Y-%m')}",
+                    done=month_num - 1, total=len(valid_dates), rows=n_rows)
+
+            keep, features = next(month_features)
+            if keep.any():
+                n_rows += int(keep.sum())
+                yield pd.DataFrame({
+                    'ticker': tickers[keep],
+                    'date': pd.DatetimeIndex([date]).repeat(int(keep.sum())),
+                    **features,
                 })
 
-            except Exception as e:
-                continue
 
-    return pd.DataFrame(all_rows)
+def create_feature_dataset(prices, lookback_months=6, forward_months=3, progress=None, workers=None,
+                           start=None):
+    """The whole feature dataset as one frame (see iter_feature_batches)."""
+    batches = list(iter_feature_batches(prices, lookback_months, forward_months, progress, workers, start))
+    if not batches:
+        return pd.DataFrame(columns=FEATURE_DATASET_COLUMNS)
+    return pd.concat(batches, ignore_index=True)
 
 
-def add_dividend_features(df, tickers):
-    """Add dividend yield as a feature."""
+def latest_features(prices, lookback_months=6, as_of=None):
+    """
+    The model features of every ticker as of `as_of` (default: the last
+    date in `prices`), computed in one pass the way iter_feature_batches
+    computes a month-end (the target, which needs the future, is left out).
+    `prices` needs the lookback window before that date and nothing after it.
+
+    Returns:
+        DataFrame with ticker, date and the FEATURE_DATASET_COLUMNS features
+    """
+    return_values = _daily_returns(prices)
+    price_values = prices.to_numpy(dtype=MATRIX_DTYPE)
+    as_of = prices.index[-1] if as_of is None else pd.Timestamp(as_of)
+    bounds = _month_bounds(prices.index, pd.DatetimeIndex([as_of]), lookback_months, 0)[0]
+    keep, features = _month_features(price_values, return_values, bounds,
+                                     lookback_months * TRADING_DAYS_PER_MONTH, RollingCorrelation(return_values))
+    rows = pd.DataFrame({
+        'ticker': prices.columns.to_numpy()[keep],
+        'date': pd.DatetimeIndex([as_of]).repeat(int(keep.sum())),
+        **features,
+    })
+    return rows.reindex(columns=FEATURE_DATASET_COLUMNS[:-2])
+
+
+def dividend_yields(tickers, progress=None, provider=None, metadata_path=None):
+    """Dividend yield of each ticker, as a Series indexed by ticker (from the ticker metadata cache)."""
     print("Fetching dividend data...")
+    metadata = ticker_metadata.get_metadata(
+        tickers, path=metadata_path, fetch=provider.fetch_info if provider is not None else None,
+        limiter=provider.rate_limiter() if provider is not None else None,
+        on_progress=lambda done, total: _report(progress, 'dividends', f"Fetching dividend data ({done}/{total})",
+                                                done=done, total=total))
+    return metadata['dividend_yield']
 
-    div_yields = {}
-    for i, ticker in enumerate(tickers):
-        if i % 100 == 0:
-            print(f"  Progress: {i}/{len(tickers)}")
-        try:
-            stock = yf.Ticker(ticker)
-            div_yields[ticker] = stock.info.get('dividendYield', 0) or 0
-        except:
-            div_yields[ticker] = 0
-
-    df['dividend_yield'] = df['ticker'].map(div_yields)
+
+def add_dividend_features(df, tickers, progress=None, provider=None, metadata_path=None):
+    """Add dividend yield as a feature."""
+    df['dividend_yield'] = df['ticker'].map(dividend_yields(tickers, progress, provider, metadata_path))
     return df
 
 
-def generate_stock_features(output_path='stock_features.csv'):
+def _incremental_start(root, forward_months):
     """
-    Main function to generate stock features CSV file.
-    Downloads fresh data from yfinance and creates ML features.
+    First month-end an incremental run computes: the last `forward_months`
+    months in the store, whose targets may not have been complete when they
+    were written, then everything after. None if nothing is stored yet.
+    """
+    if feature_store.current_version(root) is None:
+        return None
+    months = feature_store.list_months(root)
+    return pd.Timestamp(months[-min(forward_months, len(months))]) + pd.offsets.MonthEnd(0)
+
+
+def _checkpointed(stage, key, compute, root, counts):
+    """
+    compute()'s result, or the checkpoint an earlier run saved for `stage`
+    with the same inputs. `counts` is the stage's RunMetrics counts.
+    """
+    value = checkpoints.load(stage, key, root)
+    if value is not None:
+        print(f"Resuming: '{stage}' stage loaded from its checkpoint")
+        counts['resumed'] = True
+        return value
+    return checkpoints.save(stage, key, compute(), root)
+
+
+def _checkpointed_features(prices, key, root, lookback_months, forward_months, progress, start, counts):
+    """
+    Compute the feature months of `prices` into the 'features' checkpoint,
+    from the month after the last one an earlier run saved. `counts` is the
+    stage's RunMetrics counts (rows and months computed by this run).
+
+    Returns:
+        The 'YYYY-MM' keys of the saved months, in order
+    """
+    counts.update(tickers=prices.shape[1], rows=0, months=0)
+    if checkpoints.load('features', key, root) is not None:
+        print("Resuming: 'features' stage loaded from its checkpoint")
+        counts['resumed'] = True
+        return checkpoints.saved_months('features', key, root)
+
+    done = checkpoints.saved_months('features', key, root)
+    if done:
+        resume = pd.Timestamp(done[-1]) + pd.offsets.MonthEnd(0) + pd.Timedelta(days=1)
+        start = max(start, resume) if start is not None else resume
+        print(f"Resuming: {len(done)} feature months loaded from their checkpoint")
+        counts['resumed_months'] = len(done)
+    for batch in iter_feature_batches(prices, lookback_months=lookback_months, forward_months=forward_months,
+                                      progress=progress, start=start):
+        month = batch['date'].iloc[0].strftime('%Y-%m')
+        checkpoints.save_month('features', key, month, batch, root)
+        done.append(month)
+        counts['rows'] += len(batch)
+        counts['months'] += 1
+    checkpoints.save('features', key, {'months': done}, root)
+    return done
+
+
+def _batch_downloader(metrics, progress, provider):
+    """A price_cache.update_prices download function recording each batch in `metrics`."""
+    def download_batch(tickers, fetch_start):
+        with metrics.batch('prices', tickers=len(tickers), start=fetch_start) as counts:
+            fresh = download_prices(tickers, period='5y', interval='1d', progress=progress,
+                                    start=fetch_start, provider=provider)
+            counts.update(returned=fresh.shape[1], rows=int(fresh.count().sum()))
+        return fresh
+    return download_batch
+
+
+def _score_now(output_path, progress, provider, price_cache_path, metadata_path, metrics, lookback_months):
+    """
+    'score' mode of generate_stock_features: today's features from the last
+    SCORE_HISTORY of closes, scored with the persisted model and published
+    as the recommendation snapshot and as the rows /api/score scores (see
+    scoring.publish_live). The feature store's partitions aren't touched.
+    """
+    from . import model_store, scoring
+
+    with metrics.stage('universe') as counts:
+        valid_tickers = filter_tickers(*provider.universe())
+        counts['tickers'] = len(valid_tickers)
+    _report(progress, 'tickers', f"Fetched {len(valid_tickers)} tickers", done=1, total=1)
+
+    # Brings the cache up to date (only tickers not fetched in the last
+    # price_cache.REFRESH_AFTER are asked for) and reads the recent closes
+    with metrics.stage('prices') as counts:
+        prices = price_cache.update_prices(valid_tickers, _batch_downloader(metrics, progress, provider),
+                                           root=price_cache_path)
+        # The tickers a full run would keep, so the market average is the same
+        prices = prices.dropna(axis=1, thresh=MIN_PRICE_DAYS)
+        prices = prices.loc[prices.index >= prices.index[-1] - SCORE_HISTORY]
+        counts.update(tickers=prices.shape[1], rows=int(prices.count().sum()))
+    print(f"Scoring {len(prices.columns)} tickers from {len(prices)} days of closes")
+
+    with metrics.stage('features') as counts:
+        features = latest_features(prices, lookback_months)
+        counts.update(tickers=prices.shape[1], rows=len(features))
+    _report(progress, 'features', f"Computed features for {len(features)} tickers", done=1, total=1,
+            rows=len(features))
+
+    with metrics.stage('dividends', tickers=len(features)):
+        yields = dividend_yields(features['ticker'], progress=progress, provider=provider,
+                                 metadata_path=metadata_path)
+        features['dividend_yield'] = features['ticker'].map(yields)
+
+    with metrics.stage('snapshot') as counts:
+        model = model_store.get_model(output_path)
+        key = model_store.artifact_key(model_store.data_version(output_path))
+        features = model_store.clean_features(features)
+        recs = snapshot.build_snapshot(features, model, checkpoints.input_key(key, features))
+        # /api/score and the holdings page score these rows until the next month-end snapshot
+        scoring.publish_live(features, recs['version'], output_path)
+        snapshot.write_snapshot(recs)
+        counts['rows'] = len(features)
+    as_of = features['date'].max().strftime('%Y-%m-%d')
+    print(f"Wrote recommendation snapshot {recs['version']} (scores as of {as_of})")
+    _report(progress, 'saved', f"Scored {len(features)} tickers as of {as_of}", done=1, total=1,
+            rows=len(features))
+
+    print("\nStage timings:")
+    print('\n'.join(metrics.report()))
+    return {'version': recs['version'], 'rows': len(features), 'first_date': as_of, 'last_date': as_of,
+            'metrics': metrics.record()}
+
+
+def generate_stock_features(output_path=None, progress=None, mode=None, price_cache_path=None, provider=None,
+                            metadata_path=None, checkpoint_path=None, metrics=None):
+    """
+    Main function to generate the stock feature store.
+    Downloads fresh data (from yfinance by default), creates ML features and writes the
+    recommendation snapshot served by the web app.
+
+    The run is split into stages - universe, prices, features, dividends and
+    write - and each saves a checkpoint keyed by its inputs (see checkpoints).
+    A rerun after a failure skips the stages that completed and picks the
+    feature stage up after its last completed month; the checkpoints are
+    removed once the run finishes. Each stage, and each price download batch,
+    is measured into `metrics` (see instrumentation).
 
     Args:
-        output_path: Path where to save the stock_features.csv file
+        output_path: Feature store directory (defaults to backend/feature_store)
+        progress: Optional callback `progress(stage, message, done=, total=)`
+            called at each stage transition (see progress.STAGES)
+        mode: 'full', 'incremental' or 'score' (defaults to FEATURE_GENERATION_MODE);
+            incremental falls back to full when the store is empty; score only
+            scores today's features with the persisted model (see _score_now)
+        price_cache_path: Price cache directory (defaults to backend/price_cache)
+        provider: Data provider (defaults to providers.get_provider(), i.e.
+            DATA_PROVIDER); an offline provider's caches default to an
+            'offline' directory inside the live ones
+        metadata_path: Ticker metadata cache file (defaults to ticker_metadata's)
+        checkpoint_path: Checkpoint directory (defaults to backend/checkpoints)
+        metrics: instrumentation.RunMetrics to measure the run into (default: a new one)
 
     Returns:
-        DataFrame with stock features, or None if failed
+        dict with the published feature store version, the rows written,
+        their date range and the run's metrics record
     """
+    mode = mode or GENERATION_MODE
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unknown generation mode: {mode}")
+    lookback_months, forward_months = 6, 3
+    provider = provider or providers.get_provider()
+    if provider.cache_scope is not None:
+        price_cache_path = price_cache_path or os.path.join(price_cache.DEFAULT_ROOT, provider.cache_scope)
+        metadata_path = metadata_path or os.path.join(os.path.dirname(ticker_metadata.DEFAULT_PATH),
+                                                      provider.cache_scope, 'metadata.parquet')
+        checkpoint_path = checkpoint_path or os.path.join(checkpoints.DEFAULT_ROOT, provider.cache_scope)
+    # Data is refreshed daily, so a checkpoint is only resumed on the day it was made
+    today = datetime.now().strftime('%Y-%m-%d')
+    metrics = metrics or RunMetrics()
+    metrics.info.update(mode=mode, provider=provider.name)
+    if mode == 'score':
+        return _score_now(output_path, progress, provider, price_cache_path, metadata_path, metrics,
+                          lookback_months)
+
     try:
         print("=" * 60)
         print("Starting stock data generation...")
         print("=" * 60)
 
+        start = _incremental_start(output_path, forward_months) if mode == 'incremental' else None
+        if start is not None:
+            print(f"Incremental run: computing months from {start.strftime('%Y-%m')}")
+
         # Step 1: Fetch tickers
-        large_list, mid_list, small_list = get_all_tickers()
-        valid_tickers = filter_tickers(large_list, mid_list, small_list)
+        def fetch_universe():
+            return filter_tickers(*provider.universe())
+
+        with metrics.stage('universe') as counts:
+            valid_tickers = _checkpointed('universe', checkpoints.input_key(provider.name, today),
+                                          fetch_universe, checkpoint_path, counts)
+            counts['tickers'] = len(valid_tickers)
+        _report(progress, 'tickers', f"Fetched {len(valid_tickers)} tickers", done=1, total=1)
 
         # Step 2: Download price data
-        print("\nDownloading price data (this may take a while)...")
-        prices = download_in_batches(valid_tickers, period='5y', interval='1d', batch_size=30, delay=2)
+        history_start = None
+        if start is not None:
+            history_start = (start - pd.DateOffset(months=INCREMENTAL_HISTORY_MONTHS)).strftime('%Y-%m-%d')
 
-        # Filter out bad data
-        prices = prices.dropna(axis=1, how='all')
-        min_data_points = 250
-        prices = prices.dropna(axis=1, thresh=min_data_points)
-        print(f"Valid tickers remaining: {len(prices.columns)}")
+        download_batch = _batch_downloader(metrics, progress, provider)
 
-        # Step 3: Create features
-        print("\nCreating feature dataset...")
-        feature_df = create_feature_dataset(prices, lookback_months=6, forward_months=3)
-        print(f"Feature dataset shape: {feature_df.shape}")
-        print(f"Date range: {feature_df['date'].min()} to {feature_df['date'].max()}")
+        def fetch_prices():
+            print("\nDownloading price data (this may take a while)...")
+            # Only the days after each ticker's last cached close are downloaded
+            prices = price_cache.update_prices(valid_tickers, download_batch, root=price_cache_path,
+                                               start=history_start)
 
-        # Step 4: Add dividend data
-        unique_tickers = feature_df['ticker'].unique()
-        feature_df = add_dividend_features(feature_df, unique_tickers)
+            # Filter out bad data
+            return prices.dropna(axis=1, thresh=MIN_PRICE_DAYS)
 
-        # Step 5: Save to CSV
-        feature_df.to_csv(output_path, index=False)
-        print(f"\nSuccessfully saved to {output_path}")
-        print(f"Total rows: {len(feature_df)}")
-        print(f"Date range: {feature_df['date'].min()} to {feature_df['date'].max()}")
+        with metrics.stage('prices') as counts:
+            prices = _checkpointed('prices', checkpoints.input_key(valid_tickers, history_start, today),
+                                   fetch_prices, checkpoint_path, counts)
+            counts.update(tickers=prices.shape[1], rows=int(prices.count().sum()))
+        print(f"Valid tickers remaining: {len(prices.columns)}")
 
-        return feature_df
+        # Step 3: Create features, a month at a time into the checkpoint
+        print("\nCreating feature dataset...")
+        features_key = checkpoints.input_key(prices, lookback_months, forward_months, start)
+        with metrics.stage('features') as counts:
+            months = _checkpointed_features(prices, features_key, checkpoint_path, lookback_months,
+                                            forward_months, progress, start, counts)
+        tickers = prices.columns
+        # Stored like the others, marked so their targets are known to be partial
+        incomplete = [month for month in months
+                      if not _forward_complete(pd.Period(month, freq='M').end_time.normalize(), prices.index[-1],
+                                               forward_months)]
+        del prices
+
+        # Step 4: Add dividend data (for every ticker that can get a row)
+        dividends_key = checkpoints.input_key(tickers, today)
+        with metrics.stage('dividends', tickers=len(tickers)) as counts:
+            yields = _checkpointed(
+                'dividends', dividends_key,
+                lambda: dividend_yields(tickers, progress=progress, provider=provider,
+                                        metadata_path=metadata_path).to_frame(),
+                checkpoint_path, counts)['dividend_yield']
+
+        # Step 5: Stream the months into the feature store (replacing only
+        # the computed months when incremental)
+        def write_store():
+            written = {'rows': 0, 'first_date': None, 'last_date': None}
+
+            def batches():
+                for month in months:
+                    batch = checkpoints.load_month('features', features_key, month, checkpoint_path)
+                    batch['dividend_yield'] = batch['ticker'].map(yields)
+                    written['rows'] += len(batch)
+                    written['first_date'] = written['first_date'] or str(batch['date'].iloc[0])
+                    written['last_date'] = str(batch['date'].iloc[0])
+                    yield batch
+
+            version = feature_store.write_batches(batches(), output_path, upsert=start is not None,
+                                                  incomplete=incomplete)
+            return {'version': version, **written}
+
+        write_key = checkpoints.input_key(features_key, dividends_key, os.path.abspath(output_path or
+                                                                                    feature_store.DEFAULT_ROOT))
+        with metrics.stage('write') as counts:
+            written = _checkpointed('write', write_key, write_store, checkpoint_path, counts)
+            counts['rows'] = written['rows']
+        version = written['version']
+        print(f"\nSuccessfully saved feature store version {version}")
+        print(f"Total rows: {written['rows']}")
+        print(f"Date range: {written['first_date']} to {written['last_date']}")
+
+        # Step 6: Score the latest date once and publish the recommendation snapshot
+        with metrics.stage('snapshot'):
+            recs = snapshot.refresh_snapshot(output_path)
+        print(f"Wrote recommendation snapshot {recs['version']}")
+        _report(progress, 'saved', f"Saved feature store version {version}", done=1, total=1,
+                rows=written['rows'])
+
+        checkpoints.clear(checkpoint_path)
+        print("\nStage timings:")
+        print('\n'.join(metrics.report()))
+        return {**written, 'metrics': metrics.record()}
 
     except Exception as e:
         print(f"Error generating stock features: {e}")
@@ -352,5 +845,5 @@ def generate_stock_features(output_path='stock_features.csv'):
 if __name__ == '__main__':
     # CLI usage
     import sys
-    output_path = sys.argv[1] if len(sys.argv) > 1 else 'stock_features.csv'
-    generate_stock_features(output_path)
+    output_path = sys.argv[1] if len(sys.argv) > 1 else None
+    generate_stock_features(output_path, mode=sys.argv[2] if len(sys.argv) > 2 else None)
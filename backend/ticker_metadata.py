@@ -0,0 +1,110 @@
+"""
+Ticker metadata - name, sector and dividend figures from yfinance's `info`,
+fetched concurrently and cached on disk.
+
+`info` is one slow request per ticker and the figures change slowly, so
+entries are kept for METADATA_TTL and only missing or expired tickers are
+fetched, through the same concurrent, rate-limited downloader as prices.
+Callers get one table indexed by ticker and map columns from it.
+
+Configuration (environment variables):
+    METADATA_WORKERS   concurrent `info` requests (default 4)
+    METADATA_TTL_DAYS  days a fetched entry is served before it is fetched again (default 7)
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
+
+from . import downloader
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'ticker_metadata', 'metadata.parquet')
+METADATA_WORKERS = int(os.getenv('METADATA_WORKERS', str(downloader.WORKERS)))
+METADATA_TTL = timedelta(days=float(os.getenv('METADATA_TTL_DAYS', '7')))
+
+# Column -> (`info` key, value when the ticker has none; None: the ticker itself)
+FIELDS = {
+    'name': ('shortName', None),
+    'sector': ('sector', 'Unknown'),
+    'dividend_yield': ('dividendYield', 0.0),
+    'dividend_rate': ('dividendRate', 0.0),
+    'payout_ratio': ('payoutRatio', 0.0),
+}
+COLUMNS = list(FIELDS) + ['fetched_at']
+DTYPES = {'dividend_yield': 'float64', 'dividend_rate': 'float64', 'payout_ratio': 'float64',
+          'fetched_at': 'datetime64[ns]'}
+
+
+def fetch_info(ticker):
+    """The FIELDS of one ticker's yfinance `info`. Raises downloader.RateLimited when throttled."""
+    try:
+        info = yf.Ticker(ticker).info
+    except YFRateLimitError as e:
+        raise downloader.RateLimited(str(e)) from e
+    return {column: info.get(key) for column, (key, _) in FIELDS.items()}
+
+
+def load(path=None):
+    """The cached table (ticker index, COLUMNS), empty if nothing is cached."""
+    path = path or DEFAULT_PATH
+    if not os.path.exists(path):
+        return pd.DataFrame({column: pd.Series(dtype=DTYPES.get(column, 'object')) for column in COLUMNS},
+                            index=pd.Index([], name='ticker'))
+    return pd.read_parquet(path)
+
+
+def _save(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    table.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def get_metadata(tickers, path=None, max_age=METADATA_TTL, fetch=None, workers=None, limiter=None,
+                 retry_base=downloader.RETRY_DELAY, on_progress=None, now=None):
+    """
+    Metadata of `tickers`, fetching those not cached or older than `max_age`.
+
+    Args:
+        fetch: `fetch(ticker)` -> {column: value} replacing the yfinance call
+        workers: Requests in flight at once (default METADATA_WORKERS)
+        limiter, retry_base: Rate limiter and first retry delay (see downloader.download)
+        on_progress: Optional `on_progress(done, total)` as fetches finish
+        now: Current time (for benchmarks)
+
+    Returns:
+        DataFrame indexed by ticker with the FIELDS columns, defaults filled in
+        for tickers that couldn't be fetched
+    """
+    path = path or DEFAULT_PATH
+    now = now or datetime.now()
+    tickers = list(dict.fromkeys(tickers))
+    table = load(path)
+
+    fresh = table.index[table['fetched_at'] >= now - max_age]
+    stale = [ticker for ticker in tickers if ticker not in fresh]
+    if stale:
+        print(f"Fetching metadata for {len(stale)} tickers ({len(tickers) - len(stale)} cached)...")
+        results, failed = downloader.download(stale, fetch or fetch_info, workers=workers or METADATA_WORKERS,
+                                              limiter=limiter, retry_base=retry_base, on_progress=on_progress)
+        if failed:
+            print(f"  No metadata for {len(failed)} tickers")
+        if results:
+            fetched = pd.DataFrame.from_dict(results, orient='index').reindex(columns=list(FIELDS))
+            fetched['fetched_at'] = pd.Timestamp(now)
+            for column, dtype in DTYPES.items():
+                # `info` sometimes has strings where numbers belong
+                fetched[column] = (pd.to_numeric(fetched[column], errors='coerce') if dtype == 'float64'
+                                   else fetched[column]).astype(dtype)
+            fetched.index.name = 'ticker'
+            table = pd.concat([table.drop(index=fetched.index, errors='ignore'), fetched])
+            _save(table, path)
+
+    result = table.reindex(tickers)[list(FIELDS)]
+    for column, (_, default) in FIELDS.items():
+        fill = pd.Series(result.index, index=result.index) if default is None else default
+        result[column] = result[column].fillna(fill)
+    return result
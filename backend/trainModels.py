@@ -12,9 +12,10 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 from tensorflow.keras.callbacks import EarlyStopping
 
-# Load features
-df = pd.read_csv('stock_features.csv')
-df['date'] = pd.to_datetime(df['date'])
+from backend import feature_store, model_store
+
+# Load features (run from the repository root: python -m backend.trainModels)
+df = feature_store.read_features()
 
 # Clean data - remove NaN and infinite values
 df = df.replace([np.inf, -np.inf], np.nan)
@@ -31,11 +32,7 @@ feature_cols = [
     'dividend_yield'
 ]
 
-split_idx = int(len(sorted_dates) * 0.7)
-split_date = sorted_dates[split_idx]
-
-train = df[df['date'] <= split_date]
-test = df[df['date'] > split_date]
+train, test, split_date = model_store.walk_forward_split(df, train_fraction=0.7)
 
 print(f"\nSplit date: {split_date}")
 print(f"Training samples: {len(train)}")
@@ -0,0 +1,119 @@
+"""
+NumPy-only evaluator for the CatBoost recommendation model, so web workers
+can score features without importing catboost.
+
+CatBoost's trees are oblivious: every node at the same depth of a tree uses
+the same (feature, border) split, so a row's leaf is just the bit pattern of
+`value > border` over the tree's splits. The model is converted from
+CatBoost's JSON export into a few small arrays and saved as .npz.
+"""
+
+import numpy as np
+
+
+class ObliviousTreeEnsemble:
+    """
+    Binary classifier with predict_proba/predict compatible with the
+    CatBoostClassifier calls the app makes.
+
+    Arrays (T trees, padded to the deepest tree's depth D):
+        features:     (T, D) column index of each split
+        borders:      (T, D) split thresholds (+inf for padding, never taken)
+        nan_is_true:  (T, D) whether a missing value takes the split
+        leaf_values:  (T, 2**D) leaf outputs
+    """
+
+    def __init__(self, features, borders, nan_is_true, leaf_values, scale=1.0, bias=0.0):
+        self.features = features
+        self.borders = borders
+        self.nan_is_true = nan_is_true
+        self.leaf_values = leaf_values
+        self.scale = float(scale)
+        self.bias = float(bias)
+
+        # Quantize like CatBoost does: each row's value of a feature becomes the
+        # number of that feature's borders below it (its bin), and a split is
+        # taken when the bin exceeds the split border's rank
+        used = np.isfinite(borders)
+        self._columns = np.unique(features[used])
+        self._column_borders = [np.unique(borders[used & (features == column)]) for column in self._columns]
+        self._column_nan_is_true = [bool(nan_is_true[used & (features == column)].any()) for column in self._columns]
+
+        max_bins = max((len(b) for b in self._column_borders), default=0)
+        self._bin_dtype = np.uint8 if max_bins < np.iinfo(np.uint8).max else np.uint16
+        self._leaf_dtype = np.uint8 if features.shape[1] <= 8 else np.uint16
+        # (depth, trees) layouts so each depth level is one gather over all trees
+        self._bin_index = np.zeros(features.shape[::-1], dtype=np.intp)
+        self._ranks = np.full(features.shape[::-1], np.iinfo(self._bin_dtype).max, dtype=self._bin_dtype)
+        for j, column in enumerate(self._columns):
+            mask = (used & (features == column)).T
+            self._bin_index[mask] = j
+            self._ranks[mask] = np.searchsorted(self._column_borders[j], borders.T[mask])
+        self._leaf_offsets = (np.arange(len(leaf_values)) * leaf_values.shape[1])[:, None]
+
+    @classmethod
+    def from_catboost_json(cls, model_json):
+        """Build from the dict of `CatBoostClassifier.save_model(path, format='json')`."""
+        float_features = model_json['features_info']['float_features']
+        trees = model_json['oblivious_trees']
+        depth = max(len(tree['splits']) for tree in trees)
+
+        features = np.zeros((len(trees), depth), dtype=np.intp)
+        borders = np.full((len(trees), depth), np.inf)
+        nan_is_true = np.zeros((len(trees), depth), dtype=bool)
+        leaf_values = np.zeros((len(trees), 1 << depth))
+        for t, tree in enumerate(trees):
+            for d, split in enumerate(tree['splits']):
+                if split['split_type'] != 'FloatFeature':
+                    raise ValueError(f"Unsupported split type: {split['split_type']}")
+                info = float_features[split['float_feature_index']]
+                features[t, d] = info['flat_feature_index']
+                borders[t, d] = split['border']
+                nan_is_true[t, d] = info.get('nan_value_treatment') == 'AsTrue'
+            leaf_values[t, :len(tree['leaf_values'])] = tree['leaf_values']
+
+        scale, biases = model_json.get('scale_and_bias', [1.0, [0.0]])
+        return cls(features, borders, nan_is_true, leaf_values, scale, biases[0])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(
+                f, features=self.features, borders=self.borders, nan_is_true=self.nan_is_true,
+                leaf_values=self.leaf_values, scale_and_bias=np.array([self.scale, self.bias])
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            scale, bias = arrays['scale_and_bias']
+            return cls(arrays['features'], arrays['borders'], arrays['nan_is_true'],
+                       arrays['leaf_values'], scale, bias)
+
+    @property
+    def tree_count_(self):
+        return len(self.leaf_values)
+
+    def raw_predict(self, X):
+        # CatBoost compares float32 feature values against its borders
+        columns = np.asarray(X, dtype=np.float32).T
+        bins = np.empty((len(self._columns), columns.shape[1]), dtype=self._bin_dtype)
+        for j, column in enumerate(self._columns):
+            values = columns[column]
+            bins[j] = np.searchsorted(self._column_borders[j], values, side='left')
+            missing = np.isnan(values)
+            if missing.any():
+                bins[j, missing] = len(self._column_borders[j]) if self._column_nan_is_true[j] else 0
+
+        leaves = np.zeros((len(self.leaf_values), columns.shape[1]), dtype=self._leaf_dtype)  # (trees, rows)
+        for depth in range(len(self._ranks)):
+            taken = bins[self._bin_index[depth]] > self._ranks[depth][:, None]
+            leaves |= taken.astype(self._leaf_dtype) << depth
+        tree_values = self.leaf_values.ravel().take(leaves + self._leaf_offsets)
+        return self.scale * tree_values.sum(axis=0) + self.bias
+
+    def predict_proba(self, X):
+        prob = 1.0 / (1.0 + np.exp(-self.raw_predict(X)))
+        return np.column_stack([1.0 - prob, prob])
+
+    def predict(self, X):
+        return (self.raw_predict(X) > 0).astype(np.int64)
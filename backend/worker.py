@@ -0,0 +1,228 @@
+"""
+Background worker - runs queued stock data regenerations and model training
+outside the web processes.
+
+Each job runs in a child process with the CPU, memory and wall-clock limits
+below, so a runaway job can't starve or take down the web workers and can be
+cancelled from the web app. Only one job runs at a time across all workers.
+
+CLI usage:
+    python -m backend.worker                        run jobs as they are queued
+    python -m backend.worker enqueue regenerate [full|incremental]
+    python -m backend.worker enqueue score          score today's prices with the current model
+    python -m backend.worker enqueue train [full|incremental]
+    python -m backend.worker cancel <job_id>
+
+Configuration (environment variables):
+    WORKER_POLL_INTERVAL     seconds between queue checks (default 2)
+    WORKER_JOB_TIMEOUT       wall-clock seconds before a job is stopped (default 7200)
+    WORKER_MAX_MEMORY_MB     address-space limit for a job, 0 = unlimited (default 0)
+    WORKER_MAX_CPU_SECONDS   CPU-time limit for a job, 0 = unlimited (default 0)
+    WORKER_THREADS           threads for CatBoost and BLAS, 0 = all cores (default 0)
+    WORKER_NICE              niceness added to job processes (default 10)
+"""
+
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+
+POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '2'))
+JOB_TIMEOUT = int(os.getenv('WORKER_JOB_TIMEOUT', '7200'))
+MAX_MEMORY_MB = int(os.getenv('WORKER_MAX_MEMORY_MB', '0'))
+MAX_CPU_SECONDS = int(os.getenv('WORKER_MAX_CPU_SECONDS', '0'))
+THREADS = int(os.getenv('WORKER_THREADS', '0'))
+NICE = int(os.getenv('WORKER_NICE', '10'))
+
+HEARTBEAT_INTERVAL = 5
+# Seconds a job gets to exit after SIGTERM before it is killed
+STOP_GRACE = 10
+
+
+def _apply_limits():
+    """Limit the current (job) process; called in the child before any heavy imports."""
+    if NICE:
+        os.nice(NICE)
+    if MAX_MEMORY_MB:
+        limit = MAX_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if MAX_CPU_SECONDS:
+        # SIGXCPU at the soft limit, SIGKILL shortly after
+        resource.setrlimit(resource.RLIMIT_CPU, (MAX_CPU_SECONDS, MAX_CPU_SECONDS + 5))
+    if THREADS:
+        for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ[var] = str(THREADS)
+        os.environ['MODEL_THREAD_COUNT'] = str(THREADS)
+
+
+def _train(job_id, params):
+    """Make sure the model for the current feature data exists, then refresh the snapshot."""
+    from . import jobs, model_store, snapshot
+    from .app import FEATURE_STORE_PATH
+
+    jobs.update_job(job_id, 'training', 'Training model', force=True)
+    model_store.get_model(FEATURE_STORE_PATH, mode=params.get('mode'))
+    jobs.update_job(job_id, 'saved', 'Writing recommendations snapshot', force=True)
+    snapshot.refresh_snapshot(FEATURE_STORE_PATH)
+
+
+def _regenerate(job_id, params):
+    """Run the regeneration pipeline and save its instrumentation record to the run history."""
+    from . import jobs, run_history
+    from .app import db, FEATURE_STORE_PATH
+    from .instrumentation import RunMetrics
+    from .stock_data_generator import generate_stock_features
+
+    metrics = RunMetrics()
+    try:
+        generate_stock_features(FEATURE_STORE_PATH, progress=jobs.progress_callback(job_id),
+                                mode=params.get('mode'), metrics=metrics)
+    except Exception as e:
+        db.session.rollback()
+        run_history.record_run(metrics.record(), job_id=job_id, error=str(e) or type(e).__name__)
+        raise
+    run_history.record_run(metrics.record(), job_id=job_id)
+
+
+def _run_job(job_id, kind, params):
+    """Child process entry point: run one job and record how it ended."""
+    _apply_limits()
+    from . import jobs
+    from .app import app, db, FEATURE_STORE_PATH
+
+    with app.app_context():
+        try:
+            if kind == 'regenerate':
+                _regenerate(job_id, params)
+            elif kind == 'score':
+                _regenerate(job_id, {**params, 'mode': 'score'})
+            elif kind == 'train':
+                _train(job_id, params)
+            else:
+                raise ValueError(f"Unknown job kind: {kind}")
+            jobs.finish_job(job_id)
+        except MemoryError:
+            db.session.rollback()
+            jobs.finish_job(job_id, error=f'Out of memory (limit {MAX_MEMORY_MB} MB)')
+            sys.exit(1)
+        except Exception as e:
+            db.session.rollback()
+            jobs.finish_job(job_id, error=str(e))
+            print(f"Job {job_id} failed: {e}")
+            sys.exit(1)
+
+
+def _stop(process):
+    process.terminate()
+    process.join(STOP_GRACE)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def _exit_reason(exitcode):
+    if exitcode == -signal.SIGXCPU:
+        return f'CPU time limit exceeded ({MAX_CPU_SECONDS}s)'
+    if exitcode == -signal.SIGKILL:
+        return 'Job process was killed (out of memory?)'
+    return f'Job process exited with code {exitcode}'
+
+
+def supervise(job, context=None):
+    """Run a claimed job in a child process, enforcing the timeout and cancellation."""
+    from sqlalchemy.exc import SQLAlchemyError
+
+    from . import jobs
+    from .models import db
+
+    context = context or multiprocessing.get_context('spawn')
+    params = json.loads(job.params) if job.params else {}
+    process = context.Process(target=_run_job, args=(job.id, job.kind, params), name=f'job-{job.id}')
+    process.start()
+    print(f"Started {job.kind} job {job.id} (pid {process.pid})")
+
+    deadline = time.monotonic() + JOB_TIMEOUT
+    error, state = None, None
+    try:
+        while process.is_alive():
+            process.join(HEARTBEAT_INTERVAL)
+            if not process.is_alive():
+                break
+            try:
+                cancel = jobs.heartbeat(job.id)
+            except SQLAlchemyError as e:
+                # Keep the job going through a database blip; a long outage expires it as stale
+                db.session.rollback()
+                print(f"Heartbeat for job {job.id} failed: {e}")
+                cancel = False
+            if cancel:
+                error, state = 'Cancelled', 'cancelled'
+            elif time.monotonic() > deadline:
+                error = f'Timed out after {JOB_TIMEOUT}s'
+            if error:
+                _stop(process)
+    finally:
+        if process.is_alive():
+            # The worker itself is shutting down
+            _stop(process)
+            error = error or 'Worker stopped'
+
+        # The child records success and the failures it can catch; the rest are ours to report
+        db.session.rollback()
+        current = jobs.get_job(job.id)
+        if current is not None and current.state == 'running':
+            jobs.finish_job(job.id, error=error or _exit_reason(process.exitcode), state=state)
+        print(f"Finished {job.kind} job {job.id}: {jobs.get_job(job.id).state}")
+
+
+def run_worker(once=False):
+    """Claim and run queued jobs until stopped (or until the queue is empty with `once`)."""
+    from sqlalchemy.exc import SQLAlchemyError
+
+    from . import jobs
+    from .app import app, db
+
+    # Turn SIGTERM (e.g. a deploy) into a clean shutdown that stops the running job
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    context = multiprocessing.get_context('spawn')
+
+    with app.app_context():
+        print(f"Worker {os.getpid()} waiting for jobs...")
+        while True:
+            try:
+                job = jobs.claim_next_job(os.getpid())
+                if job is not None:
+                    supervise(job, context)
+                    continue
+            except SQLAlchemyError as e:
+                # The database is unreachable; wait and try again rather than exit
+                db.session.rollback()
+                print(f"Worker {os.getpid()}: database error, retrying: {e}")
+            if once:
+                return
+            time.sleep(POLL_INTERVAL)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 1:
+        run_worker()
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'enqueue':
+        from . import jobs
+        from .app import app
+        params = {'mode': sys.argv[3]} if len(sys.argv) > 3 else None
+        with app.app_context():
+            job_id = jobs.enqueue(sys.argv[2], params)
+        print(f"Queued job {job_id}" if job_id else f"A {sys.argv[2]} job is already queued or running")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'cancel':
+        from . import jobs
+        from .app import app
+        with app.app_context():
+            job = jobs.cancel_job(sys.argv[2])
+            print(f"Job {sys.argv[2]}: {job.state if job else 'not found'}"
+                  + (' (cancellation requested)' if job is not None and job.state == 'running' else ''))
+    else:
+        print("Usage: python -m backend.worker [enqueue regenerate|score|train [mode] | cancel <job_id>]")
+        sys.exit(1)
@@ -0,0 +1,28 @@
+# Gunicorn settings (read automatically from the working directory)
+import os
+
+worker_class = 'gthread'
+threads = 8
+
+# PRELOAD_MODELS=1: import the app and load the snapshot, model and latest
+# feature matrix in the master process, so forked workers share those pages
+# copy-on-write instead of each loading a copy. Workers still check the
+# published version on every request and switch after a regeneration.
+preload_app = os.getenv('PRELOAD_MODELS', '0') == '1'
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from backend.app import FEATURE_STORE_PATH
+    from backend import scoring, snapshot
+
+    try:
+        snapshot.load_snapshot()
+        _, model = scoring.preload(FEATURE_STORE_PATH)
+        if model is None:
+            server.log.info("Preloaded the latest features; no model artifact for them yet, skipped the model")
+        else:
+            server.log.info("Preloaded the model and latest features for the workers")
+    except FileNotFoundError as e:
+        server.log.info(f"Nothing to preload yet: {e}")
@@ -0,0 +1,63 @@
+"""
+Shared fixtures. Everything runs on synthetic data in a temporary directory
+(see backend/benchmarks.py and backend/providers.py), so the suite needs no
+network access or generated stock data.
+"""
+
+import pytest
+
+
+def _clear_caches():
+    from backend import model_store, scoring, snapshot
+
+    model_store.clear_cache()
+    scoring.clear_cache()
+    snapshot.clear_cache()
+
+
+@pytest.fixture
+def synthetic_store(tmp_path, monkeypatch):
+    """
+    A small synthetic feature store, with model artifacts and snapshots kept
+    in tmp_path and the model trained, as a regeneration would leave them.
+    """
+    from backend import benchmarks, model_store, snapshot
+
+    root = str(tmp_path / 'feature_store')
+    benchmarks.make_synthetic_store(root, n_tickers=200, n_months=24)
+    monkeypatch.setattr(model_store, 'ARTIFACT_DIR', str(tmp_path / 'model_artifacts'))
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    _clear_caches()
+    model_store.get_model(root)
+    yield root
+    _clear_caches()
+
+
+@pytest.fixture
+def client(synthetic_store, monkeypatch):
+    """Test client of the app, logins disabled, serving synthetic_store."""
+    from backend import app as app_module
+
+    monkeypatch.setattr(app_module, 'FEATURE_STORE_PATH', synthetic_store)
+    monkeypatch.setitem(app_module.app.config, 'LOGIN_DISABLED', True)
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def offline_paths(tmp_path, monkeypatch):
+    """
+    generate_stock_features() keyword arguments that keep the feature store
+    and every cache in tmp_path, with model artifacts and snapshots there too.
+    """
+    from backend import model_store, snapshot
+
+    monkeypatch.setattr(model_store, 'ARTIFACT_DIR', str(tmp_path / 'model_artifacts'))
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    _clear_caches()
+    yield {
+        'output_path': str(tmp_path / 'feature_store'),
+        'price_cache_path': str(tmp_path / 'price_cache'),
+        'metadata_path': str(tmp_path / 'ticker_metadata' / 'metadata.parquet'),
+        'checkpoint_path': str(tmp_path / 'checkpoints'),
+    }
+    _clear_caches()
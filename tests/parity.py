@@ -0,0 +1,82 @@
+"""
+The original per-ticker feature loop, and the comparison of feature rows
+against a reference within the float32 tolerances of the vectorized code.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Pairwise correlations come from float32 returns (see correlation.py)
+CORRELATION_COLUMNS = ('avg_correlation', 'max_correlation', 'min_correlation')
+CORRELATION_ATOL = 1e-4
+# The other features come from float32 prices and returns (MATRIX_DTYPE)
+FEATURE_RTOL = 1e-5
+FEATURE_ATOL = 1e-5
+
+
+def assert_features_match(expected, actual):
+    """
+    `actual` must have `expected`'s rows, in the same order, with the same
+    beat_market labels, features missing in the same rows and values within
+    FEATURE_RTOL/FEATURE_ATOL (CORRELATION_ATOL for correlation features).
+    """
+    assert list(actual.columns) == list(expected.columns)
+    for col in ('ticker', 'date', 'beat_market'):
+        assert actual[col].equals(expected[col]), f"'{col}' differs from the reference"
+
+    for col in expected.columns.drop(['ticker', 'date', 'beat_market']):
+        a, b = actual[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float)
+        if col in CORRELATION_COLUMNS:
+            np.testing.assert_allclose(a, b, rtol=0, atol=CORRELATION_ATOL, err_msg=col)
+        else:
+            np.testing.assert_allclose(a, b, rtol=FEATURE_RTOL, atol=FEATURE_ATOL, err_msg=col)
+
+
+def create_feature_dataset_reference(prices, lookback_months=6, forward_months=3):
+    """The original per-month, per-ticker loop create_feature_dataset() replaced, as the reference for it."""
+    returns = prices.pct_change()
+    monthly_dates = prices.resample('ME').last().index
+    valid_dates = monthly_dates[lookback_months:-forward_months]
+
+    all_rows = []
+    for date in valid_dates:
+        lookback_start = date - pd.DateOffset(months=lookback_months)
+        lookback_returns = returns[lookback_start:date]
+        forward_end = date + pd.DateOffset(months=forward_months)
+        forward_returns = returns[date:forward_end]
+        corr_matrix = lookback_returns.corr()
+        market_return = lookback_returns.mean(axis=1)
+
+        for ticker in prices.columns:
+            try:
+                ticker_returns = lookback_returns[ticker].dropna()
+                if len(ticker_returns) < 20:
+                    continue
+                momentum = (prices[ticker].loc[:date].iloc[-1] /
+                            prices[ticker].loc[:date].iloc[-lookback_months*21] - 1)
+                volatility = ticker_returns.std() * np.sqrt(252)
+                ticker_corrs = corr_matrix[ticker].drop(ticker)
+                market_corr = ticker_returns.corr(market_return)
+                period_return = ticker_returns.sum()
+                sharpe = period_return / (ticker_returns.std() + 1e-6)
+                momentum_accel = ticker_returns.iloc[-21:].sum() - ticker_returns.iloc[:-21].sum()
+                future_return = forward_returns[ticker].sum()
+                market_future = forward_returns.mean(axis=1).sum()
+                all_rows.append({
+                    'ticker': ticker,
+                    'date': date,
+                    'momentum': momentum,
+                    'volatility': volatility,
+                    'avg_correlation': ticker_corrs.mean(),
+                    'max_correlation': ticker_corrs.max(),
+                    'min_correlation': ticker_corrs.min(),
+                    'market_correlation': market_corr,
+                    'sharpe': sharpe,
+                    'momentum_accel': momentum_accel,
+                    'future_return': future_return,
+                    'beat_market': 1 if future_return > market_future else 0
+                })
+            except Exception:
+                continue
+
+    return pd.DataFrame(all_rows)
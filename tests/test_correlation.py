@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from backend.benchmarks import make_synthetic_prices
+from backend.correlation import RollingCorrelation
+from backend.stock_data_generator import _month_bounds
+
+from .parity import CORRELATION_ATOL
+
+
+@pytest.fixture(scope='module')
+def returns():
+    return make_synthetic_prices(n_tickers=100, n_years=3).ffill().pct_change(fill_method=None)
+
+
+def test_rolling_correlation_matches_dataframe_corr(returns):
+    """RollingCorrelation, moved through the monthly windows in order, matches DataFrame.corr() on each."""
+    monthly_dates = returns.index.to_series().resample('ME').last().index
+    windows = _month_bounds(returns.index, monthly_dates[6:-3], 6, 3)[:, :2]
+    engine = RollingCorrelation(returns.to_numpy())
+
+    for lo, hi in windows:
+        expected = returns.iloc[lo:hi].corr().to_numpy()
+        np.fill_diagonal(expected, np.nan)
+        np.testing.assert_allclose(engine.matrix(lo, hi), expected, rtol=0, atol=CORRELATION_ATOL,
+                                   err_msg=f"rows {lo}:{hi}")
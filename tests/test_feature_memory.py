@@ -0,0 +1,32 @@
+import tracemalloc
+
+import pytest
+
+from backend import feature_store
+from backend.benchmarks import make_synthetic_prices
+from backend.stock_data_generator import iter_feature_batches
+
+
+def feature_memory_ceiling(n_tickers, n_days):
+    """
+    Bytes feature generation may allocate at its peak: RollingCorrelation's
+    five n x n float64 moments plus one more being multiplied and a block
+    being reduced, the price and return matrices with the engine's copies
+    (a few bytes per close each), and a fixed allowance for a month's rows
+    and the libraries' working space. Nothing grows with the rows produced.
+    """
+    return 7 * 8 * n_tickers ** 2 + 6 * 4 * n_tickers * n_days + 16 * 2 ** 20
+
+
+@pytest.mark.parametrize('n_years', [2, 6])
+def test_streamed_feature_generation_stays_under_ceiling(tmp_path, n_years):
+    prices = make_synthetic_prices(n_tickers=300, n_years=n_years)
+
+    tracemalloc.start()
+    try:
+        feature_store.write_batches(iter_feature_batches(prices), str(tmp_path / 'feature_store'))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert peak <= feature_memory_ceiling(*prices.shape[::-1])
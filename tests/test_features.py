@@ -0,0 +1,40 @@
+import warnings
+
+import pytest
+
+from backend import feature_store
+from backend.benchmarks import make_synthetic_prices
+from backend.stock_data_generator import create_feature_dataset
+
+from .parity import assert_features_match, create_feature_dataset_reference
+
+
+@pytest.fixture(scope='module')
+def prices():
+    return make_synthetic_prices(n_tickers=60, n_years=2)
+
+
+def test_create_feature_dataset_matches_reference_loop(prices):
+    with warnings.catch_warnings():
+        # The reference loop uses pct_change()'s deprecated implicit forward fill,
+        # and np.corrcoef warns on flat return series
+        warnings.simplefilter('ignore', FutureWarning)
+        warnings.simplefilter('ignore', RuntimeWarning)
+        expected = create_feature_dataset_reference(prices)
+
+    actual = create_feature_dataset(prices)
+
+    assert len(actual) > 0
+    assert_features_match(expected, actual)
+
+
+def test_trailing_month_is_stored_with_incomplete_target(prices, tmp_path):
+    """The newest month-end is kept even though its forward window runs past the prices, and marked."""
+    actual = create_feature_dataset(prices)
+    newest = prices.index.to_series().resample('ME').last().index[-4]
+    assert actual['date'].max() == newest
+
+    root = str(tmp_path / 'feature_store')
+    feature_store.write_features(actual, root, incomplete=[newest.strftime('%Y-%m')])
+    assert feature_store.list_months(root)[-1] == newest.strftime('%Y-%m')
+    assert feature_store.incomplete_months(root) == [newest.strftime('%Y-%m')]
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from backend import feature_store
+from backend.benchmarks import make_synthetic_prices
+from backend.stock_data_generator import INCREMENTAL_HISTORY_MONTHS, _incremental_start, create_feature_dataset
+
+from .parity import assert_features_match
+
+
+def _read_store(root):
+    return feature_store.read_features(root=root).sort_values(['date', 'ticker'], ignore_index=True)
+
+
+def test_incremental_refresh_matches_full_rebuild(tmp_path):
+    """Upserting the new and trailing months into last month's store gives a full rebuild's store."""
+    prices = make_synthetic_prices(n_tickers=100, n_years=3)
+    # The universe is the ETFs' current holdings, so nothing in it stopped trading years ago
+    prices = prices.loc[:, prices.iloc[-300:].notna().any()]
+    incremental_root, full_root = str(tmp_path / 'incremental'), str(tmp_path / 'full')
+    feature_store.write_features(create_feature_dataset(prices.loc[:prices.index[-1] - pd.DateOffset(months=1)]),
+                                 incremental_root)
+
+    first_month = _incremental_start(incremental_root, forward_months=3)
+    history = prices.loc[first_month - pd.DateOffset(months=INCREMENTAL_HISTORY_MONTHS):]
+    feature_store.upsert_features(create_feature_dataset(history, start=first_month), incremental_root)
+    feature_store.write_features(create_feature_dataset(prices), full_root)
+
+    assert_features_match(_read_store(full_root), _read_store(incremental_root))
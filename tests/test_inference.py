@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from backend import feature_store, model_store
+
+# Budget for importing backend.app (gunicorn boot and worker recycling)
+STARTUP_SECONDS_BUDGET = 1.5
+STARTUP_RSS_BUDGET_MB = 100
+STARTUP_FORBIDDEN_MODULES = ('catboost', 'plotly', 'pandas', 'numpy', 'pyarrow')
+
+_STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import backend.app
+elapsed = time.perf_counter() - start
+with open('/proc/self/status') as f:
+    rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+print(json.dumps({'seconds': elapsed, 'rss_mb': rss_kb / 1024,
+                  'modules': sorted(m for m in sys.modules if '.' not in m)}))
+"""
+
+
+def test_numpy_evaluator_matches_catboost(synthetic_store):
+    ensemble = model_store.get_model(synthetic_store)
+    catboost_model = model_store.load_catboost_model(model_store.artifact_key(model_store.data_version(synthetic_store)))
+    X = model_store.clean_features(feature_store.read_latest(synthetic_store))[model_store.FEATURE_COLS].to_numpy()
+
+    np.testing.assert_allclose(ensemble.predict_proba(X), catboost_model.predict_proba(X), rtol=0, atol=1e-9)
+
+
+@pytest.fixture(scope='module')
+def startup():
+    """Median import time and RSS of backend.app over three fresh interpreters, plus the modules it loaded."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = []
+    for _ in range(3):
+        output = subprocess.run(
+            [sys.executable, '-c', _STARTUP_PROBE], cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': float(np.median([run['seconds'] for run in runs])),
+        'rss_mb': float(np.median([run['rss_mb'] for run in runs])),
+        'modules': set(runs[0]['modules']),
+    }
+
+
+def test_app_import_skips_heavy_modules(startup):
+    assert not set(STARTUP_FORBIDDEN_MODULES) & startup['modules']
+
+
+def test_app_import_time_within_budget(startup):
+    assert startup['seconds'] <= STARTUP_SECONDS_BUDGET
+
+
+def test_app_import_memory_within_budget(startup):
+    assert startup['rss_mb'] <= STARTUP_RSS_BUDGET_MB
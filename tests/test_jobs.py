@@ -0,0 +1,48 @@
+import pytest
+from flask import Flask
+
+from backend import jobs
+from backend.models import db
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """A job registry in a SQLite file, with an app context for the jobs functions."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'jobs.db'}"
+    db.init_app(app)
+    # The registry creates its tables on first use
+    monkeypatch.setattr(jobs, '_table_ready', False)
+    with app.app_context():
+        yield app
+
+
+def test_stream_follows_only_its_job(registry):
+    """A stream subscribed with a job id never reports another job's progress or completion."""
+    running = jobs.enqueue('regenerate')
+    queued = jobs.enqueue('score')
+    jobs.claim_next_job(worker_pid=1)
+    source = jobs.RegistryEventSource(registry, poll_interval=0.01)
+    assert source.subscribe(queued)
+    try:
+        jobs.update_job(running, 'features', 'Processing 2026-06', force=True)
+        jobs.finish_job(running)
+        [event] = source.wait_for_events(timeout=5, job_id=queued)
+        assert event['job_id'] == queued
+        assert event['state'] == 'queued'
+
+        assert source.wait_for_events(after=event['id'], timeout=0.2, job_id=queued) == []
+        [latest] = source.wait_for_events(timeout=5)
+        assert latest['job_id'] == running
+    finally:
+        source.unsubscribe(queued)
+
+
+def test_status_of_a_job(registry):
+    running = jobs.enqueue('regenerate')
+    queued = jobs.enqueue('score')
+    jobs.claim_next_job(worker_pid=1)
+
+    assert jobs.status()['job']['id'] == running
+    assert jobs.status(queued)['job']['id'] == queued
+    assert jobs.status(queued)['is_running']
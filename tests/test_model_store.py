@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from backend import feature_store, model_store
+from backend.benchmarks import make_synthetic_features, make_synthetic_store
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_store, 'ARTIFACT_DIR', str(tmp_path / 'model_artifacts'))
+    model_store.clear_cache()
+    yield
+    model_store.clear_cache()
+
+
+def _trained(root, mode):
+    """Metadata of the model get_model() produces for the store at `root`."""
+    model_store.get_model(root, mode=mode)
+    with open(model_store.metadata_path(model_store.artifact_key(model_store.data_version(root)))) as f:
+        return json.load(f)
+
+
+def _add_month(root, tmp_path):
+    """Upsert the month after the store's last one, as an incremental regeneration does."""
+    df = make_synthetic_features(str(tmp_path / 'next.csv'), n_tickers=200, n_months=25)
+    feature_store.upsert_features(df[df['date'] == df['date'].max()], root)
+
+
+def test_incremental_training_extends_an_ancestor_of_the_store(artifacts, tmp_path):
+    root = str(tmp_path / 'feature_store')
+    _, first_version = make_synthetic_store(root, n_tickers=200, n_months=24)
+    assert _trained(root, 'full')['mode'] == 'full'
+
+    _add_month(root, tmp_path)
+    metadata = _trained(root, 'incremental')
+
+    assert metadata['mode'] == 'incremental'
+    assert metadata['parent_data_version'] == first_version
+    assert metadata['root'] == root
+
+
+def test_incremental_training_retrains_on_unrelated_data(artifacts, tmp_path):
+    root = str(tmp_path / 'feature_store')
+    make_synthetic_store(root, n_tickers=200, n_months=24)
+    _trained(root, 'full')
+
+    # Another store's newer data, and this store rebuilt from scratch
+    other = str(tmp_path / 'other_store')
+    make_synthetic_store(other, n_tickers=200, n_months=25, seed=7)
+    assert _trained(other, 'incremental')['mode'] == 'full'
+    make_synthetic_store(root, n_tickers=200, n_months=25, seed=7)
+    assert _trained(root, 'incremental')['mode'] == 'full'
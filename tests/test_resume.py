@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from backend import feature_store, providers
+from backend.stock_data_generator import generate_stock_features
+
+from .parity import assert_features_match
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _read_store(root):
+    return feature_store.read_features(root=root).sort_values(['date', 'ticker'], ignore_index=True)
+
+
+def test_resumed_run_publishes_uninterrupted_store(offline_paths, tmp_path):
+    """A run that dies in the feature stage, rerun, computes only the rest and publishes the same store."""
+    provider = providers.OfflineProvider(n_tickers=100, n_years=3)
+
+    def interrupt(stage, message, done=None, **data):
+        if stage == 'features' and done == 5:
+            raise _Interrupted(message)
+
+    with pytest.raises(_Interrupted):
+        generate_stock_features(provider=provider, progress=interrupt, **offline_paths)
+
+    computed = {}
+    runs = {'resumed': offline_paths, 'uninterrupted': {
+        **offline_paths, 'output_path': str(tmp_path / 'reference_store'),
+        'checkpoint_path': str(tmp_path / 'reference_checkpoints')}}
+    for name, paths in runs.items():
+        stages = []
+        generate_stock_features(provider=provider, progress=lambda stage, *_, **__: stages.append(stage), **paths)
+        computed[name] = stages.count('features')
+
+    assert computed['resumed'] < computed['uninterrupted']
+    assert not os.listdir(offline_paths['checkpoint_path'])
+    assert_features_match(_read_store(runs['uninterrupted']['output_path']), _read_store(offline_paths['output_path']))
@@ -0,0 +1,71 @@
+import shutil
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from backend import providers, run_history, scoring, snapshot
+from backend.models import db
+from backend.stock_data_generator import (MIN_PRICE_DAYS, SCORE_HISTORY, create_feature_dataset,
+                                          generate_stock_features, latest_features)
+
+from .parity import assert_features_match
+
+
+@pytest.fixture(scope='module')
+def provider():
+    return providers.OfflineProvider(n_tickers=200, n_years=3)
+
+
+def test_latest_features_match_month_end_rows(provider):
+    """latest_features() from only SCORE_HISTORY of closes gives the month-end rows of a full history."""
+    prices = provider.prices.dropna(axis=1, thresh=MIN_PRICE_DAYS)
+    as_of = prices.index[-1] - pd.offsets.MonthEnd(4)
+    prices = prices.loc[:as_of + pd.DateOffset(months=3)]
+    # A ticker that stopped trading before the window has its last close
+    # carried forward through it in a full history
+    prices = prices.loc[:, prices.loc[as_of - SCORE_HISTORY:as_of].notna().any()]
+
+    full = create_feature_dataset(prices, start=as_of)
+    expected = full[full['date'] == as_of].reset_index(drop=True)
+    recent = prices.loc[(prices.index >= as_of - SCORE_HISTORY) & (prices.index <= as_of)]
+    actual = latest_features(recent, as_of=as_of)
+
+    assert actual['ticker'].equals(expected['ticker'])
+    # latest_features() has no target; the reference's is borrowed so only features are compared
+    actual = pd.concat([actual, expected[['future_return', 'beat_market']]], axis=1)[expected.columns]
+    assert_features_match(expected, actual)
+
+
+def test_score_run_serves_its_snapshot(provider, offline_paths):
+    """After a 'score' run, scoring.score() agrees with the snapshot it published."""
+    # The full run leaves the price cache and model that 'score' reuses
+    for mode in ('full', 'score'):
+        generate_stock_features(mode=mode, provider=provider, **offline_paths)
+
+    page = snapshot.load_snapshot()
+    recommended = {row['ticker']: row['prob_beat_market'] for row in page['recommendations']}
+    scored = scoring.score(list(recommended), root=offline_paths['output_path'])
+
+    assert scored['version'] == page['version']
+    assert scored['missing'] == []
+    results = {row['ticker']: row['prob_beat_market'] for row in scored['results']}
+    assert max(abs(results[ticker] - recommended[ticker]) for ticker in recommended) <= 1e-9
+
+
+def test_score_run_is_recorded(provider, offline_paths, tmp_path, monkeypatch):
+    """A 'score' run records its download batches, and its run history row counts the rows it scored."""
+    generate_stock_features(mode='full', provider=provider, **offline_paths)
+    # An empty price cache, so the 'score' run downloads again
+    shutil.rmtree(offline_paths['price_cache_path'])
+    result = generate_stock_features(mode='score', provider=provider, **offline_paths)
+
+    record = result['metrics']
+    assert sum(batch['tickers'] for batch in record['batches'] if batch['name'] == 'prices') > 0
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'runs.db'}"
+    db.init_app(app)
+    monkeypatch.setattr(run_history, '_table_ready', False)
+    with app.app_context():
+        assert run_history.record_run(record).rows == result['rows']
@@ -0,0 +1,51 @@
+from backend import app as app_module
+from backend import model_store, snapshot
+
+
+def test_score_matches_recommendations(client, synthetic_store):
+    """POST /api/score gives the recommendations page's probabilities for every ticker it shows."""
+    page = snapshot.get_snapshot(synthetic_store)
+    recommended = {row['ticker']: row['prob_beat_market'] for row in page['recommendations']}
+
+    response = client.post('/api/score', json={'tickers': list(recommended)})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['version'] == page['version']
+    scored = {row['ticker']: row['prob_beat_market'] for row in body['results']}
+    assert scored.keys() == recommended.keys()
+    assert max(abs(scored[ticker] - recommended[ticker]) for ticker in recommended) <= 1e-9
+
+
+def test_score_reports_unknown_tickers(client):
+    response = client.post('/api/score', json={'tickers': ['t0001', 'NOPE']})
+
+    body = response.get_json()
+    assert [row['ticker'] for row in body['results']] == ['T0001']
+    assert body['missing'] == ['NOPE']
+
+
+def test_score_rejects_empty_list(client):
+    assert client.post('/api/score', json={'tickers': []}).status_code == 400
+
+
+def test_score_rejects_non_string_tickers(client):
+    assert client.post('/api/score', json={'tickers': ['T0001', None]}).status_code == 400
+
+
+def test_score_as_of(client):
+    """An unparsable as_of is a bad request; a month the store doesn't have is not found."""
+    assert client.post('/api/score', json={'tickers': ['T0001'], 'as_of': 'garbage'}).status_code == 400
+    assert client.post('/api/score', json={'tickers': ['T0001'], 'as_of': '1990-01'}).status_code == 404
+
+
+def test_untrained_model_queues_training(client, synthetic_store, monkeypatch):
+    """Without a model artifact, web requests answer 503 and queue a 'train' job instead of training."""
+    queued = []
+    monkeypatch.setattr(app_module.jobs, 'enqueue', lambda kind, **kwargs: queued.append(kind))
+    monkeypatch.setattr(model_store, 'ARTIFACT_DIR', str(synthetic_store) + '-untrained')
+    model_store.clear_cache()
+
+    assert client.get('/recommendations').status_code == 503
+    assert client.post('/api/score', json={'tickers': ['T0001']}).status_code == 503
+    assert queued == ['train', 'train']